@@ -0,0 +1,94 @@
+"""Logins per second with concurrent logins, each creating a user access token, with and without group commit.
+
+    python benchmarks/group_commit.py [n_workers] [n_logins] [synchronous]
+"""
+
+import asyncio
+import contextlib
+import pathlib
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+from arbor_imago import config, db_routing, group_commit
+from arbor_imago.models.tables import User as UserTable
+from arbor_imago.schemas import user_access_token as user_access_token_schema
+from arbor_imago.services import auth_credential as auth_credential_service
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+
+
+async def run(n_workers: int, n_logins: int, synchronous: str, grouped: bool) -> tuple[float, int]:
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(
+            'sqlite+aiosqlite:///' + str(pathlib.Path(directory) / 'benchmark.db'), pool_size=n_workers + 1)
+
+        @event.listens_for(engine.sync_engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode = wal')
+            cursor.execute('PRAGMA synchronous = {}'.format(synchronous))
+            cursor.execute('PRAGMA busy_timeout = 30000')
+            cursor.close()
+
+        sessionmaker = db_routing.make_async_sessionmaker(engine)
+
+        @contextlib.asynccontextmanager
+        async def _unit_of_work():
+            async with sessionmaker() as session:
+                yield session
+                await session.commit()
+
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+        async with sessionmaker() as session:
+            session.add(UserTable(id='benchmark', email='benchmark@example.com',
+                                  user_role_id=config.USER_ROLE_NAME_MAPPING['user']))
+            await session.commit()
+
+        # the service submits to the module's committer
+        committer = group_commit.GroupCommitter(
+            config.GROUP_COMMIT['window'].total_seconds(), config.GROUP_COMMIT['max_batch_size'], _unit_of_work)
+        group_commit.COMMITTER = committer
+        UserAccessTokenService._GROUP_COMMIT = grouped
+        committer.start()
+
+        async def _worker():
+            for _ in range(n_logins):
+                async with sessionmaker() as session:
+                    await UserAccessTokenService.create({
+                        'session': session,
+                        'admin': False,
+                        'authorized_user_id': 'benchmark',
+                        'create_model': user_access_token_schema.UserAccessTokenAdminCreate(
+                            user_id='benchmark',
+                            expiry=auth_credential_service.lifespan_to_expiry(
+                                config.AUTH['credential_lifespans']['access_token']),
+                        ),
+                    })
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(n_workers)))
+        elapsed = time.perf_counter() - start
+
+        await committer.stop()
+        await engine.dispose()
+        n_transactions = committer.stats()['batches'] if grouped else n_workers * n_logins
+        return n_workers * n_logins / elapsed, n_transactions
+
+
+def main(n_workers: int = 32, n_logins: int = 50, synchronous: str = 'full'):
+
+    for name, grouped in (('per login', False), ('grouped', True)):
+        logins_per_second, n_transactions = asyncio.run(
+            run(n_workers, n_logins, synchronous, grouped))
+        print('{:>10}: {:>8,.0f} logins/s, {} write transactions'.format(
+            name, logins_per_second, n_transactions))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) if i < 2 else arg for i, arg in enumerate(sys.argv[1:])))
@@ -0,0 +1,44 @@
+"""Lookups per second against the in-memory revocation filter with 1M outstanding revocations.
+
+    python benchmarks/revocation_filter.py [n_revocations] [n_lookups]
+"""
+
+import sys
+import time
+import uuid
+import datetime as datetime_module
+
+from arbor_imago.auth.revocation import RevocationFilter, RevocationStatus
+
+
+def main(n_revocations: int = 1_000_000, n_lookups: int = 200_000):
+
+    expiry = datetime_module.datetime.now().astimezone(
+        datetime_module.UTC) + datetime_module.timedelta(days=1)
+
+    revoked = [('access_token', str(uuid.uuid4()))
+               for _ in range(n_revocations)]
+    valid = [('access_token', str(uuid.uuid4())) for _ in range(n_lookups)]
+
+    revocation_filter = RevocationFilter(
+        bloom_capacity=n_revocations, bloom_false_positive_rate=0.01)
+
+    start = time.perf_counter()
+    for key in revoked:
+        # as loaded at startup
+        revocation_filter.add(key, expiry, exact=False)
+    print('loaded {:,} revocations in {:.2f}s, bloom filter {:.2f}MB'.format(
+        n_revocations, time.perf_counter() - start, len(revocation_filter._bloom._bits) / 1e6))
+
+    for name, keys in (('valid', valid), ('revoked', revoked[:n_lookups])):
+        start = time.perf_counter()
+        statuses = [revocation_filter.check(key) for key in keys]
+        elapsed = time.perf_counter() - start
+
+        n_unknown = sum(status is RevocationStatus.UNKNOWN for status in statuses)
+        print('{:>8} tokens: {:>12,.0f} lookups/s, {:.3%} sent to the database'.format(
+            name, len(keys) / elapsed, n_unknown / len(keys)))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
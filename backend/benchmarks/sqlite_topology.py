@@ -0,0 +1,121 @@
+"""Operations per second and failed operations under concurrent reads and writes, for each DB.ENGINE topology.
+
+Each worker loops over a mix of logins (creating a user access token, a write) and reads (fetching a user and a page
+of their tokens). "pool" is a pool of read/write connections, "single_writer" routes writes through one writer
+connection and reads through a pool of read-only connections.
+
+    python benchmarks/sqlite_topology.py [n_workers] [n_operations] [write_percent]
+"""
+
+import asyncio
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+
+from arbor_imago import config, db_routing
+from arbor_imago.models.tables import User as UserTable, UserAccessToken as UserAccessTokenTable
+from arbor_imago.schemas import user_access_token as user_access_token_schema
+from arbor_imago.services import auth_credential as auth_credential_service
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+
+N_USERS = 100
+
+
+def _set_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode = wal')
+    cursor.execute('PRAGMA synchronous = normal')
+    cursor.execute('PRAGMA busy_timeout = {}'.format(
+        int(config.DB_ENGINE['sqlite']['busy_timeout'].total_seconds() * 1000)))
+    cursor.close()
+
+
+async def run(topology: str, n_workers: int, n_operations: int, write_percent: int) -> tuple[float, int]:
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = 'sqlite+aiosqlite:///' + \
+            str(pathlib.Path(directory) / 'benchmark.db')
+
+        if topology == 'single_writer':
+            writer = create_async_engine(url, pool_size=1, max_overflow=0)
+            reader = create_async_engine(url, pool_size=n_workers)
+            engines = [writer, reader]
+        else:
+            writer = create_async_engine(url, pool_size=n_workers)
+            reader = None
+            engines = [writer]
+        for engine in engines:
+            event.listen(engine.sync_engine, 'connect', _set_pragmas)
+        sessionmaker = db_routing.make_async_sessionmaker(writer, reader)
+
+        async with writer.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+        async with sessionmaker() as session:
+            for i in range(N_USERS):
+                session.add(UserTable(id=str(i), email=str(i) + '@example.com',
+                                      user_role_id=config.USER_ROLE_NAME_MAPPING['user']))
+            await session.commit()
+
+        n_failed = 0
+
+        async def _login(user_id: str):
+            # like the login endpoint, the user is read in the same transaction that writes the token
+            async with sessionmaker() as session:
+                await session.get(UserTable, user_id)
+                await UserAccessTokenService.create({
+                    'session': session,
+                    'admin': False,
+                    'authorized_user_id': user_id,
+                    'create_model': user_access_token_schema.UserAccessTokenAdminCreate(
+                        user_id=user_id,
+                        expiry=auth_credential_service.lifespan_to_expiry(
+                            config.AUTH['credential_lifespans']['access_token']),
+                    ),
+                })
+
+        async def _read(user_id: str):
+            async with sessionmaker() as session:
+                await session.get(UserTable, user_id)
+                (await session.exec(select(UserAccessTokenTable).where(
+                    UserAccessTokenTable.user_id == user_id).limit(20))).all()
+
+        async def _worker(seed: int):
+            nonlocal n_failed
+            rng = random.Random(seed)
+            for _ in range(n_operations):
+                user_id = str(rng.randrange(N_USERS))
+                try:
+                    if rng.randrange(100) < write_percent:
+                        await _login(user_id)
+                    else:
+                        await _read(user_id)
+                except OperationalError:
+                    n_failed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker(seed) for seed in range(n_workers)))
+        elapsed = time.perf_counter() - start
+
+        for engine in engines:
+            await engine.dispose()
+        return n_workers * n_operations / elapsed, n_failed
+
+
+def main(n_workers: int = 16, n_operations: int = 200, write_percent: int = 20):
+
+    for topology in ('pool', 'single_writer'):
+        operations_per_second, n_failed = asyncio.run(
+            run(topology, n_workers, n_operations, write_percent))
+        print('{:>14}: {:>8,.0f} operations/s, {} failed'.format(
+            topology, operations_per_second, n_failed))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""Writes per second creating user access tokens, the login hot path, with and without a refresh after the write.
+
+"refresh" reproduces the old commit-then-refresh path, "no refresh" is the current one. Every column is set in Python
+before the INSERT, so the refresh only re-read values the instance already had.
+
+    python benchmarks/user_access_token_create.py [n_tokens]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+import pathlib
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+
+from arbor_imago import config
+from arbor_imago.models.tables import User as UserTable
+from arbor_imago.schemas import user_access_token as user_access_token_schema
+from arbor_imago.services import auth_credential as auth_credential_service
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+
+
+async def run(n_tokens: int, refresh: bool) -> tuple[float, float]:
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(
+            'sqlite+aiosqlite:///' + str(pathlib.Path(directory) / 'benchmark.db'))
+        sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+
+        n_statements = 0
+
+        @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+        def _count_statement(*args):
+            nonlocal n_statements
+            n_statements += 1
+
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        async with sessionmaker() as session:
+            session.add(UserTable(id='benchmark', email='benchmark@example.com',
+                                  user_role_id=config.USER_ROLE_NAME_MAPPING['user']))
+            await session.commit()
+
+        n_statements = 0
+        start = time.perf_counter()
+        for _ in range(n_tokens):
+            async with sessionmaker() as session:
+                user_access_token = await UserAccessTokenService.create({
+                    'session': session,
+                    'admin': False,
+                    'authorized_user_id': 'benchmark',
+                    'create_model': user_access_token_schema.UserAccessTokenAdminCreate(
+                        user_id='benchmark',
+                        expiry=auth_credential_service.lifespan_to_expiry(
+                            config.AUTH['credential_lifespans']['access_token']),
+                    ),
+                })
+                if refresh:
+                    await session.refresh(user_access_token)
+        elapsed = time.perf_counter() - start
+
+        await engine.dispose()
+        return n_tokens / elapsed, n_statements / n_tokens
+
+
+def main(n_tokens: int = 2_000):
+
+    for name, refresh in (('refresh', True), ('no refresh', False)):
+        writes_per_second, statements_per_write = asyncio.run(
+            run(n_tokens, refresh))
+        print('{:>10}: {:>8,.0f} writes/s, {:.1f} statements per write'.format(
+            name, writes_per_second, statements_per_write))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
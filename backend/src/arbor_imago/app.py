@@ -1,21 +1,52 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+import asyncio
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
 
-from arbor_imago import config
+from arbor_imago import config, notifications, database, group_commit, sql_instrumentation, metrics
 from arbor_imago.routers import user, auth, user_access_token, api_key_scope, gallery, api_key, pages
-from arbor_imago.auth import utils as auth_utils
+from arbor_imago.auth import utils as auth_utils, sweeper, hashing, revocation_sync, google as auth_google, exceptions as auth_exceptions
+from arbor_imago.services import base as base_service, gallery as gallery_service
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print('startingup')
+
+    await database.log_engine_settings()
+
+    await revocation_sync.rebuild_revocations()
+    notifications.DISPATCHER.start()
+    group_commit.COMMITTER.start()
+
+    background_tasks: list[asyncio.Task] = [
+        asyncio.create_task(revocation_sync.run_revocation_sync(
+            config.AUTH['revocation']['sync_interval'])),
+        asyncio.create_task(auth_google.ID_TOKEN_VERIFIER.run_refresher()),
+    ]
+    if config.METRICS['enabled']:
+        background_tasks.append(asyncio.create_task(metrics.EVENT_LOOP_LAG.run(
+            config.METRICS['event_loop_lag_interval'])))
+    if config.AUTH['expired_credential_sweep']['enabled']:
+        background_tasks.append(asyncio.create_task(sweeper.run_sweeper(
+            config.AUTH['expired_credential_sweep']['interval'],
+            config.AUTH['expired_credential_sweep']['batch_size']
+        )))
+
     yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await group_commit.COMMITTER.stop()
+    await notifications.DISPATCHER.stop()
+    hashing.PASSWORD_HASHER.shutdown()
     print('closingdown')
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, dependencies=[
+              database.REQUEST_SESSION_DEPENDENCY])
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[config.FRONTEND_URL],
@@ -26,6 +57,24 @@ app.add_middleware(
 )
 
 
+if config.SQL_INSTRUMENTATION['enabled']:
+    @app.middleware('http')
+    async def sql_instrumentation_middleware(request: Request, call_next):
+        with sql_instrumentation.record('{} {}'.format(request.method, request.url.path)) as request_statements:
+            response = await call_next(request)
+        if config.SQL_INSTRUMENTATION['server_timing']:
+            response.headers.append('Server-Timing', request_statements.server_timing())
+        return response
+
+
+if config.METRICS['enabled']:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get('/metrics', include_in_schema=False)
+    async def get_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.exception_handler(HTTPException)
 async def custom_http_exception_handler(request: Request, exc: HTTPException):
 
@@ -38,6 +87,36 @@ async def custom_http_exception_handler(request: Request, exc: HTTPException):
     return response
 
 
+@app.exception_handler(base_service.NotFoundError)
+async def not_found_exception_handler(request: Request, exc: base_service.NotFoundError):
+    return await custom_http_exception_handler(request, HTTPException(status.HTTP_404_NOT_FOUND, detail=exc.error_message))
+
+
+@app.exception_handler(base_service.UnauthorizedError)
+async def unauthorized_exception_handler(request: Request, exc: base_service.UnauthorizedError):
+    return await custom_http_exception_handler(request, HTTPException(status.HTTP_403_FORBIDDEN, detail=exc.error_message))
+
+
+@app.exception_handler(base_service.NotAvailableError)
+async def not_available_exception_handler(request: Request, exc: base_service.NotAvailableError):
+    return await custom_http_exception_handler(request, HTTPException(status.HTTP_409_CONFLICT, detail=exc.error_message))
+
+
+@app.exception_handler(base_service.AlreadyExistsError)
+async def already_exists_exception_handler(request: Request, exc: base_service.AlreadyExistsError):
+    return await custom_http_exception_handler(request, HTTPException(status.HTTP_409_CONFLICT, detail=exc.error_message))
+
+
+@app.exception_handler(gallery_service.InvalidMoveError)
+async def invalid_gallery_move_exception_handler(request: Request, exc: gallery_service.InvalidMoveError):
+    return await custom_http_exception_handler(request, HTTPException(status.HTTP_409_CONFLICT, detail=exc.error_message))
+
+
+@app.exception_handler(hashing.OverloadedError)
+async def password_hasher_overloaded_exception_handler(request: Request, exc: hashing.OverloadedError):
+    return await custom_http_exception_handler(request, auth_exceptions.too_many_requests())
+
+
 app.include_router(auth.AuthRouter().router)
 app.include_router(user.UserRouter().router)
 app.include_router(gallery.GalleryRouter().router)
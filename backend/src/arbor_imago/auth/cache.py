@@ -0,0 +1,195 @@
+import collections
+import datetime as datetime_module
+import time
+import typing
+
+from arbor_imago import config, custom_types
+
+"""
+Developer's Note:
+Resolving a table-backed auth credential costs several database round trips (credential row, user, scopes).
+This module caches the resolved result in-process, keyed by the encoded jwt.
+
+Entries live until the earliest of: the credential's own expiry, the configured max lifespan, or eviction (LRU).
+Writes which change the outcome of a resolution (deleting/updating a credential, updating/deleting a user) must
+invalidate the affected entries. Invalidation is local to the process, so the max lifespan bounds how stale
+another worker process can be.
+
+Stateless access tokens carry their claims but still need the user and their current token epoch.
+USER_CACHE holds those per user id, under the same size and lifespan limits.
+"""
+
+TValue = typing.TypeVar('TValue')
+
+AuthCredentialKey = tuple[custom_types.AuthCredential.type, str]
+
+
+class _Entry(typing.NamedTuple, typing.Generic[TValue]):
+    value: TValue
+    expiry_timestamp: custom_types.timestamp
+    auth_credential_key: AuthCredentialKey
+    user_id: custom_types.User.id | None
+
+
+class CredentialCache(typing.Generic[TValue]):
+
+    def __init__(self, max_size: int, max_lifespan: datetime_module.timedelta):
+        self.max_size = max_size
+        self.max_lifespan = max_lifespan
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: collections.OrderedDict[custom_types.JwtEncodedStr,
+                                               _Entry[TValue]] = collections.OrderedDict()
+        self._tokens_by_auth_credential: dict[AuthCredentialKey,
+                                              set[custom_types.JwtEncodedStr]] = {}
+        self._tokens_by_user_id: dict[custom_types.User.id,
+                                      set[custom_types.JwtEncodedStr]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: custom_types.JwtEncodedStr) -> TValue | None:
+
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if time.time() >= entry.expiry_timestamp:
+            self._remove(token)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry.value
+
+    def set(self,
+            token: custom_types.JwtEncodedStr,
+            value: TValue,
+            auth_credential_key: AuthCredentialKey,
+            user_id: custom_types.User.id | None,
+            expiry: datetime_module.datetime) -> None:
+
+        if not self.enabled:
+            return
+
+        expiry_timestamp = min(expiry.timestamp(),
+                               time.time() + self.max_lifespan.total_seconds())
+
+        if token in self._entries:
+            self._remove(token)
+
+        self._entries[token] = _Entry(
+            value=value,
+            expiry_timestamp=expiry_timestamp,
+            auth_credential_key=auth_credential_key,
+            user_id=user_id
+        )
+        self._tokens_by_auth_credential.setdefault(
+            auth_credential_key, set()).add(token)
+        if user_id is not None:
+            self._tokens_by_user_id.setdefault(user_id, set()).add(token)
+
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_auth_credential(self, auth_credential_type: custom_types.AuthCredential.type, id: str) -> None:
+        for token in list(self._tokens_by_auth_credential.get((auth_credential_type, id), ())):
+            self._remove(token)
+
+    def invalidate_user(self, user_id: custom_types.User.id) -> None:
+        for token in list(self._tokens_by_user_id.get(user_id, ())):
+            self._remove(token)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tokens_by_auth_credential.clear()
+        self._tokens_by_user_id.clear()
+
+    def _remove(self, token: custom_types.JwtEncodedStr) -> None:
+
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+
+        tokens = self._tokens_by_auth_credential.get(entry.auth_credential_key)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_auth_credential[entry.auth_credential_key]
+
+        if entry.user_id is not None:
+            tokens = self._tokens_by_user_id.get(entry.user_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user_id[entry.user_id]
+
+
+class UserCache(typing.Generic[TValue]):
+
+    def __init__(self, max_size: int, max_lifespan: datetime_module.timedelta):
+        self.max_size = max_size
+        self.max_lifespan = max_lifespan
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: collections.OrderedDict[custom_types.User.id,
+                                               tuple[TValue, custom_types.timestamp]] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: custom_types.User.id) -> TValue | None:
+
+        entry = self._entries.get(user_id)
+        if entry is None or time.time() >= entry[1]:
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, user_id: custom_types.User.id, value: TValue) -> None:
+
+        if self.max_size <= 0:
+            return
+
+        self._entries[user_id] = (
+            value, time.time() + self.max_lifespan.total_seconds())
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: custom_types.User.id) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+CREDENTIAL_CACHE: CredentialCache[typing.Any] = CredentialCache(
+    max_size=config.AUTH['credential_cache']['max_size'],
+    max_lifespan=config.AUTH['credential_cache']['max_lifespan']
+)
+
+USER_CACHE: UserCache[typing.Any] = UserCache(
+    max_size=config.AUTH['credential_cache']['max_size'],
+    max_lifespan=config.AUTH['credential_cache']['max_lifespan']
+)
+
+
+def invalidate_user(user_id: custom_types.User.id) -> None:
+    CREDENTIAL_CACHE.invalidate_user(user_id)
+    USER_CACHE.invalidate(user_id)
@@ -58,6 +58,15 @@ def authorization_expired() -> HTTPException:
     )
 
 
+def access_token_expired() -> HTTPException:
+    # the client should refresh instead of dropping the session
+    return Base(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Access token expired",
+        logout=False
+    )
+
+
 def user_not_found() -> HTTPException:
     return Base(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -90,6 +99,23 @@ def invalid_otp() -> HTTPException:
     )
 
 
+def too_many_requests() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many authentication attempts in progress, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
+def refresh_token_not_permitted() -> HTTPException:
+    # a stateless session's refresh token presented as its access token
+    return Base(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token not permitted as an access token",
+        logout=False
+    )
+
+
 def authorization_type_not_permitted(type: custom_types.AuthCredential.type) -> HTTPException:
     return Base(
         status_code=status.HTTP_400_BAD_REQUEST,
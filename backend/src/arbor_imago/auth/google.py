@@ -0,0 +1,157 @@
+import asyncio
+import datetime as datetime_module
+import logging
+import re
+import time
+import typing
+
+import httpx
+import jwt
+
+from arbor_imago import config
+
+"""
+Developer's Note:
+Google signs ID tokens with rotating RSA keys published as a JWKS document. The keys are cached in memory for the
+max-age of the response's Cache-Control header and refreshed ahead of expiry by a background task, so verifying a
+token is a local signature check. A token signed by a key we have not seen triggers one refresh, rate limited by
+min_refresh_interval so garbage tokens can not be used to hammer the JWKS endpoint.
+"""
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+
+class InvalidIdTokenError(ValueError):
+    pass
+
+
+class SigningKeysUnavailableError(Exception):
+    pass
+
+
+class GoogleIdTokenVerifier:
+
+    def __init__(self,
+                 client_id: str,
+                 jwks_url: str,
+                 issuers: list[str],
+                 min_refresh_interval: datetime_module.timedelta,
+                 transport: httpx.AsyncBaseTransport | None = None):
+
+        self.client_id = client_id
+        self.jwks_url = jwks_url
+        self.issuers = issuers
+        self.min_refresh_interval = min_refresh_interval
+        self.transport = transport
+
+        self.n_fetches = 0
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._expiry_timestamp = 0.0
+        self._last_fetch_timestamp = 0.0
+        self._lock: asyncio.Lock | None = None
+
+    @property
+    def expiry_timestamp(self) -> float:
+        return self._expiry_timestamp
+
+    async def refresh(self) -> None:
+
+        async with httpx.AsyncClient(transport=self.transport, timeout=10) as client:
+            response = await client.get(self.jwks_url)
+            response.raise_for_status()
+
+        keys: dict[str, jwt.PyJWK] = {}
+        for jwk in response.json()['keys']:
+            keys[jwk['kid']] = jwt.PyJWK(jwk)
+
+        max_age = _MAX_AGE_PATTERN.search(
+            response.headers.get('cache-control', ''))
+        lifespan = int(max_age.group(1)) if max_age else 0
+
+        self.n_fetches += 1
+        self._keys = keys
+        self._last_fetch_timestamp = time.time()
+        self._expiry_timestamp = self._last_fetch_timestamp + max(
+            lifespan, self.min_refresh_interval.total_seconds())
+
+    async def _refresh_if_allowed(self) -> None:
+
+        # created lazily so the lock belongs to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        last_fetch_timestamp = self._last_fetch_timestamp
+        async with self._lock:
+            # another caller refreshed while we waited
+            if self._last_fetch_timestamp != last_fetch_timestamp:
+                return
+            if time.time() - self._last_fetch_timestamp < self.min_refresh_interval.total_seconds():
+                return
+            await self.refresh()
+
+    async def get_signing_key(self, kid: str) -> jwt.PyJWK:
+
+        if kid not in self._keys or time.time() >= self._expiry_timestamp:
+            try:
+                await self._refresh_if_allowed()
+            except httpx.HTTPError as e:
+                # stale keys are better than none while google is unreachable
+                if kid not in self._keys:
+                    raise SigningKeysUnavailableError(
+                        'Could not fetch Google signing keys') from e
+                logger.warning(
+                    'Could not refresh Google signing keys, using cached keys')
+
+        if kid not in self._keys:
+            raise InvalidIdTokenError('Unknown signing key')
+        return self._keys[kid]
+
+    async def verify(self, token: str) -> dict[str, typing.Any]:
+        """Verify the token's signature, expiry, audience and issuer. Returns the claims"""
+
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.PyJWTError as e:
+            raise InvalidIdTokenError('Malformed ID token') from e
+        if kid is None:
+            raise InvalidIdTokenError('ID token has no key id')
+
+        signing_key = await self.get_signing_key(kid)
+
+        try:
+            return jwt.decode(
+                token,
+                signing_key,
+                algorithms=['RS256'],
+                audience=self.client_id,
+                issuer=self.issuers,
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidIdTokenError(str(e)) from e
+
+    async def run_refresher(self) -> None:
+        """Refresh the keys shortly before they expire, until cancelled. Keys are first fetched by the first verification"""
+
+        while True:
+            await asyncio.sleep(max(
+                self._expiry_timestamp - time.time() - self.min_refresh_interval.total_seconds(),
+                self.min_refresh_interval.total_seconds()
+            ))
+
+            if not self._keys:
+                continue
+
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('Failed to refresh Google signing keys')
+
+
+ID_TOKEN_VERIFIER = GoogleIdTokenVerifier(
+    client_id=config.GOOGLE_CLIENT_ID,
+    jwks_url=config.AUTH['google_id_token']['jwks_url'],
+    issuers=config.AUTH['google_id_token']['issuers'],
+    min_refresh_interval=config.AUTH['google_id_token']['min_refresh_interval'],
+)
@@ -0,0 +1,119 @@
+import asyncio
+import concurrent.futures
+import time
+import typing
+
+from arbor_imago import config, core_utils
+
+"""
+Developer's Note:
+bcrypt is deliberately slow (~250ms per call on small hosts) and would stall the event loop if called inline.
+All hashing and verification goes through PASSWORD_HASHER, which runs bcrypt in a dedicated executor.
+
+At most max_in_flight calls run at once, at most max_queued more wait for a worker. Anything beyond that
+is rejected immediately with OverloadedError (mapped to a 429 by the app) instead of piling up behind the pool.
+"""
+
+
+class OverloadedError(Exception):
+    pass
+
+
+class PasswordHasherStats(typing.TypedDict):
+    in_flight: int
+    queue_depth: int
+    completed: int
+    rejected: int
+    latency_seconds_total: float
+    latency_seconds_max: float
+
+
+class PasswordHasher:
+
+    def __init__(self,
+                 executor: typing.Literal['thread', 'process'],
+                 max_in_flight: int,
+                 max_queued: int,
+                 bcrypt_rounds: int):
+
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.bcrypt_rounds = bcrypt_rounds
+
+        self._executor: concurrent.futures.Executor | None = None
+        self._n_pending = 0
+        self._n_completed = 0
+        self._n_rejected = 0
+        self._latency_seconds_total = 0.0
+        self._latency_seconds_max = 0.0
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.executor == 'process':
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_in_flight)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_in_flight, thread_name_prefix='password_hasher')
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run[T](self, func: typing.Callable[..., T], *args) -> T:
+
+        # the executor queues work internally, pending counts both running and waiting calls
+        if self._n_pending >= self.max_in_flight + self.max_queued:
+            self._n_rejected += 1
+            raise OverloadedError('Password hashing queue is full')
+
+        self._n_pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._n_pending -= 1
+            latency = time.perf_counter() - start
+            self._n_completed += 1
+            self._latency_seconds_total += latency
+            self._latency_seconds_max = max(self._latency_seconds_max, latency)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(core_utils.hash_password, password, self.bcrypt_rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(core_utils.verify_password, plain_password, hashed_password)
+
+    def stats(self) -> PasswordHasherStats:
+        return {
+            'in_flight': min(self._n_pending, self.max_in_flight),
+            'queue_depth': max(self._n_pending - self.max_in_flight, 0),
+            'completed': self._n_completed,
+            'rejected': self._n_rejected,
+            'latency_seconds_total': self._latency_seconds_total,
+            'latency_seconds_max': self._latency_seconds_max,
+        }
+
+
+def calibrate_bcrypt_rounds(target_seconds: float, min_rounds: int = 4, max_rounds: int = 16) -> list[tuple[int, float]]:
+    """Time one hash per cost factor, stopping once the target latency is exceeded"""
+
+    timings: list[tuple[int, float]] = []
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        core_utils.hash_password('calibration', rounds)
+        timings.append((rounds, time.perf_counter() - start))
+        if timings[-1][1] > target_seconds:
+            break
+    return timings
+
+
+PASSWORD_HASHER = PasswordHasher(
+    executor=config.PASSWORD_HASHING['executor'],
+    max_in_flight=config.PASSWORD_HASHING['max_in_flight'],
+    max_queued=config.PASSWORD_HASHING['max_queued'],
+    bcrypt_rounds=config.PASSWORD_HASHING['bcrypt_rounds'],
+)
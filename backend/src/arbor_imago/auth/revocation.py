@@ -0,0 +1,103 @@
+import enum
+import hashlib
+import math
+import time
+import datetime as datetime_module
+
+from arbor_imago import config, custom_types
+from arbor_imago.auth.cache import AuthCredentialKey
+
+"""
+Developer's Note:
+Deleting an access token or api key writes a row to the auth_credential_revocation table. Every process keeps the
+revocations in memory so a cached resolution can be trusted without re-reading the credential row.
+
+Revocations seen while the process is running are held exactly, and answer REVOKED. Revocations loaded at startup
+(potentially millions) only go into a Bloom filter, which costs ~1.2MB per million entries at a 1% false positive rate.
+A Bloom filter hit answers UNKNOWN: the caller skips the cache and reads the credential row, which is authoritative.
+"""
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+
+        self.capacity = capacity
+        self.n_bits = max(
+            8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+
+        # double hashing, two 64 bit halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationStatus(enum.Enum):
+    NOT_REVOKED = 'not_revoked'
+    REVOKED = 'revoked'
+    UNKNOWN = 'unknown'
+
+
+def _bloom_item(key: AuthCredentialKey) -> str:
+    return '{}:{}'.format(*key)
+
+
+class RevocationFilter:
+
+    def __init__(self, bloom_capacity: int, bloom_false_positive_rate: float):
+        self.bloom_capacity = bloom_capacity
+        self.bloom_false_positive_rate = bloom_false_positive_rate
+        self.reset()
+
+    def reset(self) -> None:
+        self.last_revocation_id: custom_types.AuthCredentialRevocation.id = 0
+        self._bloom = BloomFilter(
+            self.bloom_capacity, self.bloom_false_positive_rate)
+        self._revoked: dict[AuthCredentialKey, custom_types.timestamp] = {}
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, key: AuthCredentialKey, expiry: datetime_module.datetime, exact: bool = True) -> None:
+
+        # exact revocations stay out of the bloom filter, it is sized for the revocations loaded at startup and every
+        # logout and refresh would otherwise fill it past capacity. Once pruned, their credentials have expired anyway
+        if exact:
+            self._revoked[key] = expiry.timestamp()
+        else:
+            self._bloom.add(_bloom_item(key))
+
+    def check(self, key: AuthCredentialKey) -> RevocationStatus:
+
+        if key in self._revoked:
+            return RevocationStatus.REVOKED
+        if _bloom_item(key) in self._bloom:
+            return RevocationStatus.UNKNOWN
+        return RevocationStatus.NOT_REVOKED
+
+    def prune(self) -> None:
+        """Forget exact revocations whose credential has expired, the time bounds check rejects those anyway"""
+
+        now = time.time()
+        for key in [key for key, expiry in self._revoked.items() if expiry <= now]:
+            del self._revoked[key]
+
+
+REVOCATIONS = RevocationFilter(
+    bloom_capacity=config.AUTH['revocation']['bloom_capacity'],
+    bloom_false_positive_rate=config.AUTH['revocation']['bloom_false_positive_rate'],
+)
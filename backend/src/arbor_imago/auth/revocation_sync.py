@@ -0,0 +1,47 @@
+import asyncio
+import datetime as datetime_module
+import logging
+
+from arbor_imago import config
+from arbor_imago.auth import cache as auth_cache, revocation
+from arbor_imago.services.auth_credential_revocation import AuthCredentialRevocation as AuthCredentialRevocationService
+
+logger = logging.getLogger(__name__)
+
+
+async def sync_revocations(exact: bool = True) -> int:
+    """Load revocations written since the last sync, including those from other processes. Returns the number loaded"""
+
+    dt_now = datetime_module.datetime.now().astimezone(datetime_module.UTC)
+
+    async with config.ASYNC_SESSIONMAKER() as session:
+        revocations = await AuthCredentialRevocationService.fetch_after(session, revocation.REVOCATIONS.last_revocation_id, dt_now)
+
+    for auth_credential_revocation in revocations:
+        key = (auth_credential_revocation.auth_credential_type,
+               auth_credential_revocation.auth_credential_id)
+        revocation.REVOCATIONS.add(
+            key, auth_credential_revocation.expiry, exact=exact)
+        auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential(*key)
+
+    if revocations:
+        revocation.REVOCATIONS.last_revocation_id = revocations[-1].id  # type: ignore
+    return len(revocations)
+
+
+async def rebuild_revocations() -> int:
+    """Start over from the table, revocations from before startup are only kept in the Bloom filter"""
+
+    revocation.REVOCATIONS.reset()
+    return await sync_revocations(exact=False)
+
+
+async def run_revocation_sync(interval: datetime_module.timedelta) -> None:
+
+    while True:
+        await asyncio.sleep(interval.total_seconds())
+        try:
+            await sync_revocations()
+            revocation.REVOCATIONS.prune()
+        except Exception:
+            logger.exception('Failed to sync auth credential revocations')
@@ -0,0 +1,48 @@
+import asyncio
+import datetime as datetime_module
+import logging
+
+from arbor_imago import config, services
+from arbor_imago.schemas import AuthCredentialTableType
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+from arbor_imago.services.otp import OTP as OTPService
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.services.auth_credential_revocation import AuthCredentialRevocation as AuthCredentialRevocationService
+
+logger = logging.getLogger(__name__)
+
+SWEPT_SERVICES: tuple[services.AuthCredentialTableService, ...] = (
+    UserAccessTokenService,
+    OTPService,
+    ApiKeyService,
+)
+
+
+async def sweep_expired_auth_credentials(batch_size: int) -> dict[AuthCredentialTableType, int]:
+    """Delete all expired table-backed auth credentials, returns the number of rows deleted per type"""
+
+    dt_now = datetime_module.datetime.now().astimezone(datetime_module.UTC)
+
+    n_deleted: dict[AuthCredentialTableType, int] = {}
+    async with config.ASYNC_SESSIONMAKER() as session:
+        for service in SWEPT_SERVICES:
+            n_deleted[service.auth_type.value] = await service.delete_expired(session, dt_now, batch_size)
+
+        # once the credential would have expired, its revocation is no longer needed
+        await AuthCredentialRevocationService.delete_expired(session, dt_now)
+
+    return n_deleted
+
+
+async def run_sweeper(interval: datetime_module.timedelta, batch_size: int) -> None:
+    """Sweep on a fixed interval until cancelled"""
+
+    while True:
+        try:
+            n_deleted = await sweep_expired_auth_credentials(batch_size)
+            logger.info('Swept {} expired auth credentials: {}'.format(
+                sum(n_deleted.values()), n_deleted))
+        except Exception:
+            logger.exception('Failed to sweep expired auth credentials')
+
+        await asyncio.sleep(interval.total_seconds())
@@ -13,8 +13,8 @@ from typing import Annotated, Generic
 from fastapi import Request, HTTPException, status, Response
 import datetime as datetime_module
 
-from arbor_imago import custom_types, auth, utils, config, models, schemas, services
-from arbor_imago.auth import exceptions
+from arbor_imago import custom_types, auth, utils, config, models, schemas, services, notifications, database
+from arbor_imago.auth import exceptions, cache as auth_cache, revocation
 from arbor_imago.models import tables
 from arbor_imago.schemas import user as user_schema, user_access_token as user_access_token_schema, sign_up as sign_up_schema, otp as otp_schema, auth_credential as auth_credential_schema
 from arbor_imago.services.user import User as UserService
@@ -22,6 +22,7 @@ from arbor_imago.services.user_access_token import UserAccessToken as UserAccess
 from arbor_imago.services.sign_up import SignUp as SignUpService
 from arbor_imago.services.otp import OTP as OTPService
 from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.services.stateless_access_token import StatelessAccessToken as StatelessAccessTokenService
 from arbor_imago.services import auth_credential as auth_credential_service
 
 
@@ -42,6 +43,44 @@ def delete_access_token_cookie(response: Response):
     response.delete_cookie(config.ACCESS_TOKEN_COOKIE['key'])
 
 
+def set_refresh_token_cookie(response: Response, refresh_token: custom_types.JwtEncodedStr, expiry: datetime_module.datetime | None = None):
+
+    kwargs = {}
+    if expiry:
+        kwargs['expires'] = expiry
+
+    response.set_cookie(
+        **{**config.ACCESS_TOKEN_COOKIE,
+            'key': config.AUTH['stateless_access_token']['refresh_token_cookie_key']},
+        value=refresh_token,
+        **kwargs
+    )
+
+
+def delete_refresh_token_cookie(response: Response):
+    response.delete_cookie(
+        config.AUTH['stateless_access_token']['refresh_token_cookie_key'])
+
+
+def set_auth_cookies(response: Response, user: tables.User, user_access_token: tables.UserAccessToken, expiry: datetime_module.datetime | None = None) -> custom_types.JwtEncodedStr:
+    """Set the cookie(s) for a newly issued user access token. Returns the jwt clients should send as their access token"""
+
+    encoded_user_access_token = utils.jwt_encode(typing.cast(
+        dict, UserAccessTokenService.to_jwt_payload(user_access_token)))
+
+    if not config.AUTH['stateless_access_token']['enabled']:
+        set_access_token_cookie(response, encoded_user_access_token, expiry)
+        return encoded_user_access_token
+
+    # the user access token becomes the refresh credential, the access token is stateless
+    set_refresh_token_cookie(response, encoded_user_access_token, expiry)
+
+    encoded_stateless_access_token = utils.jwt_encode(typing.cast(dict, StatelessAccessTokenService.to_jwt_payload(
+        StatelessAccessTokenService.model_inst_from_user(user))))
+    set_access_token_cookie(response, encoded_stateless_access_token, expiry)
+    return encoded_stateless_access_token
+
+
 class OAuth2PasswordBearerMultiSource(OAuth2):
     def __init__(
         self,
@@ -135,6 +174,8 @@ class GetAuthFromTableKwargs(
     session: AsyncSession
     auth_credential_service: services.AuthCredentialTableService
     dt_now: typing.NotRequired[datetime_module.datetime]
+    user: typing.NotRequired[tables.User | None]
+    scope_ids: typing.NotRequired[set[custom_types.Scope.id]]
 
 
 class GetAuthFromJwtKwargs(
@@ -165,6 +206,13 @@ def is_valid_time_bounds(
     return True
 
 
+def has_required_scopes(scope_ids: set[custom_types.Scope.id], required_scopes: set[custom_types.Scope.name]) -> bool:
+    return set(
+        [config.SCOPE_NAME_MAPPING[scope_name]
+            for scope_name in required_scopes]
+    ).issubset(scope_ids)
+
+
 async def get_auth_from_auth_credential_table_inst(
     auth_credential_table_inst: schemas.TAuthCredentialTableInstance,
         **kwargs: typing.Unpack[GetAuthFromTableKwargs]
@@ -177,39 +225,26 @@ async def get_auth_from_auth_credential_table_inst(
     dt_now = kwargs.get(
         'dt_now', datetime_module.datetime.now().astimezone(datetime_module.UTC))
 
-    # validate time bounds
+    # validate time bounds, expired rows are removed by the sweeper, not on the read path
     if not is_valid_time_bounds(auth_credential_table_inst.issued, auth_credential_table_inst.expiry, dt_now, override_lifetime):
-        await service.delete(
-            {
-                'session': session,
-                'admin': True,
-                'authorized_user_id': auth_credential_table_inst.user_id,
-                'id': auth_credential_table_inst.id,
-            }
-        )
         return GetAuthReturn(exception=exceptions.authorization_expired())
 
-    # if no user is associated with the auth_credential, raise an exception
-    async with config.ASYNC_SESSIONMAKER() as session:
-        user = await UserService.read(
-            {
-                'session': session,
-                'id': auth_credential_table_inst.user_id,
-                'admin': True,
-                'authorized_user_id': auth_credential_table_inst.user_id,
-            })
+    # the user and scope_ids may have been loaded alongside the auth_credential
+    if 'user' in kwargs:
+        user = kwargs['user']
+    else:
+        user = await UserService.fetch_by_id(session, auth_credential_table_inst.user_id)
 
+    # if no user is associated with the auth_credential, raise an exception
     if user is None:
         return GetAuthReturn(exception=exceptions.user_not_found())
 
-    required_scope_ids = set(
-        [config.SCOPE_NAME_MAPPING[scope_name]
-            for scope_name in required_scopes]
-    )
-
-    scope_ids = set(await service.get_scope_ids(inst=auth_credential_table_inst, session=session))  # type: ignore # noqa
+    if 'scope_ids' in kwargs:
+        scope_ids = kwargs['scope_ids']
+    else:
+        scope_ids = set(await service.get_scope_ids(inst=auth_credential_table_inst, session=session))  # type: ignore # noqa
 
-    if not required_scope_ids.issubset(scope_ids):
+    if not has_required_scopes(scope_ids, required_scopes):
         return GetAuthReturn(exception=exceptions.not_permitted())
 
     return GetAuthReturn(
@@ -220,22 +255,73 @@ async def get_auth_from_auth_credential_table_inst(
     )
 
 
+async def get_auth_from_stateless_access_token_payload(payload: auth_credential_schema.JwtPayload[typing.Any], required_scopes: set[custom_types.Scope.name]) -> GetAuthReturn[schemas.AuthCredentialJwtInstance]:
+    """Role and scopes come from the signed claims. The user and their token epoch come from USER_CACHE, only a cache miss reads the database"""
+
+    try:
+        StatelessAccessTokenService.validate_jwt_claims(payload)
+    except auth_credential_service.MissingRequiredClaimsError as e:
+        return GetAuthReturn(exception=exceptions.missing_required_claims(set(e.claims)))
+
+    auth_credential = StatelessAccessTokenService.model_inst_from_jwt_payload(
+        payload)
+
+    cached = typing.cast(tuple[user_schema.UserPrivate, custom_types.User.token_epoch] | None,
+                         auth_cache.USER_CACHE.get(auth_credential.user_id))
+    if cached is None:
+        async with database.session() as session:
+            user = await UserService.fetch_by_id(session, auth_credential.user_id)
+        if user is None:
+            return GetAuthReturn(exception=exceptions.user_not_found())
+
+        cached = (user_schema.UserPrivate.model_validate(
+            user), user.token_epoch)
+        auth_cache.USER_CACHE.set(auth_credential.user_id, cached)
+
+    user_private, token_epoch = cached
+
+    # logging out everywhere increments the epoch
+    if auth_credential.token_epoch != token_epoch:
+        return GetAuthReturn(exception=exceptions.authorization_expired())
+
+    scope_ids = set(auth_credential.scope_ids)
+    if not has_required_scopes(scope_ids, required_scopes):
+        return GetAuthReturn(exception=exceptions.not_permitted())
+
+    return GetAuthReturn(
+        isAuthorized=True,
+        user=user_private,
+        scope_ids=scope_ids,
+        auth_credential=auth_credential
+    )
+
+
+def default_permitted_types() -> set[schemas.AuthCredentialJwtType]:
+    """With stateless access tokens on, the UserAccessToken is the long lived refresh credential, it is only accepted
+    where it is permitted explicitly (refreshing, logging out)"""
+
+    if config.AUTH['stateless_access_token']['enabled']:
+        return {StatelessAccessTokenService.auth_type.value, ApiKeyService.auth_type.value}
+    return {UserAccessTokenService.auth_type.value, ApiKeyService.auth_type.value, StatelessAccessTokenService.auth_type.value}
+
+
 async def get_auth_from_auth_credential_jwt(**kwargs: typing.Unpack[GetAuthFromJwtKwargs]) -> GetAuthReturn[schemas.AuthCredentialJwtInstance]:
 
     token = kwargs.get('token', None)
     required_scopes = kwargs.get('required_scopes', set())
-    permitted_types = kwargs.get(
-        'permitted_types', {UserAccessTokenService.auth_type.value, ApiKeyService.auth_type.value})
+    permitted_types = kwargs.get('permitted_types', None)
+    if permitted_types is None:
+        permitted_types = default_permitted_types()
     override_lifetime = kwargs.get('override_lifetime', None)
 
     # 1. if token is blank
     if token is None:
         return GetAuthReturn(exception=exceptions.missing_authorization())
 
-    # 2. make sure the token is a valid jwt
+    # 2. make sure the token is a valid jwt, expiry is checked in step 5 so the response depends on the type
     try:
         payload = typing.cast(
-            auth_credential_schema.JwtPayload[typing.Any], utils.jwt_decode(token))
+            auth_credential_schema.JwtPayload[typing.Any], utils.jwt_decode(token, verify_exp=False))
     except:
         return GetAuthReturn(exception=exceptions.improper_format())
 
@@ -251,6 +337,8 @@ async def get_auth_from_auth_credential_jwt(**kwargs: typing.Unpack[GetAuthFromJ
     # 4. check if the auth_credential type is permitted
     auth_type = payload['type']
     if auth_type not in permitted_types:
+        if auth_type == UserAccessTokenService.auth_type.value and config.AUTH['stateless_access_token']['enabled']:
+            return GetAuthReturn(exception=exceptions.refresh_token_not_permitted())
         return GetAuthReturn(exception=exceptions.authorization_type_not_permitted(auth_type))
 
     AuthCredentialService = services.AUTH_CREDENTIAL_TYPE_TO_SERVICE[auth_type]
@@ -263,39 +351,74 @@ async def get_auth_from_auth_credential_jwt(**kwargs: typing.Unpack[GetAuthFromJ
 
     # 5. validate time bounds encoded in the jwt
     if not is_valid_time_bounds(dt_issued, dt_expiry, dt_now, override_lifetime):
+        if AuthCredentialService is StatelessAccessTokenService:
+            return GetAuthReturn(exception=exceptions.access_token_expired())
         return GetAuthReturn(exception=exceptions.authorization_expired())
 
+    if AuthCredentialService is StatelessAccessTokenService:
+        return await get_auth_from_stateless_access_token_payload(payload, required_scopes)
+
     # if the auth_credential is stored in a table, check its db entry
     if issubclass(AuthCredentialService, auth_credential_service.Table):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
-
-            AuthCredentialService = typing.cast(
-                services.AuthCredentialJwtAndTableService, AuthCredentialService)
-
-            auth_credential_table_inst_from_db = await AuthCredentialService.read({
-                'session': session,
-                'id': payload['sub'],
-                'admin': True,
-                'authorized_user_id': None
-            })
-
-            if not auth_credential_table_inst_from_db:
-                return GetAuthReturn(exception=exceptions.authorization_expired())
-
-            return await get_auth_from_auth_credential_table_inst(
-                auth_credential_table_inst_from_db,
-                auth_credential_service=AuthCredentialService,
-                session=session,
-                dt_now=dt_now,
-                **{
-                    k: v for k, v in {
-                        'required_scopes': required_scopes,
-                        'override_lifetime': override_lifetime
-                    }.items() if v
-                }
+        AuthCredentialService = typing.cast(
+            services.AuthCredentialJwtAndTableService, AuthCredentialService)
+
+        revocation_status = revocation.REVOCATIONS.check(
+            (auth_type, payload['sub']))
+        if revocation_status is revocation.RevocationStatus.REVOKED:
+            return GetAuthReturn(exception=exceptions.authorization_expired())
+
+        # resolutions are cached without required scopes or lifetime overrides, those are checked per call
+        # a Bloom filter hit may be a false positive, only the credential row can tell
+        get_auth_return = None
+        if revocation_status is revocation.RevocationStatus.NOT_REVOKED:
+            get_auth_return = typing.cast(
+                GetAuthReturn[schemas.AuthCredentialJwtAndTableInstance] | None, auth_cache.CREDENTIAL_CACHE.get(token))
+
+        if get_auth_return is None:
+            async with database.session() as session:
+
+                # credential, user and scopes in one round trip
+                auth_context = await AuthCredentialService.fetch_auth_context(session, payload['sub'])
+
+                if auth_context is None:
+                    return GetAuthReturn(exception=exceptions.authorization_expired())
+
+                get_auth_return = await get_auth_from_auth_credential_table_inst(
+                    auth_context.auth_credential,
+                    auth_credential_service=AuthCredentialService,
+                    session=session,
+                    dt_now=dt_now,
+                    user=auth_context.user,
+                    scope_ids=auth_context.scope_ids,
+                )
+
+                # the credential outlives the session in the cache, detached a rollback can't expire its attributes
+                session.expunge(auth_context.auth_credential)
+
+            if get_auth_return.exception:
+                return get_auth_return
+
+            auth_cache.CREDENTIAL_CACHE.set(
+                token,
+                get_auth_return,
+                auth_credential_key=(auth_type, payload['sub']),
+                user_id=get_auth_return._user_id,
+                expiry=auth_context.auth_credential.expiry
             )
 
+        auth_credential = typing.cast(
+            schemas.AuthCredentialJwtAndTableInstance, get_auth_return.auth_credential)
+
+        if not is_valid_time_bounds(auth_credential.issued, auth_credential.expiry, dt_now, override_lifetime):
+            return GetAuthReturn(exception=exceptions.authorization_expired())
+
+        if not has_required_scopes(typing.cast(set[custom_types.Scope.id], get_auth_return.scope_ids), required_scopes):
+            return GetAuthReturn(exception=exceptions.not_permitted())
+
+        return get_auth_return
+
     else:
 
         AuthCredentialService = typing.cast(
@@ -359,7 +482,7 @@ def get_user_session_info(get_authorization_return: GetAuthReturn) -> GetUserSes
 def make_authenticate_user_with_username_and_password_dependency():
     async def authenticate_user_with_username_and_password(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> tables.User:
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = await UserService.authenticate(
                 session, form_data.username, form_data.password)
 
@@ -389,8 +512,8 @@ async def send_signup_link(session: AsyncSession, user: tables.User | None, emai
                                       config.FRONTEND_ROUTES['verify_magic_link'], utils.jwt_encode(typing.cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token))))
 
         if email:
-            utils.send_email(
-                email, 'Sign Up Request', 'Somebody requested to sign up with this email. An account already exists with this email. Click here to login instead: {}'.format(url))
+            notifications.DISPATCHER.enqueue(notifications.Email(
+                email, 'Sign Up Request', 'Somebody requested to sign up with this email. An account already exists with this email. Click here to login instead: {}'.format(url)))
 
     else:
 
@@ -404,8 +527,8 @@ async def send_signup_link(session: AsyncSession, user: tables.User | None, emai
                                       config.FRONTEND_ROUTES['verify_signup'], sign_up_jwt)
 
         if email:
-            utils.send_email(email, 'Sign Up',
-                             'Click here to sign up: {}'.format(url))
+            notifications.DISPATCHER.enqueue(notifications.Email(
+                email, 'Sign Up', 'Click here to sign up: {}'.format(url)))
 
 
 class LoginWithOTPResponse(GetUserSessionInfoNestedReturn):
@@ -421,20 +544,25 @@ async def login_otp(session: AsyncSession, user: tables.User | None, response: R
         OTPService._MODEL.user_id == user.id)
     otp = await OTPService.fetch_one(session, query)
 
-    if otp is None or OTPService.verify_code(code, otp.hashed_code) is False:
+    if otp is None or await OTPService.verify_code(code, otp.hashed_code) is False:
         raise exceptions.invalid_otp()
 
     get_auth = await get_auth_from_auth_credential_table_inst(
         otp,
         session=session,
         auth_credential_service=OTPService,
-        override_lifetime=config.AUTH['credential_lifespans']['access_token']
+        override_lifetime=config.AUTH['credential_lifespans']['access_token'],
+        user=user
     )
 
     if get_auth.exception:
         raise get_auth.exception
 
-    # if the code is active and correct, create a new access token
+    # one time code, delete the otp before issuing the access token
+    if not await OTPService.spend(session, otp):
+        raise exceptions.invalid_otp()
+
+    # the code was active and correct, create a new access token
     user_access_token = await UserAccessTokenService.create({
         'authorized_user_id': user.id,
         'session': session,
@@ -446,18 +574,8 @@ async def login_otp(session: AsyncSession, user: tables.User | None, response: R
         'admin': False
     })
 
-    set_access_token_cookie(response, utils.jwt_encode(typing.cast(
-        dict, UserAccessTokenService.to_jwt_payload(user_access_token))), expiry=user_access_token.expiry)
-
-    # one time link, delete the otp
-    await OTPService.delete(
-        {
-            'session': session,
-            'id': otp.id,
-            'authorized_user_id': user.id,
-            'admin': False
-        }
-    )
+    set_auth_cookies(response, user, user_access_token,
+                     expiry=user_access_token.expiry)
 
     return LoginWithOTPResponse(
         auth=GetUserSessionInfoReturn(
@@ -469,6 +587,68 @@ async def login_otp(session: AsyncSession, user: tables.User | None, response: R
     )
 
 
+class RefreshResponse(GetUserSessionInfoNestedReturn):
+    pass
+
+
+async def use_once(session: AsyncSession, user_access_token: tables.UserAccessToken) -> None:
+    """Delete a one time credential (refresh token, magic link) before anything is issued in exchange for it.
+    Grouped writes commit on their own, if a later write fails the credential is spent rather than left reusable"""
+
+    if not await UserAccessTokenService.spend(session, user_access_token):
+        # a concurrent request presenting the same credential used it first
+        raise exceptions.authorization_expired()
+
+
+async def refresh_access_token(session: AsyncSession, response: Response, refresh_token: custom_types.JwtEncodedStr | None) -> RefreshResponse:
+    """Rotate the refresh credential and issue a new stateless access token. The new refresh credential keeps the old expiry"""
+
+    authorization = await get_auth_from_auth_credential_jwt(
+        token=refresh_token, permitted_types={UserAccessTokenService.auth_type.value})
+    if authorization.exception:
+        raise authorization.exception
+
+    auth_credential = typing.cast(
+        tables.UserAccessToken, authorization.auth_credential)
+    user = await UserService.fetch_by_id(session, auth_credential.user_id)
+    if user is None:
+        raise exceptions.user_not_found()
+
+    # a refresh token may only be used once
+    await use_once(session, auth_credential)
+
+    user_access_token = await UserAccessTokenService.create({
+        'authorized_user_id': user.id,
+        'session': session,
+        'admin': False,
+        'create_model': user_access_token_schema.UserAccessTokenAdminCreate(
+            user_id=user.id,
+            expiry=auth_credential.expiry,
+        ),
+    })
+
+    set_auth_cookies(response, user, user_access_token,
+                     expiry=user_access_token.expiry)
+
+    return RefreshResponse(auth=GetUserSessionInfoReturn(
+        user=user_schema.UserPrivate.model_validate(user),
+        scope_ids=set(config.USER_ROLE_ID_SCOPE_IDS[user.user_role_id]),
+        access_token=user_access_token_schema.UserAccessTokenPublic.model_validate(
+            user_access_token)
+    ))
+
+
+async def logout_everywhere(session: AsyncSession, user_id: custom_types.User.id) -> None:
+    """Revoke every access token, refresh token and stateless access token issued to the user"""
+
+    user = await UserService.fetch_by_id(session, user_id)
+    if user is None:
+        raise exceptions.user_not_found()
+
+    await UserAccessTokenService.delete_by_user_id(session, user_id)
+    await UserService.increment_token_epoch(session, user)
+
+
 async def create_magic_link(session: AsyncSession, user: tables.User, email: typing.Optional[custom_types.User.email] = None, phone_number: typing.Optional[custom_types.User.phone_number] = None) -> str:
 
     user_access_token = await UserAccessTokenService.create(
@@ -489,11 +669,12 @@ async def create_magic_link(session: AsyncSession, user: tables.User, email: typ
 async def send_magic_link(url: str, user: tables.User, email: typing.Optional[custom_types.User.email] = None, phone_number: typing.Optional[custom_types.User.phone_number] = None):
 
     if email:
-        utils.send_email(email, 'Magic Link',
-                         'Click to login: {}'.format(url))
+        notifications.DISPATCHER.enqueue(notifications.Email(
+            email, 'Magic Link', 'Click to login: {}'.format(url)))
     if phone_number:
         if user.phone_number:
-            utils.send_sms(user.phone_number, 'Click to login: {}'.format(url))
+            notifications.DISPATCHER.enqueue(notifications.SMS(
+                user.phone_number, 'Click to login: {}'.format(url)))
 
 
 async def create_otp(session: AsyncSession, user: tables.User, email: typing.Optional[custom_types.User.email] = None, phone_number: typing.Optional[custom_types.User.phone_number] = None) -> custom_types.OTP.code:
@@ -519,7 +700,7 @@ async def create_otp(session: AsyncSession, user: tables.User, email: typing.Opt
         'session': session,
         'admin': False,
         'create_model': otp_schema.OTPAdminCreate(
-            user_id=user.id, hashed_code=OTPService.hash_code(code), expiry=auth_credential_service.lifespan_to_expiry(config.AUTH['credential_lifespans']['otp'])
+            user_id=user.id, hashed_code=await OTPService.hash_code(code), expiry=auth_credential_service.lifespan_to_expiry(config.AUTH['credential_lifespans']['otp'])
         )
     })
 
@@ -529,6 +710,8 @@ async def create_otp(session: AsyncSession, user: tables.User, email: typing.Opt
 async def send_otp(code: custom_types.OTP.code, user: tables.User, email: typing.Optional[custom_types.User.email] = None, phone_number: typing.Optional[custom_types.User.phone_number] = None):
 
     if email:
-        utils.send_email(email, 'OTP', 'Your OTP is: {}'.format(code))
+        notifications.DISPATCHER.enqueue(notifications.Email(
+            email, 'OTP', 'Your OTP is: {}'.format(code)))
     if phone_number:
-        utils.send_sms(phone_number, 'Your OTP is: {}'.format(code))
+        notifications.DISPATCHER.enqueue(notifications.SMS(
+            phone_number, 'Your OTP is: {}'.format(code)))
@@ -5,6 +5,8 @@ from sqlmodel import SQLModel
 import uvicorn
 from arbor_imago import models, config
 from arbor_imago.app import app as fastapi_app
+from arbor_imago.auth import hashing
+from arbor_imago.services.gallery_closure import GalleryClosure as GalleryClosureService
 
 cli = typer.Typer()
 
@@ -25,6 +27,31 @@ def create_tables():
     asyncio.run(_main())
 
 
+@cli.command()
+def rebuild_gallery_closure():
+    """Rebuild the gallery_closure table from each gallery's parent_id."""
+    async def _main() -> int:
+        async with config.ASYNC_SESSIONMAKER() as session:
+            return await GalleryClosureService.rebuild(session)
+
+    print('Rebuilt gallery closure, {} rows'.format(asyncio.run(_main())))
+
+
+@cli.command()
+def calibrate_bcrypt(target_ms: int = 250):
+    """Find the highest bcrypt cost factor that hashes within the target latency on this host."""
+
+    timings = hashing.calibrate_bcrypt_rounds(target_ms / 1000)
+    for rounds, seconds in timings:
+        print('rounds={:>2} {:>8.1f}ms'.format(rounds, seconds * 1000))
+
+    within_target = [rounds for rounds, seconds in timings if seconds <= target_ms / 1000]
+    if not within_target:
+        print('No cost factor hashes within {}ms'.format(target_ms))
+        return
+    print('Set PASSWORD_HASHING.bcrypt_rounds: {}'.format(max(within_target)))
+
+
 @cli.command()
 def export_openapi():
     """Export OpenAPI schema to file."""
@@ -1,5 +1,5 @@
-from sqlmodel.ext.asyncio.session import AsyncSession as SQLMAsyncSession
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.engine import make_url
 import json
 from pathlib import Path
 import os
@@ -12,7 +12,7 @@ import isodate
 from platformdirs import user_config_dir
 import warnings
 import secrets
-from arbor_imago import custom_types, core_utils
+from arbor_imago import custom_types, core_utils, db_routing
 import arbor_imago
 
 ARBOR_IMAGO_DIR = Path(__file__).parent  # /gallery/backend/src/arbor_imago/
@@ -192,17 +192,137 @@ OTP_LENGTH: int = _SHARED_CONFIG['OTP_LENGTH']
 # Backend Config
 
 
+class DbSqliteEnv(TypedDict):
+    journal_mode: NotRequired[Literal['wal', 'delete', 'truncate', 'persist', 'memory', 'off']]
+    synchronous: NotRequired[Literal['off', 'normal', 'full', 'extra']]
+    cache_size: NotRequired[int]
+    mmap_size: NotRequired[int]
+    busy_timeout: NotRequired[custom_types.ISO8601DurationStr]
+    temp_store: NotRequired[Literal['default', 'file', 'memory']]
+    foreign_keys: NotRequired[bool]
+
+
+DbTopology = Literal['pool', 'single_writer']
+
+
+class DbEngineEnv(TypedDict):
+    topology: NotRequired[DbTopology]
+    pool_size: NotRequired[int]
+    max_overflow: NotRequired[int]
+    pool_timeout: NotRequired[custom_types.ISO8601DurationStr]
+    pool_pre_ping: NotRequired[bool]
+    pool_recycle: NotRequired[custom_types.ISO8601DurationStr | None]
+    sqlite: NotRequired[DbSqliteEnv]
+
+
 class DbEnv(TypedDict):
     URL: str
+    ENGINE: NotRequired[DbEngineEnv]
 
 
 CredentialNames = typing.Literal['access_token',
                                  'magic_link', 'request_sign_up', 'otp']
 
 
+class CredentialCacheEnv(TypedDict):
+    max_size: NotRequired[int]
+    max_lifespan: NotRequired[custom_types.ISO8601DurationStr]
+
+
+class ExpiredCredentialSweepEnv(TypedDict):
+    enabled: NotRequired[bool]
+    interval: NotRequired[custom_types.ISO8601DurationStr]
+    batch_size: NotRequired[int]
+
+
+OTPHasherName = Literal['hmac-sha256', 'bcrypt']
+
+
+class GoogleIdTokenEnv(TypedDict):
+    jwks_url: NotRequired[str]
+    issuers: NotRequired[list[str]]
+    min_refresh_interval: NotRequired[custom_types.ISO8601DurationStr]
+
+
+class RevocationEnv(TypedDict):
+    bloom_capacity: NotRequired[int]
+    bloom_false_positive_rate: NotRequired[float]
+    sync_interval: NotRequired[custom_types.ISO8601DurationStr]
+
+
+class StatelessAccessTokenEnv(TypedDict):
+    enabled: NotRequired[bool]
+    lifespan: NotRequired[custom_types.ISO8601DurationStr]
+    refresh_token_cookie_key: NotRequired[str]
+
+
 class AuthEnv(TypedDict):
     credential_lifespans: dict[CredentialNames,
                                custom_types.ISO8601DurationStr]
+    otp_hasher: NotRequired[OTPHasherName]
+    credential_cache: NotRequired[CredentialCacheEnv]
+    expired_credential_sweep: NotRequired[ExpiredCredentialSweepEnv]
+    stateless_access_token: NotRequired[StatelessAccessTokenEnv]
+    revocation: NotRequired[RevocationEnv]
+    google_id_token: NotRequired[GoogleIdTokenEnv]
+
+
+class PasswordHashingEnv(TypedDict):
+    executor: NotRequired[Literal['thread', 'process']]
+    max_in_flight: NotRequired[int]
+    max_queued: NotRequired[int]
+    bcrypt_rounds: NotRequired[int]
+
+
+class GalleriesEnv(TypedDict):
+    path_cache_max_size: NotRequired[int]
+
+
+GroupCommitServiceName = Literal['user_access_token', 'otp']
+
+
+class GroupCommitEnv(TypedDict):
+    window: NotRequired[custom_types.ISO8601DurationStr]
+    max_batch_size: NotRequired[int]
+    services: NotRequired[list[GroupCommitServiceName]]
+
+
+class SqlInstrumentationEnv(TypedDict):
+    enabled: NotRequired[bool]
+    server_timing: NotRequired[bool]
+    max_statements: NotRequired[int]
+    max_duration: NotRequired[custom_types.ISO8601DurationStr]
+    max_repeats: NotRequired[int]
+
+
+class MetricsEnv(TypedDict):
+    enabled: NotRequired[bool]
+    latency_buckets: NotRequired[list[float]]
+    event_loop_lag_interval: NotRequired[custom_types.ISO8601DurationStr]
+
+
+class SmtpEnv(TypedDict):
+    host: str
+    port: NotRequired[int]
+    sender: str
+    username: NotRequired[str]
+    starttls: NotRequired[bool]
+    pool_size: NotRequired[int]
+    timeout: NotRequired[float]
+
+
+class NotificationChannelEnv(TypedDict):
+    transport: NotRequired[Literal['console', 'smtp']]
+    concurrency: NotRequired[int]
+    smtp: NotRequired[SmtpEnv]
+
+
+class NotificationsEnv(TypedDict):
+    max_queued: NotRequired[int]
+    max_retries: NotRequired[int]
+    retry_backoff: NotRequired[custom_types.ISO8601DurationStr]
+    email: NotRequired[NotificationChannelEnv]
+    sms: NotRequired[NotificationChannelEnv]
 
 
 class AccessTokenCookie(TypedDict):
@@ -218,6 +338,12 @@ class BackendConfig(TypedDict):
     MEDIA_DIR: str
     GOOGLE_CLIENT_PATH: str
     AUTH: AuthEnv
+    PASSWORD_HASHING: NotRequired[PasswordHashingEnv]
+    GALLERIES: NotRequired[GalleriesEnv]
+    GROUP_COMMIT: NotRequired[GroupCommitEnv]
+    SQL_INSTRUMENTATION: NotRequired[SqlInstrumentationEnv]
+    METRICS: NotRequired[MetricsEnv]
+    NOTIFICATIONS: NotRequired[NotificationsEnv]
     OPENAPI_SCHEMA_PATH: str
     ACCESS_TOKEN_COOKIE: AccessTokenCookie
 
@@ -226,12 +352,89 @@ with BACKEND_CONFIG_PATH.open('r') as f:
     _BACKEND_CONFIG: BackendConfig = yaml.safe_load(f)
 
 
-DB_ASYNC_ENGINE = create_async_engine(_BACKEND_CONFIG['DB']['URL'])
-ASYNC_SESSIONMAKER = async_sessionmaker(
-    bind=DB_ASYNC_ENGINE,
-    class_=SQLMAsyncSession,
-    expire_on_commit=False
-)
+class DbSqliteConfig(TypedDict):
+    journal_mode: str
+    synchronous: str
+    cache_size: int
+    mmap_size: int
+    busy_timeout: datetime_module.timedelta
+    temp_store: str
+    foreign_keys: bool
+
+
+class DbEngineConfig(TypedDict):
+    topology: DbTopology
+    pool_size: int
+    max_overflow: int
+    pool_timeout: datetime_module.timedelta
+    pool_pre_ping: bool
+    pool_recycle: datetime_module.timedelta | None
+    sqlite: DbSqliteConfig
+
+
+_db_engine_env: DbEngineEnv = _BACKEND_CONFIG['DB'].get('ENGINE', {})
+_db_sqlite_env: DbSqliteEnv = _db_engine_env.get('sqlite', {})
+_db_pool_recycle = _db_engine_env.get('pool_recycle', None)
+
+DB_ENGINE: DbEngineConfig = {
+    'topology': _db_engine_env.get('topology', 'pool'),
+    'pool_size': _db_engine_env.get('pool_size', 5),
+    'max_overflow': _db_engine_env.get('max_overflow', 10),
+    'pool_timeout': isodate.parse_duration(_db_engine_env.get('pool_timeout', 'PT30S')),
+    'pool_pre_ping': _db_engine_env.get('pool_pre_ping', False),
+    'pool_recycle': isodate.parse_duration(_db_pool_recycle) if _db_pool_recycle is not None else None,
+    'sqlite': {
+        'journal_mode': _db_sqlite_env.get('journal_mode', 'wal'),
+        'synchronous': _db_sqlite_env.get('synchronous', 'normal'),
+        'cache_size': _db_sqlite_env.get('cache_size', -64000),
+        'mmap_size': _db_sqlite_env.get('mmap_size', 268435456),
+        'busy_timeout': isodate.parse_duration(_db_sqlite_env.get('busy_timeout', 'PT5S')),
+        'temp_store': _db_sqlite_env.get('temp_store', 'memory'),
+        'foreign_keys': _db_sqlite_env.get('foreign_keys', True),
+    },
+}
+
+DB_URL = make_url(_BACKEND_CONFIG['DB']['URL'])
+DB_IS_SQLITE = DB_URL.get_backend_name() == 'sqlite'
+_DB_IS_SQLITE_MEMORY = DB_IS_SQLITE and DB_URL.database in (
+    None, '', ':memory:')
+
+if DB_ENGINE['topology'] == 'single_writer' and (not DB_IS_SQLITE or _DB_IS_SQLITE_MEMORY):
+    warnings.warn(
+        'DB.ENGINE.topology single_writer needs a sqlite database file, using pool')
+    DB_ENGINE['topology'] = 'pool'
+
+
+def _db_engine_kwargs(pool_size: int, max_overflow: int) -> dict[str, typing.Any]:
+
+    kwargs: dict[str, typing.Any] = {
+        'pool_pre_ping': DB_ENGINE['pool_pre_ping'],
+        'pool_recycle': int(DB_ENGINE['pool_recycle'].total_seconds()) if DB_ENGINE['pool_recycle'] is not None else -1,
+    }
+
+    # in memory sqlite databases live and die with their one connection, they get a static pool which can't be sized
+    if not _DB_IS_SQLITE_MEMORY:
+        kwargs['pool_size'] = pool_size
+        kwargs['max_overflow'] = max_overflow
+        kwargs['pool_timeout'] = DB_ENGINE['pool_timeout'].total_seconds()
+
+    return kwargs
+
+
+# sqlite pragmas are applied to each new connection in database.py
+# single_writer: DB_ASYNC_ENGINE is the one writer connection, writers queue for it for up to pool_timeout,
+# DB_READ_ASYNC_ENGINE is the pool of read-only connections. pool: DB_ASYNC_ENGINE does both, DB_READ_ASYNC_ENGINE is None
+if DB_ENGINE['topology'] == 'single_writer':
+    DB_ASYNC_ENGINE = create_async_engine(DB_URL, **_db_engine_kwargs(1, 0))
+    DB_READ_ASYNC_ENGINE: AsyncEngine | None = create_async_engine(
+        DB_URL, **_db_engine_kwargs(DB_ENGINE['pool_size'], DB_ENGINE['max_overflow']))
+else:
+    DB_ASYNC_ENGINE = create_async_engine(
+        DB_URL, **_db_engine_kwargs(DB_ENGINE['pool_size'], DB_ENGINE['max_overflow']))
+    DB_READ_ASYNC_ENGINE = None
+
+ASYNC_SESSIONMAKER = db_routing.make_async_sessionmaker(
+    DB_ASYNC_ENGINE, DB_READ_ASYNC_ENGINE)
 
 MEDIA_DIR = convert_env_path_to_absolute(
     BACKEND_DIR, _BACKEND_CONFIG['MEDIA_DIR'])
@@ -240,14 +443,200 @@ GALLERIES_DIR = MEDIA_DIR / 'galleries'
 UVICORN = _BACKEND_CONFIG['UVICORN']
 
 
+class CredentialCacheConfig(TypedDict):
+    max_size: int
+    max_lifespan: datetime_module.timedelta
+
+
+class ExpiredCredentialSweepConfig(TypedDict):
+    enabled: bool
+    interval: datetime_module.timedelta
+    batch_size: int
+
+
+class GoogleIdTokenConfig(TypedDict):
+    jwks_url: str
+    issuers: list[str]
+    min_refresh_interval: datetime_module.timedelta
+
+
+class RevocationConfig(TypedDict):
+    bloom_capacity: int
+    bloom_false_positive_rate: float
+    sync_interval: datetime_module.timedelta
+
+
+class StatelessAccessTokenConfig(TypedDict):
+    enabled: bool
+    lifespan: datetime_module.timedelta
+    refresh_token_cookie_key: str
+
+
 class AuthConfig(TypedDict):
     credential_lifespans: dict[CredentialNames, datetime_module.timedelta]
-
+    otp_hasher: OTPHasherName
+    credential_cache: CredentialCacheConfig
+    expired_credential_sweep: ExpiredCredentialSweepConfig
+    stateless_access_token: StatelessAccessTokenConfig
+    revocation: RevocationConfig
+    google_id_token: GoogleIdTokenConfig
+
+
+_credential_cache_env: CredentialCacheEnv = _BACKEND_CONFIG['AUTH'].get(
+    'credential_cache', {})
+_expired_credential_sweep_env: ExpiredCredentialSweepEnv = _BACKEND_CONFIG['AUTH'].get(
+    'expired_credential_sweep', {})
+_stateless_access_token_env: StatelessAccessTokenEnv = _BACKEND_CONFIG['AUTH'].get(
+    'stateless_access_token', {})
+_revocation_env: RevocationEnv = _BACKEND_CONFIG['AUTH'].get('revocation', {})
+_google_id_token_env: GoogleIdTokenEnv = _BACKEND_CONFIG['AUTH'].get(
+    'google_id_token', {})
 
 AUTH: AuthConfig = {
     'credential_lifespans': {
         key: isodate.parse_duration(value) for key, value in _BACKEND_CONFIG['AUTH']['credential_lifespans'].items()
+    },
+    'otp_hasher': _BACKEND_CONFIG['AUTH'].get('otp_hasher', 'hmac-sha256'),
+    'credential_cache': {
+        'max_size': _credential_cache_env.get('max_size', 10000),
+        'max_lifespan': isodate.parse_duration(_credential_cache_env.get('max_lifespan', 'PT1M')),
+    },
+    'expired_credential_sweep': {
+        'enabled': _expired_credential_sweep_env.get('enabled', True),
+        'interval': isodate.parse_duration(_expired_credential_sweep_env.get('interval', 'PT5M')),
+        'batch_size': _expired_credential_sweep_env.get('batch_size', 500),
+    },
+    'stateless_access_token': {
+        'enabled': _stateless_access_token_env.get('enabled', False),
+        'lifespan': isodate.parse_duration(_stateless_access_token_env.get('lifespan', 'PT5M')),
+        'refresh_token_cookie_key': _stateless_access_token_env.get('refresh_token_cookie_key', 'refresh_token'),
+    },
+    'revocation': {
+        'bloom_capacity': _revocation_env.get('bloom_capacity', 1000000),
+        'bloom_false_positive_rate': _revocation_env.get('bloom_false_positive_rate', 0.01),
+        'sync_interval': isodate.parse_duration(_revocation_env.get('sync_interval', 'PT10S')),
+    },
+    'google_id_token': {
+        'jwks_url': _google_id_token_env.get('jwks_url', 'https://www.googleapis.com/oauth2/v3/certs'),
+        'issuers': _google_id_token_env.get('issuers', ['accounts.google.com', 'https://accounts.google.com']),
+        'min_refresh_interval': isodate.parse_duration(_google_id_token_env.get('min_refresh_interval', 'PT1M')),
+    }
+}
+
+
+class PasswordHashingConfig(TypedDict):
+    executor: Literal['thread', 'process']
+    max_in_flight: int
+    max_queued: int
+    bcrypt_rounds: int
+
+
+_password_hashing_env: PasswordHashingEnv = _BACKEND_CONFIG.get(
+    'PASSWORD_HASHING', {})
+
+PASSWORD_HASHING: PasswordHashingConfig = {
+    'executor': _password_hashing_env.get('executor', 'thread'),
+    'max_in_flight': _password_hashing_env.get('max_in_flight', 2),
+    'max_queued': _password_hashing_env.get('max_queued', 16),
+    'bcrypt_rounds': _password_hashing_env.get('bcrypt_rounds', 12),
+}
+
+
+class GalleriesConfig(TypedDict):
+    path_cache_max_size: int
+
+
+_galleries_env: GalleriesEnv = _BACKEND_CONFIG.get('GALLERIES', {})
+
+GALLERIES: GalleriesConfig = {
+    'path_cache_max_size': _galleries_env.get('path_cache_max_size', 10000),
+}
+
+
+class GroupCommitConfig(TypedDict):
+    window: datetime_module.timedelta
+    max_batch_size: int
+    services: set[GroupCommitServiceName]
+
+
+_group_commit_env: GroupCommitEnv = _BACKEND_CONFIG.get('GROUP_COMMIT', {})
+
+GROUP_COMMIT: GroupCommitConfig = {
+    'window': isodate.parse_duration(_group_commit_env.get('window', 'PT0.002S')),
+    'max_batch_size': _group_commit_env.get('max_batch_size', 64),
+    'services': set(_group_commit_env.get('services', ['user_access_token', 'otp'])),
+}
+
+
+class SqlInstrumentationConfig(TypedDict):
+    enabled: bool
+    server_timing: bool
+    max_statements: int
+    max_duration: datetime_module.timedelta
+    max_repeats: int
+
+
+_sql_instrumentation_env: SqlInstrumentationEnv = _BACKEND_CONFIG.get(
+    'SQL_INSTRUMENTATION', {})
+
+SQL_INSTRUMENTATION: SqlInstrumentationConfig = {
+    'enabled': _sql_instrumentation_env.get('enabled', False),
+    'server_timing': _sql_instrumentation_env.get('server_timing', True),
+    'max_statements': _sql_instrumentation_env.get('max_statements', 25),
+    'max_duration': isodate.parse_duration(_sql_instrumentation_env.get('max_duration', 'PT0.1S')),
+    'max_repeats': _sql_instrumentation_env.get('max_repeats', 5),
+}
+
+
+class MetricsConfig(TypedDict):
+    enabled: bool
+    latency_buckets: tuple[float, ...]
+    event_loop_lag_interval: datetime_module.timedelta
+
+
+_metrics_env: MetricsEnv = _BACKEND_CONFIG.get('METRICS', {})
+
+METRICS: MetricsConfig = {
+    'enabled': _metrics_env.get('enabled', True),
+    'latency_buckets': tuple(sorted(_metrics_env.get('latency_buckets', [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]))),
+    'event_loop_lag_interval': isodate.parse_duration(_metrics_env.get('event_loop_lag_interval', 'PT0.5S')),
+}
+
+
+class NotificationChannelConfig(TypedDict):
+    transport: Literal['console', 'smtp']
+    concurrency: int
+    smtp: NotRequired[SmtpEnv]
+
+
+class NotificationsConfig(TypedDict):
+    max_queued: int
+    max_retries: int
+    retry_backoff: datetime_module.timedelta
+    email: NotificationChannelConfig
+    sms: NotificationChannelConfig
+
+
+_notifications_env: NotificationsEnv = _BACKEND_CONFIG.get(
+    'NOTIFICATIONS', {})
+
+
+def _notification_channel_config(env: NotificationChannelEnv) -> NotificationChannelConfig:
+    channel_config: NotificationChannelConfig = {
+        'transport': env.get('transport', 'console'),
+        'concurrency': env.get('concurrency', 2),
     }
+    if 'smtp' in env:
+        channel_config['smtp'] = env['smtp']
+    return channel_config
+
+
+NOTIFICATIONS: NotificationsConfig = {
+    'max_queued': _notifications_env.get('max_queued', 1000),
+    'max_retries': _notifications_env.get('max_retries', 3),
+    'retry_backoff': isodate.parse_duration(_notifications_env.get('retry_backoff', 'PT1S')),
+    'email': _notification_channel_config(_notifications_env.get('email', {})),
+    'sms': _notification_channel_config(_notifications_env.get('sms', {})),
 }
 
 OPENAPI_SCHEMA_PATH = convert_env_path_to_absolute(
@@ -259,6 +648,8 @@ ACCESS_TOKEN_COOKIE: AccessTokenCookie = _BACKEND_CONFIG['ACCESS_TOKEN_COOKIE']
 class BackendSecrets(TypedDict):
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
+    OTP_HMAC_SECRET_KEY: NotRequired[str]
+    SMTP_PASSWORD: NotRequired[str]
 
 
 BACKEND_SECRETS = typing.cast(
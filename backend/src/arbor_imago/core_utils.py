@@ -21,8 +21,8 @@ def deep_merge_dicts(primary_dict: dict, secondary_dict: dict) -> dict:
     return primary_dict
 
 
-def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
+def hash_password(password: str, rounds: int = 12) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password.decode('utf-8')
 
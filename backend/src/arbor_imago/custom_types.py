@@ -44,6 +44,8 @@ class User:
         min_length=3, max_length=20, pattern=re.compile(r'^[a-zA-Z0-9_.-]+$'), to_lower=True)]
     hashed_password = str
     user_role_id = UserRole.id
+    token_epoch = Annotated[int,
+                            'Incremented to revoke every stateless access token issued to the user']
 
 
 timestamp = float
@@ -58,7 +60,8 @@ class AuthCredential:
                        'The datetime at which the auth credential will expire']
     expiry_timestamp = Annotated[timestamp,
                                  'The datetime at which the auth credential will expire']
-    type = Literal['access_token', 'api_key', 'otp', 'sign_up']
+    type = Literal['access_token', 'api_key', 'otp',
+                   'sign_up', 'stateless_access_token']
 
 
 OTPId = str
@@ -92,6 +95,16 @@ class SignUp(AuthCredential):
     email = User.email
 
 
+class StatelessAccessToken(AuthCredential):
+    user_id = User.id
+
+
+class AuthCredentialRevocation:
+    id = int
+    auth_credential_type = str
+    auth_credential_id = str
+
+
 GalleryId = str
 
 
@@ -115,6 +128,16 @@ class GalleryDateAndName(NamedTuple):
     name: str
 
 
+class GalleryAccess:
+    source = Literal['owner', 'permission', 'inherited', 'public']
+
+
+class GalleryClosure:
+    ancestor_id = Gallery.id
+    descendant_id = Gallery.id
+    depth = int
+
+
 class _GalleryPermissionBase:
     gallery_id = Gallery.id
     user_id = User.id
@@ -0,0 +1,309 @@
+import contextlib
+import contextvars
+import logging
+import typing
+from collections.abc import AsyncIterator, Callable
+
+from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session as SQLMSession
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import config
+
+"""
+Developer's Note:
+Each request gets one session, opened by the request_session dependency which the app applies to every route.
+Routers, services and the auth dependency pick it up with `session()`; outside of a request (background tasks,
+the cli) `session()` opens a new one.
+
+Inside a request `commit()` only flushes. The dependency commits once when the endpoint returns, or rolls back if it
+raised, so a multi-step operation is applied as a whole. Anything that must wait for the data to be committed, like
+invalidating a cache other requests read from, is registered with `after_commit()`.
+
+Values worth computing once per request, like a user's access to a gallery, are kept in `request_memo()`.
+
+SQLite connections get the pragmas from DB.ENGINE.sqlite as they are opened. WAL lets readers carry on while a write
+is in progress, and foreign_keys is off in SQLite unless set on every connection. With DB.ENGINE.topology single_writer,
+sessions read from a pool of query_only connections and write through one writer connection, see db_routing.py.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class _RequestScope:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.n_connections = 0
+        self.after_commit: list[Callable[[], None]] = []
+        self.memos: dict[str, dict] = {}
+
+
+_REQUEST_SCOPE: contextvars.ContextVar[_RequestScope | None] = contextvars.ContextVar(
+    'request_scope', default=None)
+
+
+class RequestSessionStats(typing.TypedDict):
+    requests: int
+    connections_checked_out: int
+    max_connections_per_request: int
+    rollbacks: int
+
+
+_STATS: RequestSessionStats = {
+    'requests': 0,
+    'connections_checked_out': 0,
+    'max_connections_per_request': 0,
+    'rollbacks': 0,
+}
+
+
+def stats() -> RequestSessionStats:
+    return _STATS.copy()
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    request_scope = _REQUEST_SCOPE.get()
+    if request_scope is not None:
+        request_scope.n_connections += 1
+
+
+# journal_mode is stored in the database file, setting it again on later connections is a no-op
+_SQLITE_PRAGMAS: list[tuple[str, typing.Callable[[config.DbSqliteConfig], typing.Any]]] = [
+    ('journal_mode', lambda sqlite: sqlite['journal_mode']),
+    ('synchronous', lambda sqlite: sqlite['synchronous']),
+    ('cache_size', lambda sqlite: sqlite['cache_size']),
+    ('mmap_size', lambda sqlite: sqlite['mmap_size']),
+    ('busy_timeout', lambda sqlite: int(sqlite['busy_timeout'].total_seconds() * 1000)),
+    ('temp_store', lambda sqlite: sqlite['temp_store']),
+    ('foreign_keys', lambda sqlite: 'on' if sqlite['foreign_keys'] else 'off'),
+]
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in _SQLITE_PRAGMAS:
+        cursor.execute('PRAGMA {} = {}'.format(
+            name, value(config.DB_ENGINE['sqlite'])))
+    cursor.close()
+
+
+def _set_sqlite_query_only(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA query_only = on')
+    cursor.close()
+
+
+_FOREIGN_KEYS_INFO_KEY = 'foreign_keys'
+
+
+async def foreign_keys_enforced(session: AsyncSession) -> bool:
+    """Whether the database applies the ON DELETE actions. SQLite only does with the foreign_keys pragma on, it's read once per connection"""
+
+    connection = await session.connection()
+    if connection.dialect.name != 'sqlite':
+        return True
+
+    if _FOREIGN_KEYS_INFO_KEY not in connection.info:
+        connection.info[_FOREIGN_KEYS_INFO_KEY] = bool(
+            (await connection.exec_driver_sql('PRAGMA foreign_keys')).scalar())
+    return connection.info[_FOREIGN_KEYS_INFO_KEY]
+
+
+# name, engine, max_overflow
+_ENGINES: list[tuple[str, AsyncEngine, int]] = [
+    ('writer' if config.DB_READ_ASYNC_ENGINE is not None else 'pool', config.DB_ASYNC_ENGINE,
+     0 if config.DB_READ_ASYNC_ENGINE is not None else config.DB_ENGINE['max_overflow']),
+]
+if config.DB_READ_ASYNC_ENGINE is not None:
+    _ENGINES.append(('reader', config.DB_READ_ASYNC_ENGINE,
+                    config.DB_ENGINE['max_overflow']))
+
+for _, _engine, _ in _ENGINES:
+    event.listen(_engine.sync_engine, 'checkout', _count_checkout)
+    if config.DB_IS_SQLITE:
+        event.listen(_engine.sync_engine, 'connect', _set_sqlite_pragmas)
+if config.DB_READ_ASYNC_ENGINE is not None:
+    event.listen(config.DB_READ_ASYNC_ENGINE.sync_engine,
+                 'connect', _set_sqlite_query_only)
+
+
+class PoolStats(typing.TypedDict):
+    size: int
+    checked_out: int
+    overflow: int
+
+
+def pool_stats() -> dict[str, PoolStats]:
+    """Connections in use per engine, pools without a fixed size (in-memory SQLite) are left out"""
+
+    return {
+        name: {
+            'size': engine.pool.size(),
+            'checked_out': engine.pool.checkedout(),
+            # counts up from -size as the pool fills
+            'overflow': max(engine.pool.overflow(), 0),
+        }
+        for name, engine, _ in _ENGINES if hasattr(engine.pool, 'size')
+    }
+
+
+async def engine_settings() -> dict[str, typing.Any]:
+    """The topology and pools in use and, for SQLite, the pragmas as the database reports them back"""
+
+    settings: dict[str, typing.Any] = {
+        'topology': config.DB_ENGINE['topology'],
+        'pool_pre_ping': config.DB_ENGINE['pool_pre_ping'],
+        'pool_recycle': config.DB_ENGINE['pool_recycle'],
+    }
+    for name, engine, max_overflow in _ENGINES:
+        settings[name] = type(engine.pool).__name__
+        if hasattr(engine.pool, 'size'):
+            settings[name + '_pool_size'] = engine.pool.size()
+            settings[name + '_max_overflow'] = max_overflow
+
+    if config.DB_IS_SQLITE:
+        async with config.DB_ASYNC_ENGINE.connect() as connection:
+            for name, _ in _SQLITE_PRAGMAS:
+                settings[name] = (await connection.execute(text('PRAGMA {}'.format(name)))).scalar()
+
+    return settings
+
+
+async def log_engine_settings() -> None:
+    logger.info('Database engine: {}'.format(', '.join(
+        '{}={}'.format(name, value) for name, value in (await engine_settings()).items())))
+
+
+def _get_request_scope(session: AsyncSession) -> _RequestScope | None:
+    request_scope = _REQUEST_SCOPE.get()
+    if request_scope is not None and request_scope.session is session:
+        return request_scope
+    return None
+
+
+async def request_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency, commits when the endpoint returns and rolls back if it raises"""
+
+    async with config.ASYNC_SESSIONMAKER() as session:
+        request_scope = _RequestScope(session)
+        token = _REQUEST_SCOPE.set(request_scope)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            _STATS['rollbacks'] += 1
+            await session.rollback()
+            raise
+        finally:
+            _REQUEST_SCOPE.reset(token)
+            _STATS['requests'] += 1
+            _STATS['connections_checked_out'] += request_scope.n_connections
+            _STATS['max_connections_per_request'] = max(
+                _STATS['max_connections_per_request'], request_scope.n_connections)
+
+    for callback in request_scope.after_commit:
+        callback()
+
+
+# exits before the response is sent, so a failed commit is reported to the client
+REQUEST_SESSION_DEPENDENCY = Depends(request_session, scope='function')
+
+
+@contextlib.asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """A new session scoped like a request's: commit() only flushes, it commits once on exit, then runs the after_commit callbacks"""
+
+    async with config.ASYNC_SESSIONMAKER() as session:
+        request_scope = _RequestScope(session)
+        token = _REQUEST_SCOPE.set(request_scope)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            _REQUEST_SCOPE.reset(token)
+
+    for callback in request_scope.after_commit:
+        callback()
+
+
+@contextlib.asynccontextmanager
+async def session() -> AsyncIterator[AsyncSession]:
+    """The request's session inside a request, otherwise a new session"""
+
+    request_scope = _REQUEST_SCOPE.get()
+    if request_scope is not None:
+        yield request_scope.session
+        return
+
+    async with config.ASYNC_SESSIONMAKER() as new_session:
+        yield new_session
+
+
+async def commit(session: AsyncSession) -> None:
+    """Commit, unless the session belongs to a request, in which case flush and leave the commit to the request"""
+
+    if _get_request_scope(session) is not None:
+        await session.flush()
+    else:
+        await session.commit()
+
+
+_WRITTEN_INFO_KEY = 'written'
+
+
+@event.listens_for(SQLMSession, 'after_flush')
+def _mark_written(session, flush_context) -> None:
+    session.info[_WRITTEN_INFO_KEY] = True
+
+
+@event.listens_for(SQLMSession, 'after_transaction_end')
+def _clear_written(session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_WRITTEN_INFO_KEY, None)
+
+
+def has_writes(session: AsyncSession) -> bool:
+    """Whether the session's transaction has written, or has changes waiting to be flushed"""
+
+    sync_session = session.sync_session
+    return bool(sync_session.info.get(_WRITTEN_INFO_KEY) or sync_session.new or sync_session.dirty or sync_session.deleted)
+
+
+async def release_connection(session: AsyncSession) -> None:
+    """End a transaction which hasn't written, so its connection goes back to the pool while the session waits on something else"""
+
+    if has_writes(session):
+        raise RuntimeError('The session has writes to commit')
+    await session.commit()
+
+
+def request_memo(session: AsyncSession, name: str) -> dict | None:
+    """A dict that lives as long as the session's request, None outside of a request"""
+
+    request_scope = _get_request_scope(session)
+    if request_scope is None:
+        return None
+    return request_scope.memos.setdefault(name, {})
+
+
+def clear_request_memo(session: AsyncSession, name: str) -> None:
+
+    request_scope = _get_request_scope(session)
+    if request_scope is not None:
+        request_scope.memos.pop(name, None)
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run callback once the session's changes are committed, immediately if they already are"""
+
+    request_scope = _get_request_scope(session)
+    if request_scope is not None:
+        request_scope.after_commit.append(callback)
+    else:
+        callback()
@@ -0,0 +1,59 @@
+import typing
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlmodel import Session as SQLMSession
+from sqlmodel.ext.asyncio.session import AsyncSession as SQLMAsyncSession
+
+"""
+Developer's Note:
+In the single_writer topology SQLite gets one writer connection and a pool of read-only connections. Concurrent
+writers wait their turn for the writer connection in the pool's queue instead of colliding on the database lock and
+failing with "database is locked", while reads run in parallel on the readers, which WAL never blocks.
+
+A session starts on the readers and moves to the writer with its first write, it then stays there until the
+transaction ends so it reads its own uncommitted writes. A session which needs the latest committed state before it
+writes (read, check, write) can move to the writer up front with `use_writer()`.
+"""
+
+_WRITER_INFO_KEY = 'use_writer'
+
+
+class SingleWriterSession(SQLMSession):
+
+    _writer: typing.ClassVar[Engine]
+    _reader: typing.ClassVar[Engine]
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+
+        if not self.info.get(_WRITER_INFO_KEY):
+            if not (self._flushing or getattr(clause, 'is_dml', False)):
+                return self._reader
+            self.info[_WRITER_INFO_KEY] = True
+        return self._writer
+
+
+@event.listens_for(SingleWriterSession, 'after_transaction_end')
+def _back_to_reader(session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_WRITER_INFO_KEY, None)
+
+
+def use_writer(session: SQLMAsyncSession) -> None:
+    """Send the rest of the session's transaction to the writer, a no-op outside the single_writer topology"""
+
+    session.sync_session.info[_WRITER_INFO_KEY] = True
+
+
+def make_async_sessionmaker(writer: AsyncEngine, reader: AsyncEngine | None = None) -> async_sessionmaker[SQLMAsyncSession]:
+    """Sessions bound to the writer, or routed between writer and reader when a reader is given"""
+
+    if reader is None:
+        return async_sessionmaker(bind=writer, class_=SQLMAsyncSession, expire_on_commit=False)
+
+    sync_session_class = type('SingleWriterSession', (SingleWriterSession,), {
+        '_writer': writer.sync_engine,
+        '_reader': reader.sync_engine,
+    })
+    return async_sessionmaker(bind=writer, class_=SQLMAsyncSession, sync_session_class=sync_session_class, expire_on_commit=False)
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import typing
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractAsyncContextManager
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import config, database
+
+"""
+Developer's Note:
+Logins, OTPs and magic links each write a row or two and commit, on SQLite that is one fsync per login. COMMITTER
+collects the small writes which arrive within `window` of each other, up to `max_batch_size`, runs them in one
+transaction and commits once, then resolves each caller's future.
+
+A write is a function of the batch's session. It must only touch its own rows and not commit, the batch does that.
+If the batch fails to commit, each of its writes is retried in a transaction of its own, so one bad write fails only
+its own caller. The writes commit apart from the caller's session, services opt in through GROUP_COMMIT.services,
+and only writes from a session which hasn't written anything itself are grouped (see Service._group_commit).
+
+So a flow of several writes is not atomic once they are grouped, each one commits as it is submitted. Logging in with
+a refresh token, magic link or OTP deletes the presented credential and creates an access token: the delete goes first
+(auth_credential.Table.spend), so a failure part way leaves the credential spent and the user logging in again, never a
+credential which can be used twice. Its DELETE's rowcount lets only one of two requests presenting the same credential
+through, whether they land in the same batch or not. Order new multi-write flows the same way, or keep their services
+out of GROUP_COMMIT.services.
+"""
+
+logger = logging.getLogger(__name__)
+
+T = typing.TypeVar('T')
+
+Write = Callable[[AsyncSession], Awaitable[typing.Any]]
+
+
+class GroupCommitterStats(typing.TypedDict):
+    queue_depth: int
+    batches: int
+    writes: int
+    failed: int
+    max_batch_size: int
+
+
+class GroupCommitter:
+
+    def __init__(self, window_seconds: float, max_batch_size: int, unit_of_work: Callable[[], AbstractAsyncContextManager[AsyncSession]] = database.unit_of_work):
+
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.unit_of_work = unit_of_work
+
+        self._queue: asyncio.Queue[tuple[Write, asyncio.Future]] | None = None
+        self._worker: asyncio.Task | None = None
+
+        self._n_batches = 0
+        self._n_writes = 0
+        self._n_failed = 0
+        self._max_batch_size = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._work())
+
+    async def stop(self) -> None:
+
+        if self._worker is None or self._queue is None:
+            return
+
+        # writes already submitted are committed before stopping
+        await self._queue.join()
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._queue = None
+
+    async def submit(self, write: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Run the write in the next batch and wait for the batch to commit. Not running, it runs in its own transaction"""
+
+        if self._queue is None:
+            return await self._run_alone(write)
+
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((write, future))
+        return await future
+
+    async def _work(self) -> None:
+
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: list[tuple[Write, asyncio.Future]]) -> None:
+
+        self._n_batches += 1
+        self._n_writes += len(batch)
+        self._max_batch_size = max(self._max_batch_size, len(batch))
+
+        try:
+            results = []
+            async with self.unit_of_work() as session:
+                for write, _ in batch:
+                    results.append(await write(session))
+        except Exception as e:
+            if len(batch) == 1:
+                self._n_failed += 1
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+
+            logger.info(
+                'Group commit of {} writes failed, retrying them one at a time'.format(len(batch)))
+            for write, future in batch:
+                try:
+                    result = await self._run_alone(write)
+                except Exception as e:
+                    self._n_failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_alone(self, write: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        async with self.unit_of_work() as session:
+            return await write(session)
+
+    def stats(self) -> GroupCommitterStats:
+        return {
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'batches': self._n_batches,
+            'writes': self._n_writes,
+            'failed': self._n_failed,
+            'max_batch_size': self._max_batch_size,
+        }
+
+
+COMMITTER = GroupCommitter(
+    window_seconds=config.GROUP_COMMIT['window'].total_seconds(),
+    max_batch_size=config.GROUP_COMMIT['max_batch_size'],
+)
@@ -0,0 +1,242 @@
+import asyncio
+import bisect
+import datetime as datetime_module
+import time
+import typing
+from collections.abc import Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from arbor_imago import config, database, group_commit, notifications, sql_instrumentation
+from arbor_imago.auth import cache as auth_cache, hashing
+
+"""
+Developer's Note:
+/metrics serves the Prometheus text format. MetricsMiddleware counts each request and adds its latency to a histogram,
+both labelled by method and route template (the router's _PREFIX plus the route's path, e.g. /galleries/{gallery_id}/),
+so the number of series is bounded by the routes rather than the urls requested. Requests matching no route are
+labelled `unmatched`.
+
+Everything runs on the event loop's thread, so the counters are plain ints and floats without locks, and a request
+costs a dict lookup and a bisect. The pools, caches and queues are read from their stats() when /metrics is scraped.
+Counters only go up, rates and ratios are left to the queries, e.g. the auth cache hit rate is
+    rate(arbor_imago_auth_cache_hits_total[5m]) / (rate(arbor_imago_auth_cache_hits_total[5m]) + rate(arbor_imago_auth_cache_misses_total[5m]))
+"""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_NAMESPACE = 'arbor_imago_'
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+
+    __slots__ = ('buckets', 'bucket_counts', 'count', 'sum')
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # not cumulative, the last one counts observations above every bucket
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class RequestMetrics:
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts: dict[tuple[str, str, int], int] = {}
+        self.latencies: dict[tuple[str, str], Histogram] = {}
+
+    def observe(self, method: str, route: str, status_code: int, seconds: float) -> None:
+
+        key = (method, route, status_code)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+        histogram = self.latencies.get((method, route))
+        if histogram is None:
+            histogram = self.latencies[(method, route)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+
+REQUESTS = RequestMetrics(config.METRICS['latency_buckets'])
+
+
+class MetricsMiddleware:
+    """Pure ASGI, the response is streamed through untouched"""
+
+    def __init__(self, app: ASGIApp, request_metrics: RequestMetrics = REQUESTS):
+        self.app = app
+        self.request_metrics = request_metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # the router sets the matched route on the scope
+            route = scope.get('route')
+            self.request_metrics.observe(scope['method'], getattr(route, 'path', 'unmatched'),
+                                         status_code, time.perf_counter() - start)
+
+
+class EventLoopLagMonitor:
+    """Sleeps for interval and measures how much later than that it wakes up, the time other callbacks held the loop"""
+
+    def __init__(self):
+        self.lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    async def run(self, interval: datetime_module.timedelta) -> None:
+
+        loop = asyncio.get_running_loop()
+        interval_seconds = interval.total_seconds()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval_seconds)
+            self.lag_seconds = max(loop.time() - start - interval_seconds, 0.0)
+            self.max_lag_seconds = max(self.max_lag_seconds, self.lag_seconds)
+
+
+EVENT_LOOP_LAG = EventLoopLagMonitor()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value)) for name, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Exposition:
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def metric(self, type: typing.Literal['counter', 'gauge'], name: str, help: str, samples: Iterable[tuple[Labels, float]]) -> None:
+        self.lines.append('# HELP {}{} {}'.format(_NAMESPACE, name, help))
+        self.lines.append('# TYPE {}{} {}'.format(_NAMESPACE, name, type))
+        for labels, value in samples:
+            self.lines.append('{}{}{} {}'.format(
+                _NAMESPACE, name, _format_labels(labels), _format_value(value)))
+
+    def histogram(self, name: str, help: str, histograms: Iterable[tuple[Labels, Histogram]]) -> None:
+        self.lines.append('# HELP {}{} {}'.format(_NAMESPACE, name, help))
+        self.lines.append('# TYPE {}{} histogram'.format(_NAMESPACE, name))
+        for labels, histogram in histograms:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(histogram.buckets + (float('inf'),), histogram.bucket_counts):
+                cumulative += bucket_count
+                self.lines.append('{}{}_bucket{} {}'.format(
+                    _NAMESPACE, name, _format_labels(labels + (('le', _format_value(float(upper_bound))),)), cumulative))
+            self.lines.append('{}{}_sum{} {}'.format(
+                _NAMESPACE, name, _format_labels(labels), _format_value(histogram.sum)))
+            self.lines.append('{}{}_count{} {}'.format(
+                _NAMESPACE, name, _format_labels(labels), histogram.count))
+
+    def render(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+def render(request_metrics: RequestMetrics = REQUESTS) -> str:
+
+    exposition = _Exposition()
+
+    exposition.metric('counter', 'http_requests_total', 'HTTP requests by method, route template and status code', (
+        ((('method', method), ('route', route), ('status', str(status_code))), count)
+        for (method, route, status_code), count in request_metrics.counts.items()))
+    exposition.histogram('http_request_duration_seconds', 'HTTP request latency by method and route template', (
+        ((('method', method), ('route', route)), histogram)
+        for (method, route), histogram in request_metrics.latencies.items()))
+
+    pools = database.pool_stats()
+    exposition.metric('gauge', 'db_pool_size', 'Connections kept by the pool', (
+        ((('engine', name),), pool['size']) for name, pool in pools.items()))
+    exposition.metric('gauge', 'db_pool_checked_out', 'Connections in use', (
+        ((('engine', name),), pool['checked_out']) for name, pool in pools.items()))
+    exposition.metric('gauge', 'db_pool_overflow', 'Connections in use beyond the pool size', (
+        ((('engine', name),), pool['overflow']) for name, pool in pools.items()))
+
+    request_sessions = database.stats()
+    exposition.metric('counter', 'db_request_sessions_total', 'Request sessions closed', [
+        ((), request_sessions['requests'])])
+    exposition.metric('counter', 'db_request_rollbacks_total', 'Request sessions rolled back', [
+        ((), request_sessions['rollbacks'])])
+
+    if config.SQL_INSTRUMENTATION['enabled']:
+        statements = sql_instrumentation.stats()
+        exposition.metric('counter', 'sql_statements_total', 'SQL statements run by requests', [
+            ((), statements['statements'])])
+        exposition.metric('counter', 'sql_statement_duration_seconds_total', 'Time requests spent running SQL statements', [
+            ((), statements['duration'])])
+        exposition.metric('counter', 'sql_repeated_statement_requests_total', 'Requests which ran the same statement more than max_repeats times', [
+            ((), statements['repeated_statement_requests'])])
+
+    caches = (('credential', auth_cache.CREDENTIAL_CACHE), ('user', auth_cache.USER_CACHE))
+    exposition.metric('counter', 'auth_cache_hits_total', 'Auth cache lookups found in the cache', (
+        ((('cache', name),), cache.hits) for name, cache in caches))
+    exposition.metric('counter', 'auth_cache_misses_total', 'Auth cache lookups not in the cache, or expired', (
+        ((('cache', name),), cache.misses) for name, cache in caches))
+    exposition.metric('gauge', 'auth_cache_entries', 'Entries in the auth cache', (
+        ((('cache', name),), len(cache)) for name, cache in caches))
+
+    password_hasher = hashing.PASSWORD_HASHER.stats()
+    exposition.metric('gauge', 'password_hasher_in_flight', 'Password hashes being computed', [
+        ((), password_hasher['in_flight'])])
+    exposition.metric('gauge', 'password_hasher_queue_depth', 'Password hashes waiting for a worker', [
+        ((), password_hasher['queue_depth'])])
+    exposition.metric('counter', 'password_hasher_rejected_total', 'Password hashes rejected with the queue full', [
+        ((), password_hasher['rejected'])])
+
+    committer = group_commit.COMMITTER.stats()
+    exposition.metric('gauge', 'group_commit_queue_depth', 'Writes waiting for the next batch', [
+        ((), committer['queue_depth'])])
+    exposition.metric('counter', 'group_commit_batches_total', 'Batches committed', [
+        ((), committer['batches'])])
+    exposition.metric('counter', 'group_commit_writes_total', 'Writes committed in batches', [
+        ((), committer['writes'])])
+
+    dispatcher = notifications.DISPATCHER.stats()
+    exposition.metric('gauge', 'notifications_queue_depth', 'Notifications waiting to be sent', (
+        ((('channel', channel),), depth) for channel, depth in dispatcher['queue_depth'].items()))
+    exposition.metric('counter', 'notifications_sent_total', 'Notifications sent', [
+        ((), dispatcher['sent'])])
+    exposition.metric('counter', 'notifications_failed_total', 'Notifications given up on', [
+        ((), dispatcher['failed'])])
+    exposition.metric('counter', 'notifications_dropped_total', 'Notifications dropped with the queue full', [
+        ((), dispatcher['dropped'])])
+
+    exposition.metric('gauge', 'event_loop_lag_seconds', 'How late the event loop last ran a timer', [
+        ((), EVENT_LOOP_LAG.lag_seconds)])
+    exposition.metric('gauge', 'event_loop_lag_max_seconds', 'The most the event loop has been late running a timer', [
+        ((), EVENT_LOOP_LAG.max_lag_seconds)])
+
+    return exposition.render()
@@ -6,3 +6,10 @@ from arbor_imago import custom_types
 
 class SignUp(AuthCredentialBase):
     email: custom_types.User.email = Field()
+
+
+class StatelessAccessToken(AuthCredentialBase):
+    user_id: custom_types.User.id = Field()
+    user_role_id: custom_types.User.user_role_id = Field()
+    scope_ids: list[custom_types.Scope.id] = Field()
+    token_epoch: custom_types.User.token_epoch = Field()
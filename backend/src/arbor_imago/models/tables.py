@@ -1,4 +1,5 @@
-from sqlmodel import Field, Relationship, SQLModel, PrimaryKeyConstraint, Column
+from sqlmodel import Field, Relationship, SQLModel, PrimaryKeyConstraint, Column, Index, func
+from sqlalchemy import Date, cast, literal_column
 from pydantic import field_serializer, field_validator, ValidationInfo
 from typing import Optional, Protocol
 import datetime as datetime_module
@@ -22,6 +23,8 @@ class User(SQLModel, table=True):
     hashed_password: Optional[custom_types.User.hashed_password] = Field(
         nullable=True, default=None)
     user_role_id: custom_types.User.user_role_id = Field(nullable=False)
+    token_epoch: custom_types.User.token_epoch = Field(
+        nullable=False, default=0)
 
     api_keys: list['ApiKey'] = Relationship(
         back_populates='user', cascade_delete=True)
@@ -51,7 +54,7 @@ class UserAccessToken(_AuthCredentialTableBase, table=True):
     issued: custom_types.AuthCredential.issued = Field(
         const=True, sa_column=Column(timestamp.Timestamp))
     expiry: custom_types.AuthCredential.expiry = Field(
-        sa_column=Column(timestamp.Timestamp))
+        sa_column=Column(timestamp.Timestamp, index=True))
 
     user: 'User' = Relationship(back_populates='user_access_tokens')
 
@@ -66,7 +69,7 @@ class OTP(_AuthCredentialTableBase, table=True):
     issued: custom_types.AuthCredential.issued = Field(
         const=True, sa_column=Column(timestamp.Timestamp))
     expiry: custom_types.AuthCredential.expiry = Field(
-        sa_column=Column(timestamp.Timestamp))
+        sa_column=Column(timestamp.Timestamp, index=True))
 
     hashed_code: custom_types.OTP.hashed_code = Field()
     user: 'User' = Relationship(
@@ -83,13 +86,31 @@ class ApiKey(_AuthCredentialTableBase, table=True):
     issued: custom_types.AuthCredential.issued = Field(
         const=True, sa_column=Column(timestamp.Timestamp))
     expiry: custom_types.AuthCredential.expiry = Field(
-        sa_column=Column(timestamp.Timestamp))
+        sa_column=Column(timestamp.Timestamp, index=True))
 
     name: custom_types.ApiKey.name = Field()
     user: 'User' = Relationship(back_populates='api_keys')
     api_key_scopes: list['ApiKeyScope'] = Relationship(
         back_populates='api_key', cascade_delete=True)
 
+    __table_args__ = (
+        # a user's API keys have distinct names, also answers ApiKey.is_available from the index alone
+        Index('ix_api_key_user_id_name', 'user_id', 'name', unique=True),
+    )
+
+
+class AuthCredentialRevocation(SQLModel, table=True):
+    """Tombstone for a deleted auth credential, kept until the credential would have expired"""
+
+    __tablename__ = 'auth_credential_revocation'  # type: ignore
+
+    id: Optional[custom_types.AuthCredentialRevocation.id] = Field(
+        default=None, primary_key=True)
+    auth_credential_type: custom_types.AuthCredentialRevocation.auth_credential_type = Field()
+    auth_credential_id: custom_types.AuthCredentialRevocation.auth_credential_id = Field()
+    expiry: custom_types.AuthCredential.expiry = Field(
+        sa_column=Column(timestamp.Timestamp, index=True))
+
 
 class ApiKeyScope(SQLModel, table=True):
 
@@ -137,6 +158,31 @@ class Gallery(SQLModel, table=True):
         back_populates='gallery', cascade_delete=True)
 
 
+# NULLs are distinct in a unique index, so the nullable parent_id and date are coalesced to sentinels of their own
+# type, which Postgres requires and SQLite accepts. Gallery.is_available compares the same expressions, so it is
+# answered from the index alone
+GALLERY_AVAILABLE_NO_PARENT = literal_column("''")
+GALLERY_AVAILABLE_NO_DATE = cast(literal_column("'0001-01-01'"), Date)
+Index('ix_gallery_available', Gallery.user_id, func.coalesce(Gallery.parent_id, GALLERY_AVAILABLE_NO_PARENT),
+      Gallery.name, func.coalesce(Gallery.date, GALLERY_AVAILABLE_NO_DATE), unique=True)
+
+
+class GalleryClosure(SQLModel, table=True):
+    """Every (ancestor, descendant) pair of the gallery tree, including each gallery paired with itself at depth 0"""
+
+    __tablename__ = 'gallery_closure'  # type: ignore
+
+    ancestor_id: custom_types.GalleryClosure.ancestor_id = Field(
+        primary_key=True, foreign_key=str(Gallery.__tablename__) + '.id', ondelete='CASCADE')
+    descendant_id: custom_types.GalleryClosure.descendant_id = Field(
+        primary_key=True, index=True, foreign_key=str(Gallery.__tablename__) + '.id', ondelete='CASCADE')
+    depth: custom_types.GalleryClosure.depth = Field()
+
+    __table_args__ = (
+        PrimaryKeyConstraint('ancestor_id', 'descendant_id'),
+    )
+
+
 class GalleryPermission(SQLModel,  table=True):
 
     __tablename__ = 'gallery_permission'  # type: ignore
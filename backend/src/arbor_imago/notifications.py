@@ -0,0 +1,284 @@
+import asyncio
+import email.message
+import logging
+import smtplib
+import time
+import typing
+
+from arbor_imago import config, custom_types, utils
+
+"""
+Developer's Note:
+Email and SMS are sent by DISPATCHER in the background so a slow provider never blocks a request.
+Each channel (email, sms) has its own bounded queue, drained by `concurrency` workers, so one provider's
+limits do not hold up the other. A failed send is retried with exponential backoff, then dropped and logged.
+
+Transports are pluggable: anything with async `send` and `close` methods. The smtp transport runs the
+stdlib client in a thread and keeps a small pool of open connections to reuse across messages.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class Email(typing.NamedTuple):
+    recipient: custom_types.Email
+    subject: str
+    body: str
+
+
+class SMS(typing.NamedTuple):
+    recipient: custom_types.PhoneNumber
+    message: str
+
+
+Notification = Email | SMS
+Channel = typing.Literal['email', 'sms']
+
+
+def notification_channel(notification: Notification) -> Channel:
+    return 'email' if isinstance(notification, Email) else 'sms'
+
+
+class Transport(typing.Protocol):
+
+    async def send(self, notification: Notification) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class ConsoleTransport:
+
+    async def send(self, notification: Notification) -> None:
+        if isinstance(notification, Email):
+            utils.send_email(notification.recipient,
+                             notification.subject, notification.body)
+        else:
+            utils.send_sms(notification.recipient, notification.message)
+
+    async def close(self) -> None:
+        pass
+
+
+class SmtpTransport:
+
+    def __init__(self, host: str, sender: str, port: int = 587, username: str | None = None, password: str | None = None, starttls: bool = True, pool_size: int = 2, timeout: float = 10):
+
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self.n_connections_opened = 0
+        self._idle_connections: list[smtplib.SMTP] = []
+
+    def _connect(self) -> smtplib.SMTP:
+
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            connection.starttls()
+        if self.username is not None and self.password is not None:
+            connection.login(self.username, self.password)
+        self.n_connections_opened += 1
+        return connection
+
+    def _send(self, notification: Email) -> None:
+
+        message = email.message.EmailMessage()
+        message['From'] = self.sender
+        message['To'] = notification.recipient
+        message['Subject'] = notification.subject
+        message.set_content(notification.body)
+
+        try:
+            connection = self._idle_connections.pop()
+        except IndexError:
+            connection = self._connect()
+
+        try:
+            try:
+                connection.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # pooled connections may have been closed by the server while idle
+                connection = self._connect()
+                connection.send_message(message)
+        except Exception:
+            connection.close()
+            raise
+
+        if len(self._idle_connections) < self.pool_size:
+            self._idle_connections.append(connection)
+        else:
+            connection.quit()
+
+    async def send(self, notification: Notification) -> None:
+        if not isinstance(notification, Email):
+            raise TypeError('SMTP transport only sends email')
+        await asyncio.to_thread(self._send, notification)
+
+    def _close(self) -> None:
+        while self._idle_connections:
+            try:
+                self._idle_connections.pop().quit()
+            except smtplib.SMTPException:
+                pass
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close)
+
+
+class DispatcherStats(typing.TypedDict):
+    queue_depth: dict[Channel, int]
+    sent: int
+    failed: int
+    retried: int
+    dropped: int
+    latency_seconds_total: float
+    latency_seconds_max: float
+
+
+class NotificationDispatcher:
+
+    def __init__(self, transports: dict[Channel, Transport], concurrency: dict[Channel, int], max_queued: int, max_retries: int, retry_backoff_seconds: float):
+
+        self.transports = transports
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+        self._queues: dict[Channel, asyncio.Queue[Notification]] = {}
+        self._workers: list[asyncio.Task] = []
+
+        self._n_sent = 0
+        self._n_failed = 0
+        self._n_retried = 0
+        self._n_dropped = 0
+        self._latency_seconds_total = 0.0
+        self._latency_seconds_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+
+        for channel in self.transports:
+            self._queues[channel] = asyncio.Queue(maxsize=self.max_queued)
+            for _ in range(self.concurrency[channel]):
+                self._workers.append(asyncio.create_task(
+                    self._work(channel)))
+
+    async def stop(self, drain_timeout: float = 10) -> None:
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues.values())), drain_timeout)
+        except TimeoutError:
+            logger.warning('Stopping notification dispatcher with {} undelivered notifications'.format(
+                sum(queue.qsize() for queue in self._queues.values())))
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = {}
+
+        for transport in self.transports.values():
+            await transport.close()
+
+    def enqueue(self, notification: Notification) -> bool:
+        """Queue a notification without waiting, returns False if it was dropped"""
+
+        queue = self._queues.get(notification_channel(notification))
+        if queue is None:
+            logger.warning(
+                'Notification dispatcher is not running, dropping {}'.format(type(notification).__name__))
+            self._n_dropped += 1
+            return False
+
+        try:
+            queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            logger.warning(
+                'Notification queue is full, dropping {}'.format(type(notification).__name__))
+            self._n_dropped += 1
+            return False
+        return True
+
+    async def _work(self, channel: Channel) -> None:
+
+        queue = self._queues[channel]
+        while True:
+            notification = await queue.get()
+            try:
+                await self._send(channel, notification)
+            finally:
+                queue.task_done()
+
+    async def _send(self, channel: Channel, notification: Notification) -> None:
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                await self.transports[channel].send(notification)
+            except Exception:
+                if attempt == self.max_retries:
+                    self._n_failed += 1
+                    logger.exception(
+                        'Failed to send {} after {} attempts'.format(channel, attempt + 1))
+                    return
+                self._n_retried += 1
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** attempt)
+            else:
+                latency = time.perf_counter() - start
+                self._n_sent += 1
+                self._latency_seconds_total += latency
+                self._latency_seconds_max = max(
+                    self._latency_seconds_max, latency)
+                return
+
+    def stats(self) -> DispatcherStats:
+        return {
+            'queue_depth': {channel: queue.qsize() for channel, queue in self._queues.items()},
+            'sent': self._n_sent,
+            'failed': self._n_failed,
+            'retried': self._n_retried,
+            'dropped': self._n_dropped,
+            'latency_seconds_total': self._latency_seconds_total,
+            'latency_seconds_max': self._latency_seconds_max,
+        }
+
+
+def make_transport(channel_config: config.NotificationChannelConfig) -> Transport:
+
+    if channel_config['transport'] == 'smtp':
+        smtp_config = channel_config['smtp']
+        return SmtpTransport(
+            host=smtp_config['host'],
+            port=smtp_config.get('port', 587),
+            sender=smtp_config['sender'],
+            username=smtp_config.get('username'),
+            password=config.BACKEND_SECRETS.get('SMTP_PASSWORD'),
+            starttls=smtp_config.get('starttls', True),
+            pool_size=smtp_config.get('pool_size', 2),
+            timeout=smtp_config.get('timeout', 10),
+        )
+    return ConsoleTransport()
+
+
+DISPATCHER = NotificationDispatcher(
+    transports={
+        'email': make_transport(config.NOTIFICATIONS['email']),
+        'sms': make_transport(config.NOTIFICATIONS['sms']),
+    },
+    concurrency={
+        'email': config.NOTIFICATIONS['email']['concurrency'],
+        'sms': config.NOTIFICATIONS['sms']['concurrency'],
+    },
+    max_queued=config.NOTIFICATIONS['max_queued'],
+    max_retries=config.NOTIFICATIONS['max_retries'],
+    retry_backoff_seconds=config.NOTIFICATIONS['retry_backoff'].total_seconds(),
+)
@@ -1,12 +1,13 @@
-from fastapi import Depends, status
+from fastapi import Depends, status, Response
 from sqlmodel import select, func
 from pydantic import BaseModel
 from typing import Annotated, cast
 
-from arbor_imago import config, custom_types, utils
+from arbor_imago import config, custom_types, utils, database
 from arbor_imago.models.tables import ApiKey as ApiKeyTable
 from arbor_imago.services.api_key import ApiKey as ApiKeyService
 from arbor_imago.schemas import api_key as api_key_schema, pagination as pagination_schema, api as api_schema, order_by as order_by_schema
+from arbor_imago.services import base as base_service
 from arbor_imago.routers import user as user_router, base
 from arbor_imago.auth import utils as auth_utils
 
@@ -36,9 +37,28 @@ class ApiKeyRouter(_Base):
 
     _ADMIN = False
 
+    @classmethod
+    async def page(
+        cls,
+        response: Response,
+        authorization: auth_utils.GetAuthReturn,
+        pagination: pagination_schema.Pagination,
+        order_bys: list[order_by_schema.OrderBy[custom_types.ApiKey.order_by]]
+    ) -> base_service.Page[ApiKeyTable]:
+        """The user's api keys along with their total count, in one query"""
+
+        return await cls._get_page({
+            'authorization': authorization,
+            'order_bys': order_bys,
+            'pagination': pagination,
+            'response': response,
+            'query': select(ApiKeyTable).where(ApiKeyTable.user_id == authorization._user_id)
+        })
+
     @classmethod
     async def list(
         cls,
+        response: Response,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency())],
         pagination: Annotated[pagination_schema.Pagination, Depends(api_key_pagination)],
@@ -50,6 +70,7 @@ class ApiKeyRouter(_Base):
             'authorization': authorization,
             'order_bys': order_bys,
             'pagination': pagination,
+            'response': response,
             'query': select(ApiKeyTable).where(ApiKeyTable.user_id == authorization._user_id)
         })]
 
@@ -126,7 +147,7 @@ class ApiKeyRouter(_Base):
             auth_utils.make_get_auth_dependency())]
     ) -> ApiKeyJWTResponse:
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             api_key = await cls._get({
                 'authorization': authorization,
                 'id': api_key_id,
@@ -142,7 +163,7 @@ class ApiKeyRouter(_Base):
             auth_utils.make_get_auth_dependency())],
         api_key_available: api_key_schema.ApiKeyAvailable = Depends(),
     ) -> api_schema.IsAvailableResponse:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             return api_schema.IsAvailableResponse(
                 available=await ApiKeyService.is_available(
@@ -160,7 +181,7 @@ class ApiKeyRouter(_Base):
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency())],
     ) -> int:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             query = select(func.count()).select_from(ApiKeyTable).where(
                 ApiKeyTable.user_id == authorization._user_id)
             return (await session.exec(query)).one()
@@ -182,9 +203,49 @@ class ApiKeyAdminRouter(_Base):
 
     _ADMIN = True
 
+    @classmethod
+    async def create_many(
+        cls,
+        api_key_creates_admin: Annotated[list[api_key_schema.ApiKeyAdminCreate], base.bulk_body('API keys to create')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ) -> list[api_key_schema.ApiKeyPrivate]:
+
+        return [api_key_schema.ApiKeyPrivate.model_validate(api_key) for api_key in await cls._post_many({
+            'authorization': authorization,
+            'create_models': api_key_creates_admin,
+        })]
+
+    @classmethod
+    async def update_many(
+        cls,
+        api_key_updates_admin: Annotated[list[api_schema.BulkUpdate[custom_types.ApiKey.id, api_key_schema.ApiKeyAdminUpdate]], base.bulk_body('API keys to update, by id')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ) -> list[api_key_schema.ApiKeyPrivate]:
+
+        return [api_key_schema.ApiKeyPrivate.model_validate(api_key) for api_key in await cls._patch_many({
+            'authorization': authorization,
+            'update_models': api_key_updates_admin,
+        })]
+
+    @classmethod
+    async def delete_many(
+        cls,
+        api_key_ids: Annotated[list[custom_types.ApiKey.id], base.bulk_body('Ids of the API keys to delete')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ):
+
+        return await cls._delete_many({
+            'authorization': authorization,
+            'ids': api_key_ids,
+        })
+
     @classmethod
     async def list_by_user(
         cls,
+        response: Response,
         user_id: custom_types.User.id,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency(required_scopes={'admin'}))],
@@ -199,7 +260,8 @@ class ApiKeyAdminRouter(_Base):
                 'authorization': authorization,
                 'order_bys': order_bys,
                 'pagination': pagination,
-                'query': select(ApiKeyTable).where(ApiKeyTable.user_id == authorization._user_id)})]
+                'response': response,
+                'query': select(ApiKeyTable).where(ApiKeyTable.user_id == user_id)})]
 
     @classmethod
     async def by_id(
@@ -270,7 +332,7 @@ class ApiKeyAdminRouter(_Base):
         api_key_available_admin: api_key_schema.ApiKeyAdminAvailable = Depends(),
     ):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             return api_schema.IsAvailableResponse(
                 available=await ApiKeyService.is_available(
                     session, api_key_available_admin
@@ -281,6 +343,10 @@ class ApiKeyAdminRouter(_Base):
 
         self.router.get(
             '/users/{user_id}/', tags=[user_router._Base._TAG])(self.list_by_user)
+        self.router.post('/bulk/')(self.create_many)
+        self.router.patch('/bulk/')(self.update_many)
+        self.router.post(
+            '/bulk/delete/', status_code=status.HTTP_204_NO_CONTENT)(self.delete_many)
         self.router.get('/{api_key_id}/')(self.by_id)
         self.router.post('/')(self.create)
         self.router.patch('/{api_key_id}/')(self.update)
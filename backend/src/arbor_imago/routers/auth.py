@@ -2,13 +2,10 @@ import httpx
 from fastapi import Depends, Request, Response, Form, status, BackgroundTasks, HTTPException
 from sqlmodel import select
 from pydantic import BaseModel
-from typing import Annotated, cast
+from typing import Annotated, Optional, cast
 
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-
-from arbor_imago import config, custom_types, utils
-from arbor_imago.auth import utils as auth_utils, exceptions as auth_exceptions
+from arbor_imago import config, custom_types, utils, database
+from arbor_imago.auth import utils as auth_utils, exceptions as auth_exceptions, google as auth_google
 from arbor_imago.schemas import user_access_token as user_access_token_schema, user as user_schema, api as api_schema, sign_up as sign_up_schema
 from arbor_imago.models.tables import User, UserAccessToken
 from arbor_imago.models.models import SignUp
@@ -21,6 +18,11 @@ from arbor_imago.routers import base
 class TokenResponse(BaseModel):
     access_token: custom_types.JwtEncodedStr
     token_type: str
+    refresh_token: Optional[custom_types.JwtEncodedStr] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: custom_types.JwtEncodedStr
 
 
 class LoginWithPasswordResponse(auth_utils.GetUserSessionInfoNestedReturn):
@@ -106,7 +108,7 @@ class AuthRouter(base.Router):
         response: Response,
         stay_signed_in: bool = Form(False)
     ) -> TokenResponse:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             user_access_token = await UserAccessTokenService.create({
                 'session': session,
@@ -119,12 +121,15 @@ class AuthRouter(base.Router):
                 'authorized_user_id': user.id,
             })
 
-            encoded_jwt = utils.jwt_encode(
-                cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token)))
-
-            auth_utils.set_access_token_cookie(response, encoded_jwt, None if not stay_signed_in else auth_credential_service.lifespan_to_expiry(
+            encoded_jwt = auth_utils.set_auth_cookies(response, user, user_access_token, None if not stay_signed_in else auth_credential_service.lifespan_to_expiry(
                 config.AUTH['credential_lifespans']['access_token']))
-            return TokenResponse(access_token=encoded_jwt, token_type='bearer')
+
+            refresh_token = None
+            if config.AUTH['stateless_access_token']['enabled']:
+                refresh_token = utils.jwt_encode(
+                    cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token)))
+
+            return TokenResponse(access_token=encoded_jwt, token_type='bearer', refresh_token=refresh_token)
 
     @classmethod
     async def login_password(
@@ -135,7 +140,7 @@ class AuthRouter(base.Router):
         stay_signed_in: bool = Form(False)
     ) -> LoginWithPasswordResponse:
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             tokken_lifespan = config.AUTH['credential_lifespans']['access_token']
 
@@ -150,10 +155,7 @@ class AuthRouter(base.Router):
                 ),
             })
 
-            encoded_jwt = utils.jwt_encode(
-                cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token)))
-
-            auth_utils.set_access_token_cookie(response, encoded_jwt, None if not stay_signed_in else auth_credential_service.lifespan_to_expiry(
+            auth_utils.set_auth_cookies(response, user, user_access_token, None if not stay_signed_in else auth_credential_service.lifespan_to_expiry(
                 config.AUTH['credential_lifespans']['access_token']))
 
             user_private = user_schema.UserPrivate.model_validate(user)
@@ -187,7 +189,11 @@ class AuthRouter(base.Router):
         auth_credential = cast(
             UserAccessToken, authorization.auth_credential)
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
+
+            # one time link
+            await auth_utils.use_once(session, auth_credential)
+
             token_lifespan = config.AUTH['credential_lifespans']['access_token']
             user_access_token = await UserAccessTokenService.create(
                 {
@@ -202,12 +208,9 @@ class AuthRouter(base.Router):
                 }
             )
 
-            auth_utils.set_access_token_cookie(response, utils.jwt_encode(
-                dict(UserAccessTokenService.to_jwt_payload(user_access_token))), expiry=auth_credential_service.lifespan_to_expiry(token_lifespan))
-
-            # one time link, delete the auth_credential
-            await session.delete(auth_credential)
-            await session.commit()
+            user = await UserService.fetch_by_id_with_exception(session, auth_credential.user_id)
+            auth_utils.set_auth_cookies(
+                response, user, user_access_token, expiry=auth_credential_service.lifespan_to_expiry(token_lifespan))
 
         return LoginWithMagicLinkResponse(
             auth=auth_utils.GetUserSessionInfoReturn(
@@ -228,7 +231,7 @@ class AuthRouter(base.Router):
         response: Response
     ) -> auth_utils.LoginWithOTPResponse:
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.email == model.email))).one_or_none()
             return await auth_utils.login_otp(session, user, response, model.code)
@@ -240,7 +243,7 @@ class AuthRouter(base.Router):
         response: Response
     ) -> auth_utils.LoginWithOTPResponse:
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.phone_number == model.phone_number))).one_or_none()
             return await auth_utils.login_otp(session, user, response, model.code)
@@ -254,7 +257,7 @@ class AuthRouter(base.Router):
             override_lifetime=config.AUTH['credential_lifespans']['request_sign_up'])
 
         # double check the user doesn't already exist
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             if (await session.exec(select(User).where(
                     User.email == cast(SignUp, authorization.auth_credential).email))).one_or_none() is not None:
@@ -264,7 +267,7 @@ class AuthRouter(base.Router):
                     logout=False
                 )
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             sign_up = cast(SignUp,
                            authorization.auth_credential)
 
@@ -288,11 +291,8 @@ class AuthRouter(base.Router):
             )
         })
 
-        auth_utils.set_access_token_cookie(
-            response,
-            utils.jwt_encode(
-                cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token))),
-            expiry=token_expiry)
+        auth_utils.set_auth_cookies(
+            response, user, user_access_token, expiry=token_expiry)
 
         return SignUpResponse(
             auth=auth_utils.GetUserSessionInfoReturn(
@@ -307,18 +307,19 @@ class AuthRouter(base.Router):
     @classmethod
     async def login_google(cls, request_token: LoginWithGoogleRequest, response: Response) -> LoginWithGoogleResponse:
 
-        # Verify the ID token
+        # Verify the ID token against cached signing keys
         try:
-            idinfo = id_token.verify_oauth2_token(
-                request_token.id_token,  # <-- Make sure your frontend sends the ID token!
-                google_requests.Request(),
-                config.GOOGLE_CLIENT_ID
-            )
-        except ValueError:
+            idinfo = await auth_google.ID_TOKEN_VERIFIER.verify(request_token.id_token)
+        except auth_google.InvalidIdTokenError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid Google ID token"
             )
+        except auth_google.SigningKeysUnavailableError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Could not verify Google ID token, try again later"
+            )
 
         # fields: sub, name, given_name, family_name, picture, email, email_verified
         email = idinfo.get('email')
@@ -329,7 +330,7 @@ class AuthRouter(base.Router):
                 logout=False
             )
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             user = await UserService.fetch_by_email(session=session, email=email)
 
@@ -352,11 +353,7 @@ class AuthRouter(base.Router):
                 'session': session
             })
 
-            auth_utils.set_access_token_cookie(
-                response,
-                utils.jwt_encode(
-                    cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token))),
-            )
+            auth_utils.set_auth_cookies(response, user, user_access_token)
 
             return LoginWithGoogleResponse(
                 auth=auth_utils.GetUserSessionInfoReturn(
@@ -376,7 +373,7 @@ class AuthRouter(base.Router):
         background_tasks: BackgroundTasks
     ):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.email == model.email))).one_or_none()
             background_tasks.add_task(
@@ -386,7 +383,7 @@ class AuthRouter(base.Router):
     @classmethod
     async def request_magic_link_email(cls, model: RequestMagicLinkEmailRequest, background_tasks: BackgroundTasks):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.email == model.email))).one_or_none()
             if user:
@@ -398,7 +395,7 @@ class AuthRouter(base.Router):
 
     @classmethod
     async def request_magic_link_sms(cls, model: RequestMagicLinkSMSRequest, background_tasks: BackgroundTasks):
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.phone_number == model.phone_number))).one_or_none()
 
@@ -412,7 +409,7 @@ class AuthRouter(base.Router):
     @classmethod
     async def request_otp_email(cls, model: RequestOTPEmailRequest, background_tasks: BackgroundTasks):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.email == model.email))).one_or_none()
 
@@ -426,7 +423,7 @@ class AuthRouter(base.Router):
     @classmethod
     async def request_otp_sms(cls, model: RequestOTPSMSRequest, background_tasks: BackgroundTasks):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             user = (await session.exec(select(User).where(
                 User.phone_number == model.phone_number))).one_or_none()
             if user:
@@ -437,21 +434,56 @@ class AuthRouter(base.Router):
         return Response()
 
     @classmethod
-    async def logout(cls, response: Response, authorization: Annotated[auth_utils.GetAuthReturn[UserAccessToken], Depends(
-            auth_utils.make_get_auth_dependency(raise_exceptions=False, permitted_types={'access_token'}))]) -> api_schema.DetailOnlyResponse:
+    async def refresh(cls, request: Request, response: Response, model: Optional[RefreshRequest] = None) -> auth_utils.RefreshResponse:
+
+        refresh_token = model.refresh_token if model is not None else request.cookies.get(
+            config.AUTH['stateless_access_token']['refresh_token_cookie_key'])
+
+        async with database.session() as session:
+            return await auth_utils.refresh_access_token(session, response, refresh_token)
+
+    @classmethod
+    async def logout(cls, request: Request, response: Response, authorization: Annotated[auth_utils.GetAuthReturn[UserAccessToken], Depends(
+            auth_utils.make_get_auth_dependency(raise_exceptions=False, permitted_types={'access_token', 'stateless_access_token'}))]) -> api_schema.DetailOnlyResponse:
 
         if authorization.isAuthorized:
-            async with config.ASYNC_SESSIONMAKER() as session:
-                await UserAccessTokenService.delete({
-                    'session': session,
-                    'admin': False,
-                    'authorized_user_id': cast(custom_types.User.id, authorization._user_id),
-                    'id': UserAccessTokenService.model_id(cast(UserAccessToken, authorization.auth_credential))
-                })
+
+            # with stateless access tokens, the session lives on as the refresh token
+            if isinstance(authorization.auth_credential, UserAccessToken):
+                user_access_token_id = UserAccessTokenService.model_id(
+                    authorization.auth_credential)
+            else:
+                refresh_authorization = await auth_utils.get_auth_from_auth_credential_jwt(
+                    token=request.cookies.get(
+                        config.AUTH['stateless_access_token']['refresh_token_cookie_key']),
+                    permitted_types={'access_token'})
+                user_access_token_id = None if refresh_authorization.exception else UserAccessTokenService.model_id(
+                    cast(UserAccessToken, refresh_authorization.auth_credential))
+
+            if user_access_token_id is not None:
+                async with database.session() as session:
+                    await UserAccessTokenService.delete({
+                        'session': session,
+                        'admin': False,
+                        'authorized_user_id': cast(custom_types.User.id, authorization._user_id),
+                        'id': user_access_token_id
+                    })
 
         auth_utils.delete_access_token_cookie(response)
+        auth_utils.delete_refresh_token_cookie(response)
         return api_schema.DetailOnlyResponse(detail='Logged out')
 
+    @classmethod
+    async def logout_everywhere(cls, response: Response, authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(permitted_types={'access_token', 'stateless_access_token'}))]) -> api_schema.DetailOnlyResponse:
+
+        async with database.session() as session:
+            await auth_utils.logout_everywhere(session, cast(custom_types.User.id, authorization._user_id))
+
+        auth_utils.delete_access_token_cookie(response)
+        auth_utils.delete_refresh_token_cookie(response)
+        return api_schema.DetailOnlyResponse(detail='Logged out everywhere')
+
     def _set_routes(self):
 
         self.router.get('/')(self.auth_root)
@@ -473,4 +505,6 @@ class AuthRouter(base.Router):
             '/request/magic-link/sms/')(self.request_magic_link_sms)
         self.router.post('/request/otp/email/')(self.request_otp_email)
         self.router.post('/request/otp/sms/')(self.request_otp_sms)
+        self.router.post('/refresh/')(self.refresh)
         self.router.post('/logout/')(self.logout)
+        self.router.post('/logout/everywhere/')(self.logout_everywhere)
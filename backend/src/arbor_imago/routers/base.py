@@ -1,24 +1,37 @@
 from pydantic import BaseModel
 from typing import Protocol, Unpack, TypeVar, TypedDict, Generic, NotRequired, Literal, Self, ClassVar, Type, Optional
 from typing import TypeVar, Type, List, Callable, ClassVar, TYPE_CHECKING, Generic, Protocol, Any, Annotated, cast
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Body
 from functools import wraps, lru_cache
 from enum import Enum
 from collections.abc import Sequence
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
-from arbor_imago import config, custom_types, models
+from arbor_imago import config, custom_types, models, database
 from arbor_imago.services import base as base_service
 from arbor_imago.schemas import pagination as pagination_schema, order_by as order_by_schema
+from arbor_imago.schemas.api import BulkUpdate
 from arbor_imago.auth import utils as auth_utils
 
 
+# largest number of items accepted by a bulk endpoint
+BULK_MAX_ITEMS = 500
+
+
 def get_pagination(max_limit: int = 100, default_limit: int = 10):
-    def dependency(limit: int = Query(default_limit, ge=1, le=max_limit, description='Quantity of results'), offset: int = Query(0, ge=0, description='Index of the first result')):
-        return pagination_schema.Pagination(limit=limit, offset=offset)
+    def dependency(limit: int = Query(default_limit, ge=1, le=max_limit, description='Quantity of results'), offset: int = Query(0, ge=0, description='Index of the first result'), cursor: str | None = Query(None, description='Cursor from the "' + config.HEADER_KEYS['next_cursor'] + '" header of the previous page, used instead of "offset"')):
+        if cursor is not None and offset != 0:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST,
+                                detail='"cursor" and "offset" can not be combined')
+        return pagination_schema.Pagination(limit=limit, offset=offset, cursor=cursor)
     return dependency
 
 
+def bulk_body(description: str):
+    return Body(min_length=1, max_length=BULK_MAX_ITEMS, description=description)
+
+
 def order_by_depends(
     order_by: list[base_service.TOrderBy_co] = Query(
         [], description='Ordered series of fields to sort the results by, in the order they should be applied'),
@@ -63,7 +76,7 @@ class GetParams(Generic[custom_types.TId], RouterVerbParams, WithId[custom_types
 
 
 class GetManyParams(Generic[models.TModel, base_service.TOrderBy_co], RouterVerbParams, base_service.ReadManyBase[models.TModel, base_service.TOrderBy_co]):
-    pass
+    response: NotRequired[Response]
 
 
 class PostParams(Generic[base_service.TCreateModel], RouterVerbParams):
@@ -78,6 +91,18 @@ class DeleteParams(Generic[custom_types.TId], RouterVerbParams, WithId[custom_ty
     pass
 
 
+class PostManyParams(Generic[base_service.TCreateModel], RouterVerbParams):
+    create_models: Sequence[base_service.TCreateModel]
+
+
+class PatchManyParams(Generic[custom_types.TId, base_service.TUpdateModel], RouterVerbParams):
+    update_models: Sequence[BulkUpdate[custom_types.TId, base_service.TUpdateModel]]
+
+
+class DeleteManyParams(Generic[custom_types.TId], RouterVerbParams):
+    ids: Sequence[custom_types.TId]
+
+
 class HasPrefix(Protocol):
     _PREFIX: ClassVar[str]
 
@@ -254,7 +279,7 @@ class ServiceRouter(Generic[
     @classmethod
     async def _get(cls, params: GetParams[custom_types.TId]) -> models.TModel:
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             try:
                 model_inst = await cls._SERVICE.read({
                     'admin': cls._ADMIN,
@@ -274,30 +299,61 @@ class ServiceRouter(Generic[
 
             return model_inst
 
+    @classmethod
+    def _read_many_params(cls, session: AsyncSession, params: GetManyParams[models.TModel, base_service.TOrderBy_co]) -> base_service.ReadManyParams[models.TModel, base_service.TOrderBy_co]:
+
+        d: base_service.ReadManyParams[models.TModel, base_service.TOrderBy_co] = {
+            'admin': cls._ADMIN,
+            'session': session,
+            'authorized_user_id': params['authorization']._user_id,
+            'pagination': params['pagination']}
+
+        if 'order_bys' in params:
+            d['order_bys'] = params['order_bys']
+        if 'query' in params:
+            d['query'] = params['query']
+        return d
+
+    @classmethod
+    def _set_next_cursor(cls, params: GetManyParams[models.TModel, base_service.TOrderBy_co], model_insts: Sequence[models.TModel]) -> None:
+
+        if 'response' in params:
+            next_cursor = cls._SERVICE.next_cursor(
+                model_insts, params['pagination'], params.get('order_bys', []))
+            if next_cursor is not None:
+                params['response'].headers[config.HEADER_KEYS['next_cursor']] = next_cursor
+
     @classmethod
     async def _get_many(cls, params: GetManyParams[models.TModel, base_service.TOrderBy_co]) -> Sequence[models.TModel]:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             try:
-                d: base_service.ReadManyParams[models.TModel, base_service.TOrderBy_co] = {
-                    'admin': cls._ADMIN,
-                    'session': session,
-                    'authorized_user_id': params['authorization']._user_id,
-                    'pagination': params['pagination']}
+                model_insts = await cls._SERVICE.read_many(cls._read_many_params(session, params))
+            except pagination_schema.InvalidCursorError as e:
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST, detail=str(e))
+            except Exception as e:
+                raise
 
-                if 'order_bys' in params:
-                    d['order_bys'] = params['order_bys']
-                if 'query' in params:
-                    d['query'] = params['query']
+            cls._set_next_cursor(params, model_insts)
+            return model_insts
 
-                model_insts = await cls._SERVICE.read_many(d)
+    @classmethod
+    async def _get_page(cls, params: GetManyParams[models.TModel, base_service.TOrderBy_co]) -> base_service.Page[models.TModel]:
+        async with database.session() as session:
+            try:
+                page = await cls._SERVICE.read_page(cls._read_many_params(session, params))
+            except pagination_schema.InvalidCursorError as e:
+                raise HTTPException(
+                    status.HTTP_400_BAD_REQUEST, detail=str(e))
             except Exception as e:
                 raise
 
-            return model_insts
+            cls._set_next_cursor(params, page.items)
+            return page
 
     @classmethod
     async def _post(cls, params: PostParams[base_service.TCreateModel]) -> models.TModel:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             try:
                 model_inst = await cls._SERVICE.create({
@@ -315,7 +371,7 @@ class ServiceRouter(Generic[
 
     @classmethod
     async def _patch(cls, params: PatchParams[custom_types.TId, base_service.TUpdateModel]) -> models.TModel:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             try:
                 model_inst = await cls._SERVICE.update({
                     'admin': cls._ADMIN,
@@ -335,7 +391,7 @@ class ServiceRouter(Generic[
 
     @classmethod
     async def _delete(cls, params: DeleteParams[custom_types.TId]) -> None:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             try:
                 await cls._SERVICE.delete({
                     'admin': cls._ADMIN,
@@ -350,6 +406,51 @@ class ServiceRouter(Generic[
             except Exception as e:
                 raise
 
+    @classmethod
+    async def _post_many(cls, params: PostManyParams[base_service.TCreateModel]) -> list[models.TModel]:
+        async with database.session() as session:
+            return await cls._SERVICE.create_many({
+                'admin': cls._ADMIN,
+                'session': session,
+                'authorized_user_id': params['authorization']._user_id,
+                'create_models': params['create_models'],
+            })
+
+    @classmethod
+    async def _patch_many(cls, params: PatchManyParams[custom_types.TId, base_service.TUpdateModel]) -> list[models.TModel]:
+
+        update_models = {bulk_update.id: bulk_update.update for bulk_update in params['update_models']}
+        if len(update_models) != len(params['update_models']):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Duplicate ids')
+
+        async with database.session() as session:
+            try:
+                return await cls._SERVICE.update_many({
+                    'admin': cls._ADMIN,
+                    'session': session,
+                    'authorized_user_id': params['authorization']._user_id,
+                    'update_models': update_models,
+                })
+            except base_service.NotFoundError as e:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.error_message)
+
+    @classmethod
+    async def _delete_many(cls, params: DeleteManyParams[custom_types.TId]) -> None:
+
+        if len(set(params['ids'])) != len(params['ids']):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Duplicate ids')
+
+        async with database.session() as session:
+            try:
+                await cls._SERVICE.delete_many({
+                    'admin': cls._ADMIN,
+                    'session': session,
+                    'authorized_user_id': params['authorization']._user_id,
+                    'ids': params['ids'],
+                })
+            except base_service.NotFoundError as e:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.error_message)
+
     @classmethod
     @lru_cache(maxsize=None)
     def get_responses(cls):
@@ -1,14 +1,15 @@
-from fastapi import Depends, status, UploadFile, HTTPException
+from fastapi import Depends, status, UploadFile, HTTPException, Response
 from sqlmodel import select
 from typing import Annotated, cast
 import shutil
 
-from arbor_imago import config, custom_types
+from arbor_imago import config, custom_types, database
 from arbor_imago.auth import utils as auth_utils
 from arbor_imago.routers import base, user as user_router
 from arbor_imago.models.tables import Gallery as GalleryTable, GalleryPermission as GalleryPermissionTable
 from arbor_imago.services.gallery import Gallery as GalleryService
 from arbor_imago.services.gallery_permission import GalleryPermission as GalleryPermissionService
+from arbor_imago.services.gallery_access import GalleryAccess as GalleryAccessService
 from arbor_imago.schemas import gallery as gallery_schema, pagination as pagination_schema, api as api_schema, gallery_permission as gallery_permission_schema
 
 
@@ -36,9 +37,66 @@ galleries_pagination = base.get_pagination()
 class GalleryRouter(_Base):
     _ADMIN = False
 
+    @classmethod
+    async def access_levels(
+        cls,
+        gallery_ids: Annotated[list[custom_types.Gallery.id], base.bulk_body('Ids of the galleries to resolve')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(raise_exceptions=False))]
+    ) -> list[gallery_schema.GalleryAccessLevel]:
+
+        async with database.session() as session:
+            accesses = await GalleryAccessService.resolve_many(session, authorization._user_id, gallery_ids)
+            return [gallery_schema.GalleryAccessLevel(gallery_id=gallery_id, permission_level=access.permission_level, source=access.source)
+                    for gallery_id, access in accesses.items()]
+
+    @classmethod
+    async def list_shared(
+        cls,
+        response: Response,
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency())],
+        pagination: pagination_schema.Pagination = Depends(
+            galleries_pagination)
+    ) -> list[gallery_schema.GalleryPublic]:
+        """Galleries other users have shared with me, directly or through a parent gallery"""
+
+        return [gallery_schema.GalleryPublic.model_validate(gallery) for gallery in
+                await cls._get_many({
+                    'authorization': authorization,
+                    'pagination': pagination,
+                    'response': response,
+                    'query': select(GalleryTable).where(
+                        GalleryTable.user_id != authorization._user_id,
+                        GalleryAccessService.shared_with(authorization._user_id))
+                })
+                ]
+
+    @classmethod
+    async def list_visible(
+        cls,
+        response: Response,
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(raise_exceptions=False))],
+        pagination: pagination_schema.Pagination = Depends(
+            galleries_pagination)
+    ) -> list[gallery_schema.GalleryPublic]:
+        """Every gallery I can see: my own, shared with me and public ones. Anonymous users see public galleries"""
+
+        return [gallery_schema.GalleryPublic.model_validate(gallery) for gallery in
+                await cls._get_many({
+                    'authorization': authorization,
+                    'pagination': pagination,
+                    'response': response,
+                    'query': select(GalleryTable).where(
+                        GalleryAccessService.visible_to(authorization._user_id))
+                })
+                ]
+
     @classmethod
     async def list(
         cls,
+        response: Response,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency())],
         pagination: pagination_schema.Pagination = Depends(
@@ -49,6 +107,7 @@ class GalleryRouter(_Base):
                 await cls._get_many({
                     'authorization': authorization,
                     'pagination': pagination,
+                    'response': response,
                     'query': select(GalleryTable).where(GalleryTable.user_id == authorization._user_id)
                 })
                 ]
@@ -117,7 +176,7 @@ class GalleryRouter(_Base):
         gallery_available: gallery_schema.GalleryAvailable = Depends(),
     ):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             return api_schema.IsAvailableResponse(
                 available=await GalleryService.is_available(
@@ -154,29 +213,10 @@ class GalleryRouter(_Base):
         file: UploadFile
     ):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
-            gallery = await GalleryService.fetch_by_id(session, gallery_id)
-            if not gallery:
-                raise base.NotFoundError(GalleryTable, gallery_id)
-
-            if gallery.user.id != authorization._user_id:
-                gallery_permission = await GalleryPermissionService.fetch_by_id(
-                    session, custom_types.GalleryPermission.id(
-                        gallery_id, cast(custom_types.User.id, authorization._user_id))
-                )
-
-                if gallery_permission is None:
-                    if gallery.visibility_level == config.VISIBILITY_LEVEL_NAME_MAPPING['private']:
-                        raise base.NotFoundError(GalleryTable, gallery_id)
-
-                    if gallery.visibility_level == config.VISIBILITY_LEVEL_NAME_MAPPING['public']:
-                        raise HTTPException(
-                            status.HTTP_403_FORBIDDEN, detail='User lacks edit permission for this gallery')
-                else:
-                    if gallery_permission.permission_level < config.PERMISSION_LEVEL_NAME_MAPPING['editor']:
-                        raise HTTPException(
-                            status.HTTP_403_FORBIDDEN, detail='User does not have permission to add files to this gallery')
+            await GalleryService.authorize(session, authorization._user_id, gallery_id, 'update')
+            gallery = await GalleryService.fetch_by_id_with_exception(session, gallery_id)
 
             file_path = (await GalleryService.get_dir(session, gallery, config.GALLERIES_DIR)).joinpath(file.filename or 'test.jpg')
             with open(file_path, "wb") as buffer:
@@ -189,7 +229,7 @@ class GalleryRouter(_Base):
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency())]
     ) -> api_schema.DetailOnlyResponse:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
 
             gallery = await cls._get({
                 'authorization': authorization,
@@ -203,6 +243,9 @@ class GalleryRouter(_Base):
     def _set_routes(self):
 
         self.router.get('/', tags=[user_router._Base._TAG])(self.list)
+        self.router.get('/shared/')(self.list_shared)
+        self.router.get('/visible/')(self.list_visible)
+        self.router.post('/access-levels/')(self.access_levels)
         self.router.get('/{gallery_id}/')(self.by_id)
         self.router.post('/')(self.create)
         self.router.patch('/{gallery_id}/')(self.update)
@@ -221,6 +264,45 @@ class GalleryRouter(_Base):
 class GalleryAdminRouter(_Base):
     _ADMIN = True
 
+    @classmethod
+    async def create_many(
+        cls,
+        gallery_creates_admin: Annotated[list[gallery_schema.GalleryAdminCreate], base.bulk_body('Galleries to create')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ) -> list[gallery_schema.GalleryPrivate]:
+
+        return [gallery_schema.GalleryPrivate.model_validate(gallery) for gallery in await cls._post_many({
+            'authorization': authorization,
+            'create_models': gallery_creates_admin,
+        })]
+
+    @classmethod
+    async def update_many(
+        cls,
+        gallery_updates_admin: Annotated[list[api_schema.BulkUpdate[custom_types.Gallery.id, gallery_schema.GalleryAdminUpdate]], base.bulk_body('Galleries to update, by id')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ) -> list[gallery_schema.GalleryPrivate]:
+
+        return [gallery_schema.GalleryPrivate.model_validate(gallery) for gallery in await cls._patch_many({
+            'authorization': authorization,
+            'update_models': gallery_updates_admin,
+        })]
+
+    @classmethod
+    async def delete_many(
+        cls,
+        gallery_ids: Annotated[list[custom_types.Gallery.id], base.bulk_body('Ids of the Galleries to delete')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ):
+
+        return await cls._delete_many({
+            'authorization': authorization,
+            'ids': gallery_ids,
+        })
+
     @classmethod
     async def by_id(
         cls,
@@ -286,21 +368,18 @@ class GalleryAdminRouter(_Base):
         gallery_available_admin: gallery_schema.GalleryAdminAvailable = Depends(),
     ):
 
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             return api_schema.IsAvailableResponse(
                 available=await GalleryService.is_available(
                     session=session,
-                    gallery_available_admin=gallery_schema.GalleryAdminAvailable(
-                        **gallery_available_admin.model_dump(exclude_unset=True),
-                        user_id=cast(custom_types.User.id,
-                                     authorization._user_id)
-                    )
+                    gallery_available_admin=gallery_available_admin
                 )
             )
 
     @classmethod
     async def list_by_user(
         cls,
+        response: Response,
         user_id: custom_types.User.id,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency(required_scopes={'admin'}))],
@@ -313,11 +392,16 @@ class GalleryAdminRouter(_Base):
                     'authorization': authorization,
                     'query': select(GalleryTable).where(
                         GalleryTable.user_id == user_id),
-                    'pagination': pagination
+                    'pagination': pagination,
+                    'response': response,
                 })]
 
     def _set_routes(self):
 
+        self.router.post('/bulk/')(self.create_many)
+        self.router.patch('/bulk/')(self.update_many)
+        self.router.post(
+            '/bulk/delete/', status_code=status.HTTP_204_NO_CONTENT)(self.delete_many)
         self.router.get('/{gallery_id}/')(self.by_id)
         self.router.post('/')(self.create)
         self.router.patch('/{gallery_id}/')(self.update)
@@ -1,10 +1,10 @@
-from fastapi import Depends, status, Query, HTTPException
+from fastapi import Depends, status, Query, HTTPException, Response
 from sqlmodel import select, func
 from pydantic import BaseModel
 from collections.abc import Sequence
 from typing import Annotated, cast, Optional
 
-from arbor_imago import custom_types, config
+from arbor_imago import custom_types, config, database
 from arbor_imago.routers import user as user_router, api_key as api_key_router, gallery as gallery_router, base, user_access_token as user_access_token_router
 from arbor_imago.schemas import api_key as api_key_schema, pagination as pagination_schema, api as api_schema, order_by as order_by_schema, user as user_schema, user_access_token as user_access_token_schema, gallery as gallery_schema
 from arbor_imago.models.tables import ApiKey as ApiKeyTable, UserAccessToken as UserAccessTokenTable, Gallery as GalleryTable
@@ -86,30 +86,35 @@ class PagesRouter(_Base):
     @classmethod
     async def settings_api_keys(
         cls,
+        response: Response,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(auth_utils.make_get_auth_dependency())],
         pagination: pagination_schema.Pagination = Depends(
             api_key_router.api_key_pagination),
         order_by: list[order_by_schema.OrderBy[custom_types.ApiKey.order_by]] = Depends(
             base.order_by_depends)
     ) -> SettingsApiKeysPageResponse:
+        api_keys = await api_key_router.ApiKeyRouter.page(response, authorization, pagination, order_by)
         return SettingsApiKeysPageResponse(
             **auth_utils.get_user_session_info(authorization).model_dump(),
-            api_key_count=await api_key_router.ApiKeyRouter.count(authorization),
-            api_keys=await api_key_router.ApiKeyRouter.list(authorization, pagination, order_by)
+            api_key_count=api_keys.total,
+            api_keys=[api_key_schema.ApiKeyPrivate.model_validate(
+                api_key) for api_key in api_keys.items]
         )
 
     @classmethod
     async def settings_user_access_tokens(
         cls,
+        response: Response,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(auth_utils.make_get_auth_dependency())],
         pagination: pagination_schema.Pagination = Depends(
             user_access_token_router.user_access_token_pagination)
     ) -> SettingsUserAccessTokensPageResponse:
+        user_access_tokens = await user_access_token_router.UserAccessTokenRouter.page(
+            response, authorization, pagination)
         return SettingsUserAccessTokensPageResponse(
             **auth_utils.get_user_session_info(authorization).model_dump(),
-            user_access_token_count=await user_access_token_router.UserAccessTokenRouter.count(authorization),
-            user_access_tokens=await user_access_token_router.UserAccessTokenRouter.list(
-                authorization, pagination)
+            user_access_token_count=user_access_tokens.total,
+            user_access_tokens=list(user_access_tokens.items)
         )
 
     @classmethod
@@ -132,7 +137,7 @@ class PagesRouter(_Base):
     ) -> GalleryPageResponse:
 
         if root:
-            async with config.ASYNC_SESSIONMAKER() as session:
+            async with database.session() as session:
                 if not authorization.isAuthorized:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -1,9 +1,9 @@
-from fastapi import Depends, status
+from fastapi import Depends, status, Response
 from sqlmodel import select
 from typing import Annotated, cast, Type
 from collections.abc import Sequence
 
-from arbor_imago import config, custom_types
+from arbor_imago import config, custom_types, database
 from arbor_imago.auth import utils as auth_utils
 from arbor_imago.routers import base
 from arbor_imago.models.tables import User as UserTable
@@ -36,6 +36,7 @@ class UserRouter(_Base):
     @classmethod
     async def list(
         cls,
+        response: Response,
         pagination: Annotated[pagination_schema.Pagination, Depends(
             base.get_pagination())],
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
@@ -44,6 +45,7 @@ class UserRouter(_Base):
         return [user_schema.UserPublic.model_validate(user) for user in await cls._get_many({
             'authorization': authorization,
             'pagination': pagination,
+            'response': response,
             # these are public users
             'query': select(UserTable).where(UserTable.username != None)
         })]
@@ -98,9 +100,9 @@ class UserRouter(_Base):
 
     @classmethod
     async def check_username_availability(cls, username: custom_types.User.username):
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             return api_schema.IsAvailableResponse(
-                available=not await UserService.is_username_available(session, username))
+                available=await UserService.is_username_available(session, username))
 
     def _set_routes(self):
 
@@ -118,9 +120,49 @@ class UserAdminRouter(_Base):
 
     _ADMIN = True
 
+    @classmethod
+    async def create_many(
+        cls,
+        user_creates_admin: Annotated[list[user_schema.UserAdminCreate], base.bulk_body('Users to create')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ) -> list[user_schema.UserPrivate]:
+
+        return [user_schema.UserPrivate.model_validate(user) for user in await cls._post_many({
+            'authorization': authorization,
+            'create_models': user_creates_admin,
+        })]
+
+    @classmethod
+    async def update_many(
+        cls,
+        user_updates_admin: Annotated[list[api_schema.BulkUpdate[custom_types.User.id, user_schema.UserAdminUpdate]], base.bulk_body('Users to update, by id')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ) -> list[user_schema.UserPrivate]:
+
+        return [user_schema.UserPrivate.model_validate(user) for user in await cls._patch_many({
+            'authorization': authorization,
+            'update_models': user_updates_admin,
+        })]
+
+    @classmethod
+    async def delete_many(
+        cls,
+        user_ids: Annotated[list[custom_types.User.id], base.bulk_body('Ids of the Users to delete')],
+        authorization: Annotated[auth_utils.GetAuthReturn, Depends(
+            auth_utils.make_get_auth_dependency(required_scopes={'admin'}))]
+    ):
+
+        return await cls._delete_many({
+            'authorization': authorization,
+            'ids': user_ids,
+        })
+
     @classmethod
     async def list(
         cls,
+        response: Response,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency(required_scopes={'admin'}))],
         pagination: Annotated[pagination_schema.Pagination, Depends(
@@ -131,6 +173,7 @@ class UserAdminRouter(_Base):
             user_schema.UserPrivate.model_validate(user) for user in await cls._get_many({
                 'authorization': authorization,
                 'pagination': pagination,
+                'response': response,
             })]
 
     @classmethod
@@ -190,6 +233,10 @@ class UserAdminRouter(_Base):
 
     def _set_routes(self):
         self.router.get('/')(self.list)
+        self.router.post('/bulk/')(self.create_many)
+        self.router.patch('/bulk/')(self.update_many)
+        self.router.post(
+            '/bulk/delete/', status_code=status.HTTP_204_NO_CONTENT)(self.delete_many)
         self.router.get('/{user_id}/')(self.by_id)
         self.router.post('/')(self.create)
         self.router.patch('/{user_id}/')(self.update)
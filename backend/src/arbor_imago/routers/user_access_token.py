@@ -2,10 +2,11 @@ from fastapi import Depends, status, Response
 from sqlmodel import select, func
 from typing import Annotated, cast, Literal
 
-from arbor_imago import config, custom_types
+from arbor_imago import config, custom_types, database
 from arbor_imago.models.tables import UserAccessToken as UserAccessTokenTable
 from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
 from arbor_imago.schemas import user_access_token as user_access_token_schema, pagination as pagination_schema, api as api_schema
+from arbor_imago.services import base as base_service
 from arbor_imago.routers import user as user_router, base
 from arbor_imago.auth import utils as auth_utils
 
@@ -39,6 +40,7 @@ class UserAccessTokenRouter(_Base):
     @classmethod
     async def list(
         cls,
+        response: Response,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency())],
         pagination: pagination_schema.Pagination = Depends(
@@ -49,10 +51,28 @@ class UserAccessTokenRouter(_Base):
         return list(await cls._get_many({
             'authorization': authorization,
             'pagination': pagination,
+            'response': response,
             'query': select(UserAccessTokenTable).where(
                 UserAccessTokenTable.user_id == authorization._user_id)
         }))
 
+    @classmethod
+    async def page(
+        cls,
+        response: Response,
+        authorization: auth_utils.GetAuthReturn,
+        pagination: pagination_schema.Pagination
+    ) -> base_service.Page[UserAccessTokenTable]:
+        """The user's access tokens along with their total count, in one query"""
+
+        return await cls._get_page({
+            'authorization': authorization,
+            'pagination': pagination,
+            'response': response,
+            'query': select(UserAccessTokenTable).where(
+                UserAccessTokenTable.user_id == authorization._user_id)
+        })
+
     @classmethod
     async def by_id(
         cls,
@@ -91,7 +111,7 @@ class UserAccessTokenRouter(_Base):
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency())],
     ) -> int:
-        async with config.ASYNC_SESSIONMAKER() as session:
+        async with database.session() as session:
             query = select(func.count()).select_from(UserAccessTokenTable).where(
                 UserAccessTokenTable.user_id == authorization._user_id)
             return (await session.exec(query)).one()
@@ -112,6 +132,7 @@ class UserAccessTokenAdminRouter(_Base):
     @classmethod
     async def list_by_user(
         cls,
+        response: Response,
         user_id: custom_types.User.id,
         authorization: Annotated[auth_utils.GetAuthReturn, Depends(
             auth_utils.make_get_auth_dependency(required_scopes={'admin'}))],
@@ -122,6 +143,7 @@ class UserAccessTokenAdminRouter(_Base):
         return list(await cls._get_many({
             'authorization': authorization,
             'pagination': pagination,
+            'response': response,
             'query': select(UserAccessTokenTable).where(
                 UserAccessTokenTable.user_id == user_id)
 
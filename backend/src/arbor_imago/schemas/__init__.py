@@ -2,7 +2,7 @@ from pydantic import BaseModel
 from typing import Type, Literal, TypeVar
 
 from arbor_imago.models.tables import UserAccessToken, ApiKey, OTP
-from arbor_imago.models.models import SignUp
+from arbor_imago.models.models import SignUp, StatelessAccessToken
 
 
 class FromAttributes(BaseModel):
@@ -10,21 +10,24 @@ class FromAttributes(BaseModel):
         from_attributes = True
 
 
-AuthCredential = Type[UserAccessToken] | Type[ApiKey] | Type[OTP] | Type[SignUp]
-AuthCredentialType = Literal['access_token', 'api_key', 'otp', 'sign_up']
-AuthCredentialInstance = UserAccessToken | ApiKey | OTP | SignUp
+AuthCredential = Type[UserAccessToken] | Type[ApiKey] | Type[OTP] | Type[SignUp] | Type[StatelessAccessToken]
+AuthCredentialType = Literal['access_token', 'api_key',
+                             'otp', 'sign_up', 'stateless_access_token']
+AuthCredentialInstance = UserAccessToken | ApiKey | OTP | SignUp | StatelessAccessToken
 
 AUTH_CREDENTIAL_TYPES: set[AuthCredentialType] = {
     'access_token',
     'api_key',
     'otp',
     'sign_up',
+    'stateless_access_token',
 }
 
 
-AuthCredentialJwt = Type[UserAccessToken] | Type[ApiKey] | Type[SignUp]
-AuthCredentialJwtType = Literal['access_token', 'api_key', 'sign_up']
-AuthCredentialJwtInstance = UserAccessToken | ApiKey | SignUp
+AuthCredentialJwt = Type[UserAccessToken] | Type[ApiKey] | Type[SignUp] | Type[StatelessAccessToken]
+AuthCredentialJwtType = Literal['access_token',
+                                'api_key', 'sign_up', 'stateless_access_token']
+AuthCredentialJwtInstance = UserAccessToken | ApiKey | SignUp | StatelessAccessToken
 
 AuthCredentialTable = Type[UserAccessToken] | Type[ApiKey] | Type[OTP]
 AuthCredentialTableType = Literal['access_token', 'api_key', 'otp']
@@ -34,9 +37,9 @@ AuthCredentialJwtAndTable = Type[UserAccessToken] | Type[ApiKey]
 AuthCredentialJwtAndTableType = Literal['access_token', 'api_key']
 AuthCredentialJwtAndTableInstance = UserAccessToken | ApiKey
 
-AuthCredentialJwtAndNotTable = Type[SignUp]
-AuthCredentialJwtAndNotTableType = Literal['sign_up']
-AuthCredentialJwtAndNotTableInstance = SignUp
+AuthCredentialJwtAndNotTable = Type[SignUp] | Type[StatelessAccessToken]
+AuthCredentialJwtAndNotTableType = Literal['sign_up', 'stateless_access_token']
+AuthCredentialJwtAndNotTableInstance = SignUp | StatelessAccessToken
 
 PrimaryAuthCredential = Type[UserAccessToken] | Type[ApiKey]
 PrimaryAuthCredentialInstance = UserAccessToken | ApiKey
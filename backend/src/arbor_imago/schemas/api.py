@@ -11,3 +11,9 @@ class NotFoundResponse(DetailOnlyResponse):
 
 class IsAvailableResponse(BaseModel):
     available: bool
+
+
+class BulkUpdate[TId, TUpdateModel: BaseModel](BaseModel):
+    id: TId
+    update: TUpdateModel
+
@@ -2,7 +2,7 @@ from pydantic import BaseModel
 from typing import Optional
 
 from arbor_imago import custom_types
-from arbor_imago.schemas import auth_credential as auth_credential_schema
+from arbor_imago.schemas import FromAttributes, auth_credential as auth_credential_schema
 
 
 class ApiKeyAvailable(BaseModel):
@@ -35,7 +35,7 @@ class ApiKeyAdminCreate(ApiKeyCreate, BaseModel):
     user_id: custom_types.User.id
 
 
-class ApiKeyExport(BaseModel):
+class ApiKeyExport(FromAttributes):
     id: custom_types.ApiKey.id
     user_id: custom_types.User.id
     name: custom_types.ApiKey.name
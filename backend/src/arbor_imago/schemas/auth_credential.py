@@ -12,6 +12,7 @@ class Type(Enum):
     API_KEY = 'api_key'
     OTP = 'otp'
     SIGN_UP = 'sign_up'
+    STATELESS_ACCESS_TOKEN = 'stateless_access_token'
 
 
 class JwtPayload(Generic[TSub], TypedDict):
@@ -2,10 +2,11 @@ from pydantic import BaseModel
 from typing import Optional
 
 from arbor_imago import custom_types
+from arbor_imago.schemas import FromAttributes
 from arbor_imago.services import base as base_service
 
 
-class GalleryExport(BaseModel):
+class GalleryExport(FromAttributes):
     id: custom_types.Gallery.id
     user_id: custom_types.Gallery.user_id
     name: custom_types.Gallery.name
@@ -63,3 +64,10 @@ class GalleryAvailable(BaseModel):
 
 class GalleryAdminAvailable(GalleryAvailable):
     user_id: custom_types.User.id
+
+
+class GalleryAccessLevel(BaseModel):
+    gallery_id: custom_types.Gallery.id
+    # None if the gallery does not exist or the user can not see it
+    permission_level: custom_types.PermissionLevel.id | None
+    source: custom_types.GalleryAccess.source | None
@@ -1,6 +1,49 @@
-from pydantic import BaseModel
+import base64
+import binascii
+import functools
+import json
+import typing
+
+import pydantic_core
+from pydantic import BaseModel, TypeAdapter
+
+"""
+Developer's Note:
+Pages are either addressed by offset, or by an opaque cursor naming the sort key of the last row of the previous page.
+A cursor turns into an index-backed `WHERE (k, id) > (...)` seek, so deep pages cost the same as the first one.
+"""
 
 
 class Pagination(BaseModel):
     limit: int
-    offset: int
+    offset: int = 0
+    cursor: str | None = None
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(sort_key: list[str], values: list[typing.Any]) -> str:
+    payload = json.dumps({'o': sort_key, 'k': pydantic_core.to_jsonable_python(values)},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_key: list[str]) -> list[typing.Any]:
+    """Returns the JSON values of the cursor, the cursor must have been issued for the same sort key"""
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursorError('Malformed cursor') from e
+
+    if not isinstance(payload, dict) or payload.get('o') != sort_key or not isinstance(payload.get('k'), list) or len(payload['k']) != len(sort_key):
+        raise InvalidCursorError('Cursor does not match the requested order')
+    return payload['k']
+
+
+@functools.cache
+def type_adapter(annotation: typing.Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
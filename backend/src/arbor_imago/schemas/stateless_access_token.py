@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from arbor_imago import custom_types
+from arbor_imago.schemas import auth_credential as auth_credential_schema
+
+
+class StatelessAccessTokenAdminCreate(BaseModel):
+    user_id: custom_types.User.id
+    user_role_id: custom_types.User.user_role_id
+    scope_ids: list[custom_types.Scope.id]
+    token_epoch: custom_types.User.token_epoch
+    expiry: custom_types.AuthCredential.expiry
+
+
+class JwtPayload(auth_credential_schema.JwtPayload[custom_types.User.id]):
+    role: custom_types.User.user_role_id
+    scopes: list[custom_types.Scope.id]
+    epoch: custom_types.User.token_epoch
@@ -8,24 +8,26 @@ from arbor_imago.services.gallery_permission import GalleryPermission as Gallery
 from arbor_imago.services.image_version import ImageVersion as ImageVersionService
 from arbor_imago.services.otp import OTP as OTPService
 from arbor_imago.services.sign_up import SignUp as SignUpService
+from arbor_imago.services.stateless_access_token import StatelessAccessToken as StatelessAccessTokenService
 from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
 from arbor_imago.services.user import User as UserService
 
-AuthCredentialService = Type[UserAccessTokenService] | Type[ApiKeyService] | Type[OTPService] | Type[SignUpService]
-AuthCredentialJwtService = Type[UserAccessTokenService] | Type[ApiKeyService] | Type[SignUpService]
+AuthCredentialService = Type[UserAccessTokenService] | Type[ApiKeyService] | Type[OTPService] | Type[SignUpService] | Type[StatelessAccessTokenService]
+AuthCredentialJwtService = Type[UserAccessTokenService] | Type[ApiKeyService] | Type[SignUpService] | Type[StatelessAccessTokenService]
 
 
 AUTH_CREDENTIAL_JWT_SERVICES: set[AuthCredentialJwtService] = {
     UserAccessTokenService,
     ApiKeyService,
     SignUpService,
+    StatelessAccessTokenService,
 }
 
 
 AuthCredentialTableService = Type[UserAccessTokenService] | Type[ApiKeyService] | Type[OTPService]
 AuthCredentialJwtAndTableService = Type[UserAccessTokenService] | Type[ApiKeyService]
 
-AuthCredentialJwtAndNotTableService = Type[SignUpService]
+AuthCredentialJwtAndNotTableService = Type[SignUpService] | Type[StatelessAccessTokenService]
 AuthCredentialNotJwtAndTableService = Type[OTPService]
 
 
@@ -34,6 +36,7 @@ class AuthCredentialTypeToService(TypedDict):
     api_key: Type[ApiKeyService]
     sign_up: Type[SignUpService]
     otp: Type[OTPService]
+    stateless_access_token: Type[StatelessAccessTokenService]
 
 
 AUTH_CREDENTIAL_TYPE_TO_SERVICE: AuthCredentialTypeToService = {
@@ -41,6 +44,7 @@ AUTH_CREDENTIAL_TYPE_TO_SERVICE: AuthCredentialTypeToService = {
     'api_key': ApiKeyService,
     'sign_up': SignUpService,
     'otp': OTPService,
+    'stateless_access_token': StatelessAccessTokenService,
 }
 
 Service = UserService | UserAccessTokenService | ApiKeyService | OTPService | GalleryService | GalleryPermissionService | FileService | ImageVersionService | ApiKeyScopeService
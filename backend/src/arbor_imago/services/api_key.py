@@ -1,10 +1,13 @@
-from sqlmodel import select
+from sqlmodel import select, delete
 from sqlmodel.ext.asyncio.session import AsyncSession
+import sqlalchemy
+from sqlalchemy.orm import selectinload
 import datetime as datetime_module
-from typing import cast
+import functools
 
-from arbor_imago import custom_types, core_utils
-from arbor_imago.models.tables import ApiKey as ApiKeyTable
+from arbor_imago import custom_types, core_utils, database
+from arbor_imago.auth import cache as auth_cache
+from arbor_imago.models.tables import ApiKey as ApiKeyTable, ApiKeyScope as ApiKeyScopeTable
 from arbor_imago.schemas import api_key as api_key_schema, auth_credential as auth_credential_schema
 from arbor_imago.services import auth_credential as auth_credential_service, base
 
@@ -26,6 +29,7 @@ class ApiKey(
 
     auth_type = auth_credential_schema.Type.API_KEY
     _MODEL = ApiKeyTable
+    _LOADING_PROFILES = {'scopes': (selectinload(ApiKeyTable.api_key_scopes),)}
 
     @classmethod
     def model_inst_from_create_model(cls, create_model):
@@ -36,16 +40,48 @@ class ApiKey(
             **create_model.model_dump()
         )
 
+    @classmethod
+    async def _on_update(cls, session, model_inst):
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential, cls.auth_type.value, model_inst.id))
+
+    @classmethod
+    async def _on_delete(cls, session, model_inst):
+        cls._revoke(session, [model_inst])
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential, cls.auth_type.value, model_inst.id))
+
     @classmethod
     async def get_scope_ids(cls, session, inst):
-        return [api_key_scope.scope_id for api_key_scope in inst.api_key_scopes]
+
+        # loaded by the 'scopes' profile, otherwise select just the ids rather than lazy loading the collection
+        if 'api_key_scopes' not in sqlalchemy.inspect(inst).unloaded:
+            return [api_key_scope.scope_id for api_key_scope in inst.api_key_scopes]
+        return list((await session.exec(select(ApiKeyScopeTable.scope_id).where(ApiKeyScopeTable.api_key_id == inst.id))).all())
+
+    @classmethod
+    async def _delete_by_ids(cls, session, ids):
+        # bulk deletes bypass the ORM cascade, remove the scopes explicitly
+        await session.exec(delete(ApiKeyScopeTable).where(ApiKeyScopeTable.api_key_id.in_(ids)))  # type: ignore
+        return await super()._delete_by_ids(session, ids)
+
+    @classmethod
+    def _build_select_auth_context(cls, id):
+        # one row per scope, or a single row with a null scope_id
+        return super()._build_select_auth_context(id).outerjoin(
+            ApiKeyScopeTable, ApiKeyScopeTable.api_key_id == cls._MODEL.id).add_columns(ApiKeyScopeTable.scope_id)  # type: ignore
+
+    @classmethod
+    def _scope_ids_from_auth_context_rows(cls, user, rows):
+        return {row[2] for row in rows if row[2] is not None}
 
     @classmethod
     async def is_available(cls, session: AsyncSession, api_key_available_admin: api_key_schema.ApiKeyAdminAvailable) -> bool:
-        return (await session.exec(select(cls).where(
-            api_key_schema.ApiKeyAdminAvailable.name == api_key_available_admin.name,
-            api_key_schema.ApiKeyAdminAvailable.user_id == api_key_available_admin.user_id
-        ))).one_or_none() is not None
+        # answered from ix_api_key_user_id_name
+        return not (await session.exec(select(sqlalchemy.exists().where(
+            cls._MODEL.user_id == api_key_available_admin.user_id,
+            cls._MODEL.name == api_key_available_admin.name,
+        )))).one()
 
     @classmethod
     async def _check_authorization_new(cls, params):
@@ -63,26 +99,3 @@ class ApiKey(
                 raise base.NotFoundError(
                     ApiKeyTable, params['id']
                 )
-
-    @classmethod
-    async def _check_validation_post(cls, params):
-        if not await cls.is_available(params['session'], api_key_schema.ApiKeyAdminAvailable(
-            **params['create_model'].model_dump(exclude_unset=True), user_id=cast(custom_types.User.id, params['authorized_user_id']),
-        )):
-            raise base.NotAvailableError(
-                'Cannot create API Key {} for user {}, not available'.format(
-                    str(params['create_model']), params['authorized_user_id']
-                )
-            )
-
-    @classmethod
-    async def _check_validation_patch(cls, params):
-        if 'name' in params['update_model'].model_fields_set:
-            if not await cls.is_available(params['session'], api_key_schema.ApiKeyAdminAvailable(
-                    name=cast(custom_types.ApiKey.name, params['update_model'].name), user_id=cast(custom_types.User.id, params['authorized_user_id']))):
-                raise base.NotAvailableError(
-                    'Cannot update API Key {} for user {}, not available'.format(
-                        str(params['update_model']
-                            ), params['authorized_user_id']
-                    )
-                )
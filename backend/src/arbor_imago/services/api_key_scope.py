@@ -1,7 +1,10 @@
+import functools
 from sqlmodel import Field, Relationship, select, SQLModel
+from sqlalchemy.orm import joinedload
 from typing import TYPE_CHECKING, TypedDict, Optional, ClassVar, Annotated, Type
 
-from arbor_imago import custom_types
+from arbor_imago import custom_types, database
+from arbor_imago.auth import cache as auth_cache
 from arbor_imago.models.tables import ApiKeyScope as ApiKeyScopeTable, ApiKey as ApiKeyTable
 from arbor_imago.services import api_key as api_key_service, base
 from arbor_imago.schemas import api_key_scope as api_key_scope_schema
@@ -16,6 +19,9 @@ class ApiKeyScope(base.Service[
 ]):
 
     _MODEL = ApiKeyScopeTable
+    # authorization reads the api key's owner
+    _LOADING_PROFILES = {operation: (joinedload(ApiKeyScopeTable.api_key),)
+                         for operation in ('read', 'update', 'delete')}
 
     @classmethod
     def model_id(cls, inst: ApiKeyScopeTable):
@@ -62,3 +68,13 @@ class ApiKeyScope(base.Service[
         if await cls.fetch_by_id(params['session'], id):
             raise base.AlreadyExistsError(
                 cls._MODEL, id)
+
+    @classmethod
+    async def _on_create(cls, session, model_inst):
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential, api_key_service.ApiKey.auth_type.value, model_inst.api_key_id))
+
+    @classmethod
+    async def _on_delete(cls, session, model_inst):
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential, api_key_service.ApiKey.auth_type.value, model_inst.api_key_id))
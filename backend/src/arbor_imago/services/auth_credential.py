@@ -1,11 +1,18 @@
 import datetime as datetime_module
-from typing import Optional, TypedDict, ClassVar, cast, Self, Literal, Protocol
+import functools
+from typing import Optional, TypedDict, ClassVar, cast, Self, Literal, Protocol, NamedTuple, Any
+from sqlmodel import select, delete
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import Row, Select
+from collections.abc import Sequence
 from typing import ClassVar, TypedDict, cast, TypeVar, Generic, Type
 
-from arbor_imago import custom_types, schemas
+from arbor_imago import custom_types, schemas, database, group_commit
+from arbor_imago.auth import revocation
+from arbor_imago.models.tables import User as UserTable
 from arbor_imago.schemas import auth_credential as auth_credential_schema
 from arbor_imago.services import base
+from arbor_imago.services.auth_credential_revocation import AuthCredentialRevocation as AuthCredentialRevocationService
 
 
 def lifespan_to_expiry(lifespan: datetime_module.timedelta) -> custom_types.AuthCredential.expiry:
@@ -56,9 +63,17 @@ class HasModelInstFromJwtPayload(Protocol[TAuthCredentialJwt_co, TSub]):
         ...
 
 
+class AuthContext(NamedTuple, Generic[TAuthCredentialTable]):
+    auth_credential: TAuthCredentialTable
+    # None if the credential's user no longer exists
+    user: UserTable | None
+    scope_ids: set[custom_types.Scope.id]
+
+
 class Table(
     Generic[TAuthCredentialTable],
     HasAuthType[TAuthCredentialTable],
+    base.HasModel[TAuthCredentialTable],
 ):
     @classmethod
     async def get_scope_ids(
@@ -68,6 +83,82 @@ class Table(
     ) -> list[custom_types.Scope.id]:
         return []
 
+    @classmethod
+    def _build_select_auth_context(cls, id: Any) -> Select[Any]:
+        """Select the auth credential and its owning user in one statement. Subclasses may append columns needed to resolve scopes.
+        An outer join, so a credential left without its user is told apart from a missing credential"""
+
+        return select(cls._MODEL, UserTable).outerjoin(
+            UserTable, UserTable.id == cls._MODEL.user_id).where(cls._MODEL.id == id)  # type: ignore
+
+    @classmethod
+    def _scope_ids_from_auth_context_rows(cls, user: UserTable | None, rows: Sequence[Row[Any]]) -> set[custom_types.Scope.id]:
+        return set()
+
+    @classmethod
+    def _revoke(cls, session: AsyncSession, auth_credentials: Sequence[TAuthCredentialTable]) -> None:
+        """Record credentials which are being deleted before they expire, so cached resolutions are rejected in every process"""
+
+        AuthCredentialRevocationService.add_many(session, cls.auth_type.value, [
+            (auth_credential.id, auth_credential.expiry) for auth_credential in auth_credentials])
+        for auth_credential in auth_credentials:
+            database.after_commit(session, functools.partial(
+                revocation.REVOCATIONS.add, (cls.auth_type.value, auth_credential.id), auth_credential.expiry))
+
+    @classmethod
+    async def spend(cls, session: AsyncSession, auth_credential: TAuthCredentialTable) -> bool:
+        """Delete a one time credential (refresh token, magic link, OTP), False if a concurrent request deleted it first.
+        The DELETE's rowcount tells which caller used it, session.delete() can't, a stale delete only warns"""
+
+        if cls._group_commit(session):  # type: ignore
+            await database.release_connection(session)
+            return await group_commit.COMMITTER.submit(functools.partial(cls._write_spend, auth_credential=auth_credential))
+        return await cls._write_spend(session, auth_credential)
+
+    @classmethod
+    async def _write_spend(cls, session: AsyncSession, auth_credential: TAuthCredentialTable) -> bool:
+
+        n_deleted = (await session.exec(delete(cls._MODEL).where(cls._MODEL.id == auth_credential.id))).rowcount  # type: ignore
+        if n_deleted != 1:
+            return False
+
+        await cls._on_delete(session, auth_credential)  # type: ignore
+        await database.commit(session)
+        return True
+
+    @classmethod
+    async def delete_expired(cls, session: AsyncSession, dt_now: datetime_module.datetime, batch_size: int) -> int:
+        """Delete expired rows in batches, committing after each batch to keep write transactions short. Returns the number of rows deleted"""
+
+        n_deleted = 0
+        while True:
+            ids = (await session.exec(select(cls._MODEL.id).where(cls._MODEL.expiry < dt_now).limit(batch_size))).all()  # type: ignore
+            if not ids:
+                break
+
+            n_deleted += await cls._delete_by_ids(session, ids)
+            await session.commit()
+
+            if len(ids) < batch_size:
+                break
+
+        return n_deleted
+
+    @classmethod
+    async def fetch_auth_context(cls, session: AsyncSession, id: Any) -> AuthContext[TAuthCredentialTable] | None:
+        """Load the auth credential, its user and its scope ids in a single round trip"""
+
+        rows = (await session.exec(cls._build_select_auth_context(id))).all()  # type: ignore
+        if not rows:
+            return None
+
+        auth_credential, user = rows[0][0], rows[0][1]
+        return AuthContext(
+            auth_credential=auth_credential,
+            user=user,
+            scope_ids=cls._scope_ids_from_auth_context_rows(user, rows)
+        )
+
 
 class MissingRequiredClaimsError(Exception):
     def __init__(self, claims: set[str]) -> None:
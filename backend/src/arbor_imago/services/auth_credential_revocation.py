@@ -0,0 +1,33 @@
+import datetime as datetime_module
+from collections.abc import Sequence
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import custom_types
+from arbor_imago.models.tables import AuthCredentialRevocation as AuthCredentialRevocationTable
+
+
+class AuthCredentialRevocation:
+
+    _MODEL = AuthCredentialRevocationTable
+
+    @classmethod
+    def add_many(cls, session: AsyncSession, auth_credential_type: custom_types.AuthCredential.type, auth_credentials: Sequence[tuple[str, custom_types.AuthCredential.expiry]]) -> None:
+        """Stage tombstones for (id, expiry) pairs, committed by the caller alongside the delete"""
+
+        session.add_all([cls._MODEL(auth_credential_type=auth_credential_type, auth_credential_id=id, expiry=expiry)
+                         for id, expiry in auth_credentials])
+
+    @classmethod
+    async def fetch_after(cls, session: AsyncSession, after_id: custom_types.AuthCredentialRevocation.id, dt_now: datetime_module.datetime) -> Sequence[AuthCredentialRevocationTable]:
+
+        query = select(cls._MODEL).where(cls._MODEL.id > after_id).where(  # type: ignore
+            cls._MODEL.expiry >= dt_now).order_by(cls._MODEL.id)  # type: ignore
+        return (await session.exec(query)).all()
+
+    @classmethod
+    async def delete_expired(cls, session: AsyncSession, dt_now: datetime_module.datetime) -> int:
+
+        n_deleted = (await session.exec(delete(cls._MODEL).where(cls._MODEL.expiry < dt_now))).rowcount  # type: ignore
+        await session.commit()
+        return n_deleted
@@ -1,12 +1,18 @@
-from sqlmodel import SQLModel, select
+from sqlmodel import SQLModel, select, func, and_, or_, tuple_
+import sqlalchemy
 from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.base import ExecutableOption
 from sqlmodel.sql.expression import SelectOfScalar
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import Any, Protocol, Unpack, TypeVar, TypedDict, Generic, NotRequired, Literal, Self, ClassVar, Type, Optional
+from typing import Any, Protocol, Unpack, TypeVar, TypedDict, Generic, NotRequired, Literal, Self, ClassVar, Type, Optional, NamedTuple
 from pydantic import BaseModel
-from collections.abc import Sequence
+from collections.abc import Sequence, Mapping, Iterable, Iterator
+import contextlib
+import itertools
+import functools
 
-from arbor_imago import custom_types, models
+from arbor_imago import custom_types, models, database, group_commit
+from arbor_imago.schemas import pagination as pagination_schema
 from arbor_imago.schemas.pagination import Pagination
 from arbor_imago.schemas.order_by import OrderBy
 
@@ -49,12 +55,18 @@ class ReadManyBase(Generic[models.TModel, TOrderBy_co], TypedDict):
     pagination: Pagination
     order_bys: NotRequired[list[OrderBy[TOrderBy_co]]]
     query: NotRequired[SelectOfScalar[models.TModel] | None]
+    profile: NotRequired[str | None]
 
 
 class ReadManyParams(Generic[models.TModel, TOrderBy_co], CRUDParamsBase, ReadManyBase[models.TModel, TOrderBy_co]):
     pass
 
 
+class Page(NamedTuple, Generic[models.TModel]):
+    items: Sequence[models.TModel]
+    total: int
+
+
 class UpdateParams(Generic[custom_types.TId, TUpdateModel_contra], CRUDParamsBase, WithId[custom_types.TId]):
     update_model: TUpdateModel_contra
 
@@ -63,6 +75,18 @@ class DeleteParams(Generic[custom_types.TId], CRUDParamsBase, WithId[custom_type
     pass
 
 
+class CreateManyParams(Generic[TCreateModel_contra], CRUDParamsBase):
+    create_models: Sequence[TCreateModel_contra]
+
+
+class UpdateManyParams(Generic[custom_types.TId, TUpdateModel], CRUDParamsBase):
+    update_models: Mapping[custom_types.TId, TUpdateModel]
+
+
+class DeleteManyParams(Generic[custom_types.TId], CRUDParamsBase):
+    ids: Sequence[custom_types.TId]
+
+
 CheckAuthorizationExistingOperation = Literal['read', 'update', 'delete']
 
 
@@ -70,6 +94,11 @@ class CheckAuthorizationExistingParams(Generic[models.TModel_contra, custom_type
     operation: CheckAuthorizationExistingOperation
 
 
+class CheckAuthorizationExistingManyParams(Generic[models.TModel, custom_types.TId], CRUDParamsBase):
+    model_insts: Mapping[custom_types.TId, models.TModel]
+    operation: CheckAuthorizationExistingOperation
+
+
 class CheckAuthorizationNewParams(Generic[TCreateModel_contra], CreateParams[TCreateModel_contra]):
     pass
 
@@ -160,6 +189,9 @@ class NotAvailableError(ServiceError):
     pass
 
 
+_UNIQUE_VIOLATION_SQLSTATE = '23505'
+
+
 class UnauthorizedError(ServiceError):
     pass
 
@@ -179,44 +211,216 @@ class Service(
 
 ):
 
+    # bound on the ids in a single IN (...), SQLite limits the number of bound parameters
+    _BULK_BATCH_SIZE: ClassVar[int] = 500
+
+    # named relationship loader options, e.g. {'read': (joinedload(Table.parent),)}.
+    # read, read_many, update and delete fetch with the profile named after the operation, when one is declared
+    _LOADING_PROFILES: ClassVar[Mapping[str, Sequence[ExecutableOption]]] = {}
+
+    # creates and deletes may be batched with other services' small writes, see group_commit.py
+    _GROUP_COMMIT: ClassVar[bool] = False
+
+    @classmethod
+    def _group_commit(cls, session: AsyncSession) -> bool:
+        """Group commit only writes from sessions with nothing else to commit, the write then can't depend on them"""
+        return cls._GROUP_COMMIT and group_commit.COMMITTER.running and not database.has_writes(session)
+
+    @staticmethod
+    def _is_unique_violation(e: sqlalchemy.exc.IntegrityError) -> bool:
+        # sqlite names the constraint kind, other databases report SQLSTATE 23505 (pgcode in psycopg2, sqlstate in psycopg and asyncpg)
+        if getattr(e.orig, 'sqlite_errorname', None) == 'SQLITE_CONSTRAINT_UNIQUE':
+            return True
+        return _UNIQUE_VIOLATION_SQLSTATE in (getattr(e.orig, 'sqlstate', None), getattr(e.orig, 'pgcode', None))
+
+    @classmethod
+    @contextlib.contextmanager
+    def _raise_not_available(cls) -> Iterator[None]:
+        """Availability is enforced by the model's unique indexes, not checked beforehand. A write violating one raises NotAvailableError"""
+
+        try:
+            yield
+        except sqlalchemy.exc.IntegrityError as e:
+            if not cls._is_unique_violation(e):
+                raise
+            raise NotAvailableError('{} not available, {}'.format(
+                cls._MODEL.__name__, e.orig)) from e
+
+    @classmethod
+    def apply_loading_profile(cls, query: SelectOfScalar[models.TModel], profile: str | None) -> SelectOfScalar[models.TModel]:
+        if profile is None:
+            return query
+        if profile not in cls._LOADING_PROFILES:
+            raise ValueError('{} has no loading profile `{}`'.format(
+                cls.__name__, profile))
+        return query.options(*cls._LOADING_PROFILES[profile])
+
+    @classmethod
+    def _operation_profile(cls, operation: str) -> str | None:
+        return operation if operation in cls._LOADING_PROFILES else None
+
     @classmethod
     async def fetch_one(cls, session: AsyncSession, query: SelectOfScalar[models.TModel]) -> models.TModel | None:
         return (await session.exec(query)).one_or_none()
 
     @classmethod
-    async def fetch_many(cls, session: AsyncSession, pagination: Pagination, order_bys: list[OrderBy[TOrderBy_co]] = [], query: SelectOfScalar[models.TModel] | None = None) -> Sequence[models.TModel]:
+    def build_page(cls, query: SelectOfScalar[models.TModel], pagination: Pagination, order_bys: list[OrderBy[TOrderBy_co]] = []) -> SelectOfScalar[models.TModel]:
+
+        query = cls.build_order_by(query, order_bys)
+        if pagination.cursor is not None:
+            query = cls.build_seek(query, order_bys, pagination.cursor)
+        else:
+            query = query.offset(pagination.offset)
+        return query.limit(pagination.limit)
+
+    @classmethod
+    async def fetch_many(cls, session: AsyncSession, pagination: Pagination, order_bys: list[OrderBy[TOrderBy_co]] = [], query: SelectOfScalar[models.TModel] | None = None, profile: str | None = None) -> Sequence[models.TModel]:
 
         if query is None:
             query = select(cls._MODEL)
 
-        query = cls.build_order_by(query, order_bys)
-        query = query.offset(pagination.offset).limit(pagination.limit)
+        return (await session.exec(cls.apply_loading_profile(cls.build_page(query, pagination, order_bys), profile))).all()
 
-        return (await session.exec(query)).all()
+    @classmethod
+    async def fetch_page(cls, session: AsyncSession, pagination: Pagination, order_bys: list[OrderBy[TOrderBy_co]] = [], query: SelectOfScalar[models.TModel] | None = None, profile: str | None = None) -> Page[models.TModel]:
+        """Fetch a page and the total number of matching rows in one statement"""
+
+        if query is None:
+            query = select(cls._MODEL)
+
+        # the total ignores the cursor seek, so it is a scalar subquery over the unpaged query rather than a window
+        count_query = select(func.count()).select_from(
+            query.order_by(None).subquery())
+        rows = (await session.execute(cls.apply_loading_profile(cls.build_page(query, pagination, order_bys), profile).add_columns(count_query.scalar_subquery()))).all()
+
+        if rows:
+            return Page(items=[row[0] for row in rows], total=rows[-1][1])
+
+        # past the last row there is nothing to attach the total to
+        if pagination.cursor is None and pagination.offset == 0:
+            return Page(items=[], total=0)
+        return Page(items=[], total=(await session.exec(count_query)).one())
 
     @classmethod
-    async def fetch_by_id(cls, session: AsyncSession, id: custom_types.TId) -> models.TModel | None:
-        query = cls._build_select_by_id(id)
+    async def fetch_by_id(cls, session: AsyncSession, id: custom_types.TId, profile: str | None = None) -> models.TModel | None:
+        query = cls.apply_loading_profile(cls._build_select_by_id(id), profile)
         return await cls.fetch_one(session, query)
 
     @classmethod
-    async def fetch_by_id_with_exception(cls, session: AsyncSession, id: custom_types.TId) -> models.TModel:
-        inst = await cls.fetch_by_id(session, id)
+    async def fetch_by_id_with_exception(cls, session: AsyncSession, id: custom_types.TId, profile: str | None = None) -> models.TModel:
+        inst = await cls.fetch_by_id(session, id, profile)
         if inst is None:
             raise NotFoundError(cls._MODEL, id)
         return inst
 
+    @classmethod
+    def _build_where_ids(cls, ids: Sequence[custom_types.TId]):
+
+        columns = [getattr(cls._MODEL, column.key)
+                   for column in sqlalchemy.inspect(cls._MODEL).primary_key]
+        if len(columns) == 1:
+            return columns[0].in_(ids)
+        return tuple_(*columns).in_([tuple(id) for id in ids])  # type: ignore
+
+    @classmethod
+    async def fetch_by_ids(cls, session: AsyncSession, ids: Sequence[custom_types.TId], profile: str | None = None) -> dict[custom_types.TId, models.TModel]:
+
+        insts: dict[custom_types.TId, models.TModel] = {}
+        for batch in itertools.batched(ids, cls._BULK_BATCH_SIZE):
+            for inst in (await session.exec(cls.apply_loading_profile(select(cls._MODEL).where(cls._build_where_ids(batch)), profile))).all():
+                insts[cls.model_id(inst)] = inst
+        return insts
+
+    @classmethod
+    async def fetch_by_ids_with_exception(cls, session: AsyncSession, ids: Sequence[custom_types.TId], profile: str | None = None) -> dict[custom_types.TId, models.TModel]:
+        insts = await cls.fetch_by_ids(session, ids, profile)
+        for id in ids:
+            if id not in insts:
+                raise NotFoundError(cls._MODEL, id)
+        return insts
+
+    @classmethod
+    async def _delete_by_ids(cls, session: AsyncSession, ids: Sequence[Any]) -> int:
+        """One DELETE per batch of ids. This bypasses the ORM cascade, child rows are removed by their ON DELETE CASCADE foreign keys,
+        so only use it where database.foreign_keys_enforced, or where the override removes the children itself"""
+
+        n_deleted = 0
+        for batch in itertools.batched(ids, cls._BULK_BATCH_SIZE):
+            n_deleted += (await session.exec(sqlalchemy.delete(cls._MODEL).where(cls._build_where_ids(batch)))).rowcount  # type: ignore
+        return n_deleted
+
+    @classmethod
+    def _sort_key(cls, order_by: list[OrderBy[TOrderBy_co]]) -> list[tuple[InstrumentedAttribute, bool]]:
+        """Columns to sort by and whether they are ascending, the primary key breaks ties so the order is total"""
+
+        sort_key: list[tuple[InstrumentedAttribute, bool]] = [
+            (getattr(cls._MODEL, order.field), order.ascending) for order in order_by]
+        fields = {order.field for order in order_by}
+        for column in sqlalchemy.inspect(cls._MODEL).primary_key:
+            if column.key not in fields:
+                sort_key.append((getattr(cls._MODEL, column.key), True))
+        return sort_key
+
+    @classmethod
+    def _cursor_sort_key(cls, sort_key: list[tuple[InstrumentedAttribute, bool]]) -> list[str]:
+        return [('' if ascending else '-') + column.key for column, ascending in sort_key]
+
     @classmethod
     def build_order_by(cls, query: SelectOfScalar[models.TModel], order_by: list[OrderBy[TOrderBy_co]]):
-        for order in order_by:
-            field: InstrumentedAttribute = getattr(cls, order.field)
-            if order.ascending:
+        for field, ascending in cls._sort_key(order_by):
+            if ascending:
                 query = query.order_by(field.asc())
             else:
                 query = query.order_by(field.desc())
 
         return query
 
+    @classmethod
+    def build_seek(cls, query: SelectOfScalar[models.TModel], order_by: list[OrderBy[TOrderBy_co]], cursor: str) -> SelectOfScalar[models.TModel]:
+        """Restrict the query to rows after the cursor, raises pagination_schema.InvalidCursorError"""
+
+        sort_key = cls._sort_key(order_by)
+        values = []
+        for (column, _), value in zip(sort_key, pagination_schema.decode_cursor(cursor, cls._cursor_sort_key(sort_key))):
+            try:
+                values.append(pagination_schema.type_adapter(
+                    cls._MODEL.model_fields[column.key].annotation).validate_python(value))
+            except ValueError as e:
+                raise pagination_schema.InvalidCursorError(
+                    'Malformed cursor') from e
+
+        columns = [column for column, _ in sort_key]
+        # bound with the column's type, a row value comparison doesn't apply it (e.g. Timestamp stores a float on SQLite)
+        values = [sqlalchemy.literal(value, column.type) for column, value in zip(columns, values)]
+        directions = {ascending for _, ascending in sort_key}
+
+        if directions == {True}:
+            return query.where(tuple_(*columns) > tuple_(*values))
+        if directions == {False}:
+            return query.where(tuple_(*columns) < tuple_(*values))
+
+        # mixed directions can not use a row value comparison, expand it
+        clauses = []
+        for i, (column, ascending) in enumerate(sort_key):
+            clauses.append(and_(
+                *(columns[j] == values[j] for j in range(i)),
+                column > values[i] if ascending else column < values[i]
+            ))
+        return query.where(or_(*clauses))
+
+    @classmethod
+    def next_cursor(cls, model_insts: Sequence[models.TModel], pagination: Pagination, order_by: list[OrderBy[TOrderBy_co]] = []) -> str | None:
+        """Cursor of the page after model_insts, None if this was the last page"""
+
+        if len(model_insts) < pagination.limit:
+            return None
+
+        sort_key = cls._sort_key(order_by)
+        return pagination_schema.encode_cursor(
+            cls._cursor_sort_key(sort_key),
+            [getattr(model_insts[-1], column.key) for column, _ in sort_key]
+        )
+
     @classmethod
     async def _check_authorization_existing(cls, params: CheckAuthorizationExistingParams[models.TModel, custom_types.TId]) -> None:
         """Check if the user is authorized to access the instance"""
@@ -247,11 +451,42 @@ class Service(
         """Check if the user is authorized to create a new instance"""
         pass
 
+    @staticmethod
+    def _crud_params(params: CRUDParamsBase) -> CRUDParamsBase:
+        return {'session': params['session'], 'authorized_user_id': params['authorized_user_id'], 'admin': params['admin']}
+
+    @classmethod
+    async def _check_authorization_new_many(cls, params: CreateManyParams[TCreateModel]) -> None:
+        """Check if the user is authorized to create the new instances, override to check them as a set"""
+        for create_model in params['create_models']:
+            await cls._check_authorization_new({**cls._crud_params(params), 'create_model': create_model})
+
+    @classmethod
+    async def _check_authorization_existing_many(cls, params: CheckAuthorizationExistingManyParams[models.TModel, custom_types.TId]) -> None:
+        """Check if the user is authorized to access the instances, override to check them as a set"""
+        for id, model_inst in params['model_insts'].items():
+            await cls._check_authorization_existing({**cls._crud_params(params), 'id': id, 'model_inst': model_inst, 'operation': params['operation']})
+
+    @classmethod
+    async def _check_validation_post_many(cls, params: CreateManyParams[TCreateModel]) -> None:
+        for create_model in params['create_models']:
+            await cls._check_validation_post({**cls._crud_params(params), 'create_model': create_model})
+
+    @classmethod
+    async def _check_validation_patch_many(cls, params: UpdateManyParams[custom_types.TId, TUpdateModel], model_insts: Mapping[custom_types.TId, models.TModel]) -> None:
+        for id, update_model in params['update_models'].items():
+            await cls._check_validation_patch({**cls._crud_params(params), 'id': id, 'update_model': update_model, 'model_inst': model_insts[id]})
+
+    @classmethod
+    async def _check_validation_delete_many(cls, params: DeleteManyParams[custom_types.TId]) -> None:
+        for id in params['ids']:
+            await cls._check_validation_delete({**cls._crud_params(params), 'id': id})
+
     @classmethod
     async def read(cls, params: ReadParams[custom_types.TId]) -> models.TModel:
         """Used in conjunction with API endpoints, raises exceptions while trying to get an instance of the model by ID"""
 
-        model_inst = await cls.fetch_by_id_with_exception(params['session'], params['id'])
+        model_inst = await cls.fetch_by_id_with_exception(params['session'], params['id'], cls._operation_profile('read'))
 
         await cls._check_authorization_existing(
             {**params, 'model_inst': model_inst, 'operation': 'read'})
@@ -269,9 +504,25 @@ class Service(
             kwargs['order_bys'] = params['order_bys']
         if 'query' in params:
             kwargs['query'] = params['query']
+        kwargs['profile'] = params.get('profile', cls._operation_profile('read_many'))
 
         return await cls.fetch_many(params['session'], params['pagination'], **kwargs)
 
+    @classmethod
+    async def read_page(cls, params: ReadManyParams[models.TModel, TOrderBy_co]) -> Page[models.TModel]:
+        """Like read_many, but also returns the total number of instances matching the query"""
+
+        await cls._check_authorization_read_many(params)
+
+        kwargs = {}
+        if 'order_bys' in params:
+            kwargs['order_bys'] = params['order_bys']
+        if 'query' in params:
+            kwargs['query'] = params['query']
+        kwargs['profile'] = params.get('profile', cls._operation_profile('read_many'))
+
+        return await cls.fetch_page(params['session'], params['pagination'], **kwargs)
+
     @classmethod
     async def create(cls, params: CreateParams[TCreateModel]) -> models.TModel:
         """Used in conjunction with API endpoints, raises exceptions while trying to create a new instance of the model"""
@@ -279,40 +530,91 @@ class Service(
         await cls._check_authorization_new(params)
         await cls._check_validation_post(params)
 
-        model_inst = cls.model_inst_from_create_model(params['create_model'])
+        model_inst = await cls._model_inst_from_create_model(params['create_model'])
+
+        if cls._group_commit(params['session']):
+            # the batch needs a connection of its own, don't hold this one while waiting for it
+            await database.release_connection(params['session'])
+            return await group_commit.COMMITTER.submit(functools.partial(cls._write_create, model_inst=model_inst))
+        return await cls._write_create(params['session'], model_inst)
 
-        params['session'].add(model_inst)
-        await params['session'].commit()
-        await params['session'].refresh(model_inst)
+    @classmethod
+    async def _write_create(cls, session: AsyncSession, model_inst: models.TModel) -> models.TModel:
+
+        with cls._raise_not_available():
+            session.add(model_inst)
+            await cls._on_create(session, model_inst)
+            await database.commit(session)
+        await cls._load_server_generated(session, [model_inst])
         return model_inst
 
+    @classmethod
+    async def create_many(cls, params: CreateManyParams[TCreateModel]) -> list[models.TModel]:
+        """Create the instances in one transaction, the rows are written with multi-row INSERTs"""
+
+        await cls._check_authorization_new_many(params)
+        await cls._check_validation_post_many(params)
+
+        model_insts = [await cls._model_inst_from_create_model(create_model) for create_model in params['create_models']]
+
+        with cls._raise_not_available():
+            params['session'].add_all(model_insts)
+            for model_inst in model_insts:
+                await cls._on_create(params['session'], model_inst)
+            await database.commit(params['session'])
+        await cls._load_server_generated(params['session'], model_insts)
+        return model_insts
+
     @classmethod
     def model_inst_from_create_model(cls, create_model: TCreateModel) -> models.TModel:
         return cls._MODEL(**create_model.model_dump())
 
+    @classmethod
+    async def _model_inst_from_create_model(cls, create_model: TCreateModel) -> models.TModel:
+        """Used by create, override when building the instance requires awaiting (e.g. hashing)"""
+        return cls.model_inst_from_create_model(create_model)
+
     @classmethod
     async def update(cls, params: UpdateParams[custom_types.TId, TUpdateModel]) -> models.TModel:
         """Used in conjunction with API endpoints, raises exceptions while trying to update an instance of the model by ID"""
 
         # when changing this, be sure to update the services/gallery.py file as well
 
-        model_inst = await cls.fetch_by_id_with_exception(params['session'], params['id'])
+        model_inst = await cls.fetch_by_id_with_exception(params['session'], params['id'], cls._operation_profile('update'))
 
         await cls._check_authorization_existing({
             'session': params['session'],
             'model_inst': model_inst,
-            'operation': 'read',
+            'operation': 'update',
             'id': params['id'],
             'admin': params['admin'],
             'authorized_user_id': params['authorized_user_id']
         })
         await cls._check_validation_patch({**params, 'model_inst': model_inst})
-        await cls._update_model_inst(model_inst, params['update_model'])
-
-        await params['session'].commit()
-        await params['session'].refresh(model_inst)
+        with cls._raise_not_available():
+            await cls._update_model_inst(model_inst, params['update_model'])
+            await cls._on_update(params['session'], model_inst)
+            await database.commit(params['session'])
+        await cls._load_server_generated(params['session'], [model_inst])
         return model_inst
 
+    @classmethod
+    async def update_many(cls, params: UpdateManyParams[custom_types.TId, TUpdateModel]) -> list[models.TModel]:
+        """Update the instances in one transaction, they are fetched with a single SELECT ... WHERE id IN (...)"""
+
+        model_insts = await cls.fetch_by_ids_with_exception(params['session'], list(params['update_models']), cls._operation_profile('update'))
+
+        await cls._check_authorization_existing_many({**cls._crud_params(params), 'model_insts': model_insts, 'operation': 'update'})
+        await cls._check_validation_patch_many(params, model_insts)
+
+        with cls._raise_not_available():
+            for id, update_model in params['update_models'].items():
+                await cls._update_model_inst(model_insts[id], update_model)
+                await cls._on_update(params['session'], model_insts[id])
+            await database.commit(params['session'])
+        await cls._load_server_generated(params['session'], model_insts.values())
+        return [model_insts[id] for id in params['update_models']]
+
     @classmethod
     async def _update_model_inst(cls, inst: models.TModel, update_model: TUpdateModel) -> None:
         """Update an instance of the model from the update model (TUpdateModel)"""
@@ -323,7 +625,7 @@ class Service(
     async def delete(cls, params: DeleteParams[custom_types.TId]) -> None:
         """Used in conjunction with API endpoints, raises exceptions while trying to delete an instance of the model by ID"""
 
-        model_inst = await cls.fetch_by_id_with_exception(params['session'], params['id'])
+        model_inst = await cls.fetch_by_id_with_exception(params['session'], params['id'], cls._operation_profile('delete'))
 
         await cls._check_authorization_existing({
             'session': params['session'],
@@ -334,8 +636,67 @@ class Service(
             'authorized_user_id': params['authorized_user_id']
         })
         await cls._check_validation_delete(params)
-        await params['session'].delete(model_inst)
-        await params['session'].commit()
+
+        if cls._group_commit(params['session']):
+            await database.release_connection(params['session'])
+
+            async def _write(session: AsyncSession) -> None:
+                await cls._write_delete(session, await session.merge(model_inst, load=False))
+            await group_commit.COMMITTER.submit(_write)
+        else:
+            await cls._write_delete(params['session'], model_inst)
+
+    @classmethod
+    async def _write_delete(cls, session: AsyncSession, model_inst: models.TModel) -> None:
+
+        await session.delete(model_inst)
+        await cls._on_delete(session, model_inst)
+        await database.commit(session)
+
+    @classmethod
+    async def delete_many(cls, params: DeleteManyParams[custom_types.TId]) -> None:
+        """Delete the instances in one transaction with DELETE ... WHERE id IN (...), or through the ORM cascade when
+        the database leaves foreign keys unenforced (SQLite with the foreign_keys pragma off)"""
+
+        model_insts = await cls.fetch_by_ids_with_exception(params['session'], params['ids'], cls._operation_profile('delete'))
+
+        await cls._check_authorization_existing_many({**cls._crud_params(params), 'model_insts': model_insts, 'operation': 'delete'})
+        await cls._check_validation_delete_many(params)
+
+        for model_inst in model_insts.values():
+            await cls._on_delete(params['session'], model_inst)
+        if await database.foreign_keys_enforced(params['session']):
+            await cls._delete_by_ids(params['session'], list(model_insts))
+        else:
+            for model_inst in model_insts.values():
+                await params['session'].delete(model_inst)
+        await database.commit(params['session'])
+
+    @classmethod
+    async def _load_server_generated(cls, session: AsyncSession, model_insts: Iterable[models.TModel]) -> None:
+        """Every column is currently set in Python, no model declares a server_default or onupdate, so the flush expires
+        nothing and this is a no-op. Server generated columns would be left expired by the flush, load them with one
+        SELECT instead of lazily on access (or fetch them through RETURNING with the mapper's eager_defaults)"""
+
+        for model_inst in model_insts:
+            expired_attributes = sqlalchemy.inspect(model_inst).expired_attributes
+            if expired_attributes:
+                await session.refresh(model_inst, attribute_names=expired_attributes)
+
+    @classmethod
+    async def _on_create(cls, session: AsyncSession, model_inst: models.TModel) -> None:
+        """Stage any additional changes to be committed alongside the create"""
+        pass
+
+    @classmethod
+    async def _on_update(cls, session: AsyncSession, model_inst: models.TModel) -> None:
+        """Stage any additional changes to be committed alongside the update"""
+        pass
+
+    @classmethod
+    async def _on_delete(cls, session: AsyncSession, model_inst: models.TModel) -> None:
+        """Stage any additional changes to be committed alongside the delete"""
+        pass
 
 
 '''
@@ -1,15 +1,102 @@
-from sqlmodel import select
+from sqlmodel import select, literal
 from sqlmodel.ext.asyncio.session import AsyncSession
+import sqlalchemy
+import collections
+import functools
 import re
+import typing
+from collections.abc import Sequence
 import datetime as datetime_module
 import pathlib
 import shutil
 
-from arbor_imago import config, custom_types, utils, core_utils
-from arbor_imago.models.tables import Gallery as GalleryTable
+from arbor_imago import config, custom_types, utils, core_utils, database
+from arbor_imago.models.tables import Gallery as GalleryTable, GALLERY_AVAILABLE_NO_DATE, GALLERY_AVAILABLE_NO_PARENT
 from arbor_imago.services.gallery_permission import GalleryPermission as GalleryPermissionService, base
+from arbor_imago.services.gallery_closure import GalleryClosure as GalleryClosureService
+from arbor_imago.services.gallery_access import GalleryAccess as GalleryAccessService, Access
 from arbor_imago.schemas import gallery as gallery_schema
 
+"""
+Developer's Note:
+A gallery's folder is nested under the folders of its ancestors. The ancestor chain is loaded with one recursive
+query, however deep the gallery is. PATH_CACHE keeps each gallery's folder path, relative to the galleries dir, for
+the life of the process. Renaming, moving or deleting a gallery invalidates its own entry and those of every cached
+gallery below it.
+"""
+
+
+class InvalidMoveError(base.ServiceError):
+    pass
+
+
+class _PathCacheEntry(typing.NamedTuple):
+    ancestor_ids: tuple[custom_types.Gallery.id, ...]
+    folder_names: tuple[custom_types.Gallery.folder_name, ...]
+
+
+class GalleryPathCache:
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+
+        self._entries: collections.OrderedDict[custom_types.Gallery.id,
+                                               _PathCacheEntry] = collections.OrderedDict()
+        self._ids_by_ancestor_id: dict[custom_types.Gallery.id,
+                                       set[custom_types.Gallery.id]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, id: custom_types.Gallery.id) -> tuple[custom_types.Gallery.folder_name, ...] | None:
+
+        entry = self._entries.get(id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(id)
+        return entry.folder_names
+
+    def set(self, ancestry: list[GalleryTable]) -> tuple[custom_types.Gallery.folder_name, ...]:
+        """Cache the folder path of the last gallery in the ancestry, ordered root to leaf"""
+
+        folder_names = tuple(Gallery.model_folder_name(gallery)
+                             for gallery in ancestry)
+        if self.max_size <= 0:
+            return folder_names
+
+        id = ancestry[-1].id
+        self._remove(id)
+        entry = _PathCacheEntry(
+            tuple(gallery.id for gallery in ancestry), folder_names)
+        self._entries[id] = entry
+        for ancestor_id in entry.ancestor_ids:
+            self._ids_by_ancestor_id.setdefault(ancestor_id, set()).add(id)
+
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+        return folder_names
+
+    def invalidate(self, id: custom_types.Gallery.id) -> None:
+        """Remove the gallery and every cached gallery below it"""
+
+        for descendant_id in list(self._ids_by_ancestor_id.get(id, ())):
+            self._remove(descendant_id)
+
+    def _remove(self, id: custom_types.Gallery.id) -> None:
+
+        entry = self._entries.pop(id, None)
+        if entry is None:
+            return
+        for ancestor_id in entry.ancestor_ids:
+            ids = self._ids_by_ancestor_id.get(ancestor_id)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self._ids_by_ancestor_id[ancestor_id]
+
+
+PATH_CACHE = GalleryPathCache(config.GALLERIES['path_cache_max_size'])
+
 
 class Gallery(
         base.Service[
@@ -27,6 +114,15 @@ class Gallery(
 
     _MODEL = GalleryTable
 
+    # guards the recursive query against a cycle of parent ids
+    _MAX_DEPTH = 1000
+
+    # columns which make up the folder path
+    _PATH_FIELDS = ('name', 'date', 'parent_id', 'user_id')
+
+    # columns which decide who can access the gallery
+    _ACCESS_FIELDS = ('visibility_level', 'parent_id', 'user_id')
+
     @classmethod
     def model_folder_name(cls, inst: GalleryTable) -> custom_types.Gallery.folder_name:
 
@@ -61,14 +157,15 @@ class Gallery(
         if gallery_available_admin.parent_id is not None:
             await cls.fetch_by_id_with_exception(session, gallery_available_admin.parent_id)
 
-        if (await session.exec(select(cls).where(
-            cls._MODEL.name == gallery_available_admin.name,
+        # the same expressions as ix_gallery_available, answered from the index
+        return not (await session.exec(select(sqlalchemy.exists().where(
             cls._MODEL.user_id == gallery_available_admin.user_id,
-            cls._MODEL.parent_id == gallery_available_admin.parent_id,
-            cls._MODEL.date == gallery_available_admin.date,
-        ))).one_or_none():
-            return False
-        return True
+            sqlalchemy.func.coalesce(cls._MODEL.parent_id, GALLERY_AVAILABLE_NO_PARENT) == sqlalchemy.func.coalesce(
+                sqlalchemy.literal(gallery_available_admin.parent_id, sqlalchemy.String), GALLERY_AVAILABLE_NO_PARENT),
+            cls._MODEL.name == gallery_available_admin.name,
+            sqlalchemy.func.coalesce(cls._MODEL.date, GALLERY_AVAILABLE_NO_DATE) == sqlalchemy.func.coalesce(
+                sqlalchemy.literal(gallery_available_admin.date, sqlalchemy.Date), GALLERY_AVAILABLE_NO_DATE),
+        )))).one()
 
     @classmethod
     async def _check_authorization_new(cls, params):
@@ -79,69 +176,133 @@ class Gallery(
                 )
 
     @classmethod
-    async def _check_authorization_existing(cls, params):
+    def _check_access(cls, id: custom_types.Gallery.id, access: Access, operation: base.CheckAuthorizationExistingOperation) -> None:
 
-        if not params['admin']:
-            if params['authorized_user_id'] is not None and (params['authorized_user_id'] != params['model_inst'].user_id):
+        # if the user can not see the gallery, pretend it doesn't exist
+        if access.permission_level is None:
+            raise base.NotFoundError(GalleryTable, id)
 
-                if params['operation'] == 'delete':
-                    raise base.UnauthorizedError(
-                        'Unauthorized to {operation} this gallery'.format(operation=params['operation']))
+        if operation == 'delete' and access.source != 'owner':
+            raise base.UnauthorizedError(
+                'Unauthorized to {operation} this gallery'.format(operation=operation))
 
-                gallery_permission = await GalleryPermissionService.fetch_by_id(
-                    params['session'], custom_types.GalleryPermissionId(
-                        gallery_id=params['id'],
-                        user_id=params['authorized_user_id']
-                    )
-                )
+        if operation == 'update' and access.permission_level < config.PERMISSION_LEVEL_NAME_MAPPING['editor']:
+            raise base.UnauthorizedError(
+                'Unauthorized to {operation} this gallery'.format(operation=operation))
 
-                # if the gallery is private and user has no access, pretend it doesn't exist
-                if gallery_permission is None and params['model_inst'].visibility_level == config.VISIBILITY_LEVEL_NAME_MAPPING['private']:
-                    raise base.NotFoundError(
-                        GalleryTable, params['id'])
+    @classmethod
+    async def authorize(cls, session: AsyncSession, authorized_user_id: custom_types.User.id | None, id: custom_types.Gallery.id, operation: base.CheckAuthorizationExistingOperation) -> None:
+        """Raise unless the user's effective access to the gallery allows the operation"""
+
+        cls._check_access(id, await GalleryAccessService.resolve(session, authorized_user_id, id), operation)
+
+    @classmethod
+    async def _check_authorization_existing(cls, params):
 
-                # either public or user has access
+        if not params['admin']:
+            await cls.authorize(params['session'], params['authorized_user_id'], params['id'], params['operation'])
 
-                elif params['operation'] == 'get':
-                    if gallery_permission is None or (gallery_permission.permission_level < config.PERMISSION_LEVEL_NAME_MAPPING['viewer']):
-                        raise base.UnauthorizedError(
-                            'Unauthorized to {operation} this gallery'.format(operation=params['operation']))
+    @classmethod
+    async def _check_authorization_existing_many(cls, params):
 
-                elif params['operation'] == 'patch':
-                    if gallery_permission is None or (gallery_permission.permission_level < config.PERMISSION_LEVEL_NAME_MAPPING['editor']):
-                        raise base.UnauthorizedError(
-                            'Unauthorized to {operation} this gallery'.format(operation=params['operation']))
+        if not params['admin']:
+            accesses = await GalleryAccessService.resolve_many(
+                params['session'], params['authorized_user_id'], list(params['model_insts']))
+            for id, access in accesses.items():
+                cls._check_access(id, access, params['operation'])
 
     @classmethod
     async def _check_validation_post(cls, params):
-        await cls.is_available(params['session'], gallery_schema.GalleryAdminAvailable(**params['create_model'].model_dump(include=set(gallery_schema.GalleryAdminAvailable.model_fields.keys()), exclude_unset=True)))
+        # availability is left to ix_gallery_available, see Service._raise_not_available
+        if params['create_model'].parent_id is not None:
+            await cls.fetch_by_id_with_exception(params['session'], params['create_model'].parent_id)
 
     @classmethod
     async def _check_validation_patch(cls, params):
-        # take self, overwrite it with the update_model, and see if the combined model is available
-        await cls.is_available(params['session'], gallery_schema.GalleryAdminAvailable(**{
-            **params['model_inst'].model_dump(include=set(gallery_schema.GalleryAdminAvailable.model_fields.keys())), **params['update_model'].model_dump(include=set(gallery_schema.GalleryAdminAvailable.model_fields.keys()), exclude_unset=True)
-        }))
+        if 'parent_id' in params['update_model'].model_fields_set and params['update_model'].parent_id is not None:
+            await cls.fetch_by_id_with_exception(params['session'], params['update_model'].parent_id)
+
+    @classmethod
+    async def fetch_ancestry(cls, session: AsyncSession, id: custom_types.Gallery.id) -> list[GalleryTable]:
+        """The gallery and all of its ancestors, ordered root to leaf, in a single WITH RECURSIVE query"""
+
+        ancestors = select(cls._MODEL.id, cls._MODEL.parent_id, literal(0).label('depth')).where(
+            cls._MODEL.id == id).cte('ancestors', recursive=True)
+        ancestors = ancestors.union_all(
+            select(cls._MODEL.id, cls._MODEL.parent_id, ancestors.c.depth + 1).where(
+                cls._MODEL.id == ancestors.c.parent_id, ancestors.c.depth < cls._MAX_DEPTH)
+        )
+
+        ancestry = list((await session.exec(
+            select(cls._MODEL).join(ancestors, cls._MODEL.id == ancestors.c.id).order_by(ancestors.c.depth.desc())  # type: ignore
+        )).all())
+
+        if not ancestry:
+            raise base.NotFoundError(cls._MODEL, id)
+        if ancestry[0].parent_id is not None:
+            raise base.NotFoundError(cls._MODEL, ancestry[0].parent_id)
+        return ancestry
 
     @classmethod
     async def get_dir(cls, session: AsyncSession, gallery: GalleryTable,  root: pathlib.Path) -> pathlib.Path:
 
-        if gallery.parent_id is None:
-            return root / cls.model_folder_name(gallery)
-        else:
-            a = await cls.get_dir(session, await cls.fetch_by_id_with_exception(session, gallery.parent_id), root)
-            return a / cls.model_folder_name(gallery)
+        folder_names = PATH_CACHE.get(gallery.id)
+        if folder_names is None:
+            folder_names = PATH_CACHE.set(await cls.fetch_ancestry(session, gallery.id))
+        return root.joinpath(*folder_names)
 
     @classmethod
     async def get_parents(cls, session: AsyncSession, gallery: GalleryTable) -> list[GalleryTable]:
+        """The ancestry below the root gallery, ending with the gallery itself"""
 
-        if gallery.parent_id is None:
-            return []
+        return (await cls.fetch_ancestry(session, gallery.id))[1:]
 
-        else:
-            parents = (await cls.get_parents(session, await cls.fetch_by_id_with_exception(session, gallery.parent_id)))
-            parents.append(gallery)
-            return parents
+    @classmethod
+    async def check_move(cls, session: AsyncSession, id: custom_types.Gallery.id, parent_id: custom_types.Gallery.parent_id | None) -> None:
+        """Raise if moving the gallery under parent_id would put it inside its own subtree"""
+
+        if parent_id is not None and await GalleryClosureService.is_ancestor(session, id, parent_id):
+            raise InvalidMoveError(
+                'Cannot move gallery {} into its own subtree'.format(id))
+
+    @classmethod
+    async def _on_create(cls, session, model_inst):
+        # the closure rows reference the gallery
+        await session.flush()
+        await GalleryClosureService.add(session, model_inst.id, model_inst.parent_id)
+        GalleryAccessService.invalidate(session)
+
+    @classmethod
+    async def _on_update(cls, session, model_inst):
+        state = sqlalchemy.inspect(model_inst)
+
+        if state.attrs['parent_id'].history.has_changes():
+            # checked here rather than in _check_validation_patch so a bulk update is checked against
+            # the moves already made in this transaction
+            await cls.check_move(session, model_inst.id, model_inst.parent_id)
+            await GalleryClosureService.move(session, model_inst.id, model_inst.parent_id)
+
+        if any(state.attrs[field].history.has_changes() for field in cls._PATH_FIELDS):
+            database.after_commit(session, functools.partial(
+                PATH_CACHE.invalidate, model_inst.id))
+
+        if any(state.attrs[field].history.has_changes() for field in cls._ACCESS_FIELDS):
+            GalleryAccessService.invalidate(session)
+
+    @classmethod
+    async def _on_delete(cls, session, model_inst):
+        await GalleryClosureService.remove(session, model_inst.id)
+        GalleryAccessService.invalidate(session)
+        database.after_commit(session, functools.partial(
+            PATH_CACHE.invalidate, model_inst.id))
+
+    @classmethod
+    async def fetch_descendants(cls, session: AsyncSession, id: custom_types.Gallery.id, max_depth: int | None = None) -> Sequence[GalleryTable]:
+        return await GalleryClosureService.fetch_descendants(session, id, max_depth)
+
+    @classmethod
+    async def count_descendants(cls, session: AsyncSession, ids: Sequence[custom_types.Gallery.id]) -> dict[custom_types.Gallery.id, int]:
+        return await GalleryClosureService.count_descendants(session, ids)
 
     @classmethod
     async def get_root_gallery(cls, session: AsyncSession, user_id: custom_types.Gallery.user_id) -> GalleryTable | None:
@@ -0,0 +1,131 @@
+import typing
+from collections.abc import Sequence
+from sqlmodel import select, func, literal, or_, exists, false
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import config, custom_types, database
+from arbor_imago.models.tables import Gallery as GalleryTable, GalleryClosure as GalleryClosureTable, GalleryPermission as GalleryPermissionTable
+
+"""
+Developer's Note:
+A user's effective access to a gallery is the highest of:
+- owning the gallery, which grants every operation
+- a GalleryPermission on the gallery itself
+- a GalleryPermission on any of its ancestors, found through gallery_closure
+- viewer access, when the gallery is public
+It is resolved for any number of galleries in one query, and memoized for the rest of the request so repeated checks
+against the same gallery are free. Writes which change access (permissions, visibility, moves) clear the memo.
+For listings, the same rules are available as SQL predicates to compose into a query's WHERE clause, so a page is
+authorized by the database in the query that fetches it, no matter how many galleries the user can see.
+"""
+
+MEMO_NAME = 'gallery_access'
+
+
+class Access(typing.NamedTuple):
+    permission_level: custom_types.PermissionLevel.id | None
+    source: custom_types.GalleryAccess.source | None
+
+
+NO_ACCESS = Access(None, None)
+
+OWNER_PERMISSION_LEVEL: custom_types.PermissionLevel.id = max(
+    config.PERMISSION_LEVEL_NAME_MAPPING.values())
+
+
+class GalleryAccess:
+
+    @classmethod
+    def shared_with(cls, user_id: custom_types.User.id | None, permission_level: custom_types.PermissionLevel.id = config.PERMISSION_LEVEL_NAME_MAPPING['viewer']):
+        """Predicate on GalleryTable, galleries the user holds at least permission_level on, through a permission on the gallery or an ancestor"""
+
+        if user_id is None:
+            return false()
+
+        # the closure's depth 0 rows make the gallery its own ancestor, covering explicit and inherited permissions at once
+        return exists(select(GalleryPermissionTable.gallery_id).join(
+            GalleryClosureTable, GalleryClosureTable.ancestor_id == GalleryPermissionTable.gallery_id
+        ).where(
+            GalleryClosureTable.descendant_id == GalleryTable.id,
+            GalleryPermissionTable.user_id == user_id,
+            GalleryPermissionTable.permission_level >= permission_level
+        ).correlate(GalleryTable))
+
+    @classmethod
+    def visible_to(cls, user_id: custom_types.User.id | None):
+        """Predicate on GalleryTable, galleries the user has any access to"""
+
+        public = GalleryTable.visibility_level == config.VISIBILITY_LEVEL_NAME_MAPPING['public']
+        if user_id is None:
+            return public
+        return or_(GalleryTable.user_id == user_id, public, cls.shared_with(user_id))
+
+    @classmethod
+    def _resolve_row(cls, user_id: custom_types.User.id | None, owner_id: custom_types.User.id, visibility_level: custom_types.VisibilityLevel.id,
+                     explicit_level: custom_types.PermissionLevel.id | None, inherited_level: custom_types.PermissionLevel.id | None) -> Access:
+
+        if user_id is not None and owner_id == user_id:
+            return Access(OWNER_PERMISSION_LEVEL, 'owner')
+
+        candidates: list[Access] = []
+        if explicit_level is not None:
+            candidates.append(Access(explicit_level, 'permission'))
+        if inherited_level is not None:
+            candidates.append(Access(inherited_level, 'inherited'))
+        if visibility_level == config.VISIBILITY_LEVEL_NAME_MAPPING['public']:
+            candidates.append(
+                Access(config.PERMISSION_LEVEL_NAME_MAPPING['viewer'], 'public'))
+
+        # ties go to the earlier, more specific source
+        return max(candidates, key=lambda access: access.permission_level, default=NO_ACCESS)
+
+    @classmethod
+    async def fetch_many(cls, session: AsyncSession, user_id: custom_types.User.id | None, gallery_ids: Sequence[custom_types.Gallery.id]) -> dict[custom_types.Gallery.id, Access]:
+        """Resolve access to the galleries in one query, galleries which do not exist are left out"""
+
+        if user_id is None:
+            explicit_level = inherited_level = literal(None)
+        else:
+            explicit_level = select(GalleryPermissionTable.permission_level).where(
+                GalleryPermissionTable.gallery_id == GalleryTable.id,
+                GalleryPermissionTable.user_id == user_id
+            ).correlate(GalleryTable).scalar_subquery()
+
+            inherited_level = select(func.max(GalleryPermissionTable.permission_level)).join(
+                GalleryClosureTable, GalleryClosureTable.ancestor_id == GalleryPermissionTable.gallery_id
+            ).where(
+                GalleryClosureTable.descendant_id == GalleryTable.id,
+                GalleryClosureTable.depth > 0,
+                GalleryPermissionTable.user_id == user_id
+            ).correlate(GalleryTable).scalar_subquery()
+
+        rows = (await session.exec(select(
+            GalleryTable.id, GalleryTable.user_id, GalleryTable.visibility_level, explicit_level, inherited_level
+        ).where(GalleryTable.id.in_(gallery_ids)))).all()  # type: ignore
+
+        return {row[0]: cls._resolve_row(user_id, *row[1:]) for row in rows}
+
+    @classmethod
+    async def resolve_many(cls, session: AsyncSession, user_id: custom_types.User.id | None, gallery_ids: Sequence[custom_types.Gallery.id]) -> dict[custom_types.Gallery.id, Access]:
+        """Like fetch_many, but answered from the request's memo where possible. Every id is in the result, NO_ACCESS if it does not exist"""
+
+        memo = database.request_memo(session, MEMO_NAME)
+        if memo is None:
+            memo = {}
+
+        missing_ids = [gallery_id for gallery_id in dict.fromkeys(gallery_ids)
+                       if (user_id, gallery_id) not in memo]
+        if missing_ids:
+            fetched = await cls.fetch_many(session, user_id, missing_ids)
+            for gallery_id in missing_ids:
+                memo[(user_id, gallery_id)] = fetched.get(gallery_id, NO_ACCESS)
+
+        return {gallery_id: memo[(user_id, gallery_id)] for gallery_id in gallery_ids}
+
+    @classmethod
+    async def resolve(cls, session: AsyncSession, user_id: custom_types.User.id | None, gallery_id: custom_types.Gallery.id) -> Access:
+        return (await cls.resolve_many(session, user_id, [gallery_id]))[gallery_id]
+
+    @classmethod
+    def invalidate(cls, session: AsyncSession) -> None:
+        database.clear_request_memo(session, MEMO_NAME)
@@ -0,0 +1,127 @@
+from collections.abc import Sequence
+import sqlalchemy
+from sqlmodel import select, delete, insert, func, literal, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import aliased
+
+from arbor_imago import custom_types
+from arbor_imago.models.tables import Gallery as GalleryTable, GalleryClosure as GalleryClosureTable
+
+"""
+Developer's Note:
+gallery.parent_id is the source of truth, gallery_closure is an index over it with one row per (ancestor, descendant)
+pair, so subtree queries are a single lookup on (ancestor_id) or (descendant_id) instead of a recursive walk.
+The Gallery service keeps it in step within the same transaction as the create, move or delete. If it ever drifts,
+or after upgrading a database which predates it, run the `rebuild-gallery-closure` cli command.
+"""
+
+
+class GalleryClosure:
+
+    _MODEL = GalleryClosureTable
+
+    # guards the rebuild against a cycle of parent ids
+    _MAX_DEPTH = 1000
+
+    @classmethod
+    async def add(cls, session: AsyncSession, gallery_id: custom_types.Gallery.id, parent_id: custom_types.Gallery.parent_id | None) -> None:
+        """Add the rows of a new leaf gallery: itself at depth 0, and one per ancestor of its parent"""
+
+        rows = select(literal(gallery_id), literal(gallery_id), literal(0))
+        if parent_id is not None:
+            rows = rows.union_all(
+                select(cls._MODEL.ancestor_id, literal(gallery_id), cls._MODEL.depth + 1).where(
+                    cls._MODEL.descendant_id == parent_id)
+            )
+
+        await session.exec(insert(cls._MODEL).from_select(  # type: ignore
+            ['ancestor_id', 'descendant_id', 'depth'], rows))
+
+    @classmethod
+    async def move(cls, session: AsyncSession, gallery_id: custom_types.Gallery.id, parent_id: custom_types.Gallery.parent_id | None) -> None:
+        """Detach the subtree rooted at the gallery from its old ancestors and attach it below the new parent"""
+
+        subtree_ids = select(cls._MODEL.descendant_id).where(
+            cls._MODEL.ancestor_id == gallery_id)
+        old_ancestor_ids = select(cls._MODEL.ancestor_id).where(
+            cls._MODEL.descendant_id == gallery_id, cls._MODEL.ancestor_id != gallery_id)
+
+        await session.exec(delete(cls._MODEL).where(  # type: ignore
+            cls._MODEL.descendant_id.in_(subtree_ids),  # type: ignore
+            cls._MODEL.ancestor_id.in_(old_ancestor_ids),  # type: ignore
+        ))
+
+        if parent_id is None:
+            return
+
+        # every ancestor of the new parent with every gallery of the subtree, the cross join is intended
+        ancestor = aliased(cls._MODEL)
+        descendant = aliased(cls._MODEL)
+        await session.exec(insert(cls._MODEL).from_select(  # type: ignore
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(ancestor.ancestor_id, descendant.descendant_id, ancestor.depth + descendant.depth + 1)
+            .select_from(ancestor).join(descendant, sqlalchemy.true())
+            .where(ancestor.descendant_id == parent_id, descendant.ancestor_id == gallery_id)
+        ))
+
+    @classmethod
+    async def remove(cls, session: AsyncSession, gallery_id: custom_types.Gallery.id) -> None:
+        """Remove the rows of the subtree rooted at the gallery"""
+
+        await session.exec(delete(cls._MODEL).where(  # type: ignore
+            cls._MODEL.descendant_id.in_(  # type: ignore
+                select(cls._MODEL.descendant_id).where(cls._MODEL.ancestor_id == gallery_id))
+        ))
+
+    @classmethod
+    async def is_ancestor(cls, session: AsyncSession, ancestor_id: custom_types.Gallery.id, descendant_id: custom_types.Gallery.id) -> bool:
+        """True if ancestor_id is descendant_id, or above it in the tree"""
+
+        return (await session.exec(select(cls._MODEL.depth).where(
+            cls._MODEL.ancestor_id == ancestor_id, cls._MODEL.descendant_id == descendant_id))).first() is not None
+
+    @classmethod
+    async def fetch_descendants(cls, session: AsyncSession, gallery_id: custom_types.Gallery.id, max_depth: int | None = None) -> Sequence[GalleryTable]:
+        """Galleries below the gallery, nearest first"""
+
+        query = select(GalleryTable).join(cls._MODEL, and_(
+            cls._MODEL.descendant_id == GalleryTable.id,
+            cls._MODEL.ancestor_id == gallery_id,
+            cls._MODEL.depth > 0
+        )).order_by(cls._MODEL.depth, GalleryTable.id)  # type: ignore
+        if max_depth is not None:
+            query = query.where(cls._MODEL.depth <= max_depth)
+        return (await session.exec(query)).all()
+
+    @classmethod
+    async def count_descendants(cls, session: AsyncSession, gallery_ids: Sequence[custom_types.Gallery.id]) -> dict[custom_types.Gallery.id, int]:
+        """Number of galleries below each gallery"""
+
+        counts = {gallery_id: 0 for gallery_id in gallery_ids}
+        rows = (await session.exec(
+            select(cls._MODEL.ancestor_id, func.count()).where(
+                cls._MODEL.ancestor_id.in_(gallery_ids), cls._MODEL.depth > 0)  # type: ignore
+            .group_by(cls._MODEL.ancestor_id)  # type: ignore
+        )).all()
+        for gallery_id, count in rows:
+            counts[gallery_id] = count
+        return counts
+
+    @classmethod
+    async def rebuild(cls, session: AsyncSession) -> int:
+        """Recompute every row from gallery.parent_id, returns the number of rows written"""
+
+        tree = select(GalleryTable.id.label('ancestor_id'), GalleryTable.id.label('descendant_id'),  # type: ignore
+                      literal(0).label('depth')).cte('tree', recursive=True)
+        tree = tree.union_all(
+            select(tree.c.ancestor_id, GalleryTable.id, tree.c.depth + 1).where(
+                GalleryTable.parent_id == tree.c.descendant_id, tree.c.depth < cls._MAX_DEPTH)
+        )
+
+        await session.exec(delete(cls._MODEL))  # type: ignore
+        await session.exec(insert(cls._MODEL).from_select(  # type: ignore
+            ['ancestor_id', 'descendant_id', 'depth'], select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)))
+        # rowcount is not reported for INSERT ... SELECT by every driver
+        n_rows = (await session.exec(select(func.count()).select_from(cls._MODEL))).one()
+        await session.commit()
+        return n_rows
@@ -1,7 +1,9 @@
 from sqlmodel import select
+from sqlalchemy.orm import joinedload
 
 from arbor_imago import custom_types
 from arbor_imago.services import base
+from arbor_imago.services.gallery_access import GalleryAccess as GalleryAccessService
 from arbor_imago.models.tables import GalleryPermission as GalleryPermissionTable
 from arbor_imago.schemas import gallery_permission as gallery_permission_schema
 
@@ -16,6 +18,9 @@ class GalleryPermission(
         ]):
 
     _MODEL = GalleryPermissionTable
+    # authorization reads the gallery's owner
+    _LOADING_PROFILES = {operation: (joinedload(GalleryPermissionTable.gallery),)
+                         for operation in ('read', 'update', 'delete')}
 
     @classmethod
     def model_id(cls, inst):
@@ -66,3 +71,15 @@ class GalleryPermission(
             raise base.AlreadyExistsError(
                 cls._MODEL, id
             )
+
+    @classmethod
+    async def _on_create(cls, session, model_inst):
+        GalleryAccessService.invalidate(session)
+
+    @classmethod
+    async def _on_update(cls, session, model_inst):
+        GalleryAccessService.invalidate(session)
+
+    @classmethod
+    async def _on_delete(cls, session, model_inst):
+        GalleryAccessService.invalidate(session)
@@ -2,14 +2,83 @@ from sqlmodel import select
 from pydantic import BaseModel
 import string
 import secrets
+import hashlib
+import hmac
+import typing
 import datetime as datetime_module
 
 from arbor_imago import config, core_utils, custom_types
+from arbor_imago.auth import hashing
 from arbor_imago.models.tables import OTP as OTPTable
 from arbor_imago.schemas import otp as otp_schema, auth_credential as auth_credential_schema
 from arbor_imago.services import auth_credential as auth_credential_service, base
 
 
+class CodeHasher(typing.Protocol):
+
+    @classmethod
+    def is_hash(cls, hashed_code: custom_types.OTP.hashed_code) -> bool: ...
+
+    @classmethod
+    async def hash(cls, code: custom_types.OTP.code) -> custom_types.OTP.hashed_code: ...
+
+    @classmethod
+    async def verify(cls, code: custom_types.OTP.code, hashed_code: custom_types.OTP.hashed_code) -> bool: ...
+
+
+def hmac_key(backend_secrets: typing.Mapping[str, str]) -> str:
+    """OTP_HMAC_SECRET_KEY, or when it's unset a key derived from JWT_SECRET_KEY"""
+
+    return backend_secrets.get('OTP_HMAC_SECRET_KEY') or hmac.new(
+        backend_secrets['JWT_SECRET_KEY'].encode('utf-8'), b'otp', hashlib.sha256).hexdigest()
+
+
+class HmacSha256CodeHasher:
+    """Salted HMAC-SHA256 keyed with a server secret. OTPs are short lived and the secret never leaves the server, so bcrypt's work factor buys nothing here"""
+
+    PREFIX = 'hmac-sha256$'
+    _KEY = hmac_key(config.BACKEND_SECRETS)
+
+    @classmethod
+    def _digest(cls, salt: str, code: custom_types.OTP.code) -> str:
+        return hmac.new(cls._KEY.encode('utf-8'), '{}${}'.format(salt, code).encode('utf-8'), hashlib.sha256).hexdigest()
+
+    @classmethod
+    def is_hash(cls, hashed_code):
+        return hashed_code.startswith(cls.PREFIX)
+
+    @classmethod
+    async def hash(cls, code):
+        salt = secrets.token_hex(8)
+        return '{}{}${}'.format(cls.PREFIX, salt, cls._digest(salt, code))
+
+    @classmethod
+    async def verify(cls, code, hashed_code):
+        salt, _, digest = hashed_code.removeprefix(cls.PREFIX).partition('$')
+        return hmac.compare_digest(digest, cls._digest(salt, code))
+
+
+class BcryptCodeHasher:
+
+    @classmethod
+    def is_hash(cls, hashed_code):
+        return hashed_code.startswith('$2')
+
+    @classmethod
+    async def hash(cls, code):
+        return await hashing.PASSWORD_HASHER.hash(code)
+
+    @classmethod
+    async def verify(cls, code, hashed_code):
+        return await hashing.PASSWORD_HASHER.verify(code, hashed_code)
+
+
+CODE_HASHERS: dict[config.OTPHasherName, type[CodeHasher]] = {
+    'hmac-sha256': HmacSha256CodeHasher,
+    'bcrypt': BcryptCodeHasher,
+}
+
+
 class OTP(
         base.Service[
             OTPTable,
@@ -27,6 +96,7 @@ class OTP(
 
     auth_type = auth_credential_schema.Type.OTP
     _MODEL = OTPTable
+    _GROUP_COMMIT = 'otp' in config.GROUP_COMMIT['services']
 
     @classmethod
     def model_inst_from_create_model(cls, create_model):
@@ -43,12 +113,17 @@ class OTP(
         return ''.join(secrets.choice(characters) for _ in range(config.OTP_LENGTH))
 
     @classmethod
-    def hash_code(cls, code: custom_types.OTP.code) -> custom_types.OTP.hashed_code:
-        return core_utils.hash_password(code)
+    async def hash_code(cls, code: custom_types.OTP.code) -> custom_types.OTP.hashed_code:
+        return await CODE_HASHERS[config.AUTH['otp_hasher']].hash(code)
 
     @classmethod
-    def verify_code(cls, code: custom_types.OTP.code, hashed_code: custom_types.OTP.hashed_code) -> bool:
-        return core_utils.verify_password(code, hashed_code)
+    async def verify_code(cls, code: custom_types.OTP.code, hashed_code: custom_types.OTP.hashed_code) -> bool:
+
+        # rows hashed before a change of otp_hasher are still verified by the hasher which produced them
+        for code_hasher in CODE_HASHERS.values():
+            if code_hasher.is_hash(hashed_code):
+                return await code_hasher.verify(code, hashed_code)
+        return False
 
     @classmethod
     def _build_select_by_id(cls, id):
@@ -0,0 +1,68 @@
+import datetime as datetime_module
+
+from arbor_imago import config, custom_types
+from arbor_imago.models.models import StatelessAccessToken as StatelessAccessTokenModel
+from arbor_imago.models.tables import User as UserTable
+from arbor_imago.schemas import stateless_access_token as stateless_access_token_schema, auth_credential as auth_credential_schema
+from arbor_imago.services import auth_credential as auth_credential_service
+
+
+class StatelessAccessToken(
+    auth_credential_service.JwtIO[
+        StatelessAccessTokenModel, custom_types.User.id],
+    auth_credential_service.JwtNotTable[
+        StatelessAccessTokenModel, custom_types.User.id, stateless_access_token_schema.StatelessAccessTokenAdminCreate],
+):
+    """Short lived access token verified from its signed claims alone, paired with a UserAccessToken row used as the refresh credential"""
+
+    auth_type = auth_credential_schema.Type.STATELESS_ACCESS_TOKEN
+    _MODEL = StatelessAccessTokenModel
+    _CLAIMS = auth_credential_service.JwtIO._CLAIMS | {
+        'role', 'scopes', 'epoch'}
+
+    @classmethod
+    def _model_sub(cls, inst):
+        return inst.user_id
+
+    @classmethod
+    def model_inst_from_create_model(cls, create_model):
+
+        return cls._MODEL(
+            issued=datetime_module.datetime.now().astimezone(datetime_module.UTC),
+            **create_model.model_dump()
+        )
+
+    @classmethod
+    def model_inst_from_user(cls, user: UserTable) -> StatelessAccessTokenModel:
+
+        return cls.model_inst_from_create_model(stateless_access_token_schema.StatelessAccessTokenAdminCreate(
+            user_id=user.id,
+            user_role_id=user.user_role_id,
+            scope_ids=config.USER_ROLE_ID_SCOPE_IDS[user.user_role_id],
+            token_epoch=user.token_epoch,
+            expiry=auth_credential_service.lifespan_to_expiry(
+                config.AUTH['stateless_access_token']['lifespan'])
+        ))
+
+    @classmethod
+    def to_jwt_payload(cls, inst) -> stateless_access_token_schema.JwtPayload:
+
+        return {
+            **super().to_jwt_payload(inst),
+            'role': inst.user_role_id,
+            'scopes': inst.scope_ids,
+            'epoch': inst.token_epoch,
+        }
+
+    @classmethod
+    def model_inst_from_jwt_payload(cls, payload):
+        return cls._MODEL(
+            issued=datetime_module.datetime.fromtimestamp(
+                payload['iat']).astimezone(datetime_module.UTC),
+            expiry=datetime_module.datetime.fromtimestamp(
+                payload['exp']).astimezone(datetime_module.UTC),
+            user_id=payload['sub'],
+            user_role_id=payload['role'],
+            scope_ids=payload['scopes'],
+            token_epoch=payload['epoch'],
+        )
@@ -1,9 +1,12 @@
 from sqlmodel import select, or_
 from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
+import sqlalchemy
+import functools
 import pathlib
 
-from arbor_imago import core_utils, custom_types, config
+from arbor_imago import core_utils, custom_types, config, database
+from arbor_imago.auth import cache as auth_cache, hashing
 from arbor_imago.models.tables import User as UserTable
 from arbor_imago.schemas import user as user_schema
 from arbor_imago.services import base
@@ -67,7 +70,7 @@ class User(
             return None
         if user.hashed_password is None:
             return None
-        if not core_utils.verify_password(password, user.hashed_password):
+        if not await cls.verify_password(password, user.hashed_password):
             return None
         return user
 
@@ -77,17 +80,21 @@ class User(
         d = create_model.model_dump(exclude_unset=True, exclude={'password'})
 
         if 'password' in create_model.model_fields_set:
-            if create_model.password is None:
-                d['hashed_password'] = None
-            else:
-                d['hashed_password'] = cls.hash_password(
-                    create_model.password)
+            d['hashed_password'] = None
 
         return cls._MODEL(
             id=custom_types.User.id(core_utils.generate_uuid()),
             ** d,
         )
 
+    @classmethod
+    async def _model_inst_from_create_model(cls, create_model):
+
+        model_inst = cls.model_inst_from_create_model(create_model)
+        if 'password' in create_model.model_fields_set and create_model.password is not None:
+            model_inst.hashed_password = await cls.hash_password(create_model.password)
+        return model_inst
+
     @classmethod
     async def _update_model_inst(cls, inst, update_model):
 
@@ -98,20 +105,39 @@ class User(
             if update_model.password is None:
                 inst.hashed_password = None
             else:
-                inst.hashed_password = cls.hash_password(
+                inst.hashed_password = await cls.hash_password(
                     update_model.password)
 
     @classmethod
-    async def is_username_available(cls, session: AsyncSession, username: custom_types.User.username) -> bool:
+    async def _on_update(cls, session, model_inst):
+        # stateless access tokens carry the role's scopes in their claims, revoke the ones issued under the old role
+        if sqlalchemy.inspect(model_inst).attrs.user_role_id.history.has_changes():
+            model_inst.token_epoch += 1
+        database.after_commit(session, functools.partial(
+            auth_cache.invalidate_user, model_inst.id))
 
-        query = select(cls._MODEL).where(cls._MODEL.username == username)
-        return (await session.exec(query)).one_or_none() is not None
+    @classmethod
+    async def _on_delete(cls, session, model_inst):
+        database.after_commit(session, functools.partial(
+            auth_cache.invalidate_user, model_inst.id))
 
     @classmethod
-    async def is_email_available(cls, session: AsyncSession, email: custom_types.User.email) -> bool:
+    async def increment_token_epoch(cls, session: AsyncSession, user: UserTable) -> None:
+        """Revoke every stateless access token issued to the user"""
 
-        query = select(cls._MODEL).where(cls._MODEL.email == email)
-        return (await session.exec(query)).one_or_none() is not None
+        user.token_epoch += 1
+        session.add(user)
+        await database.commit(session)
+        database.after_commit(session, functools.partial(
+            auth_cache.invalidate_user, user.id))
+
+    @classmethod
+    async def is_username_available(cls, session: AsyncSession, username: custom_types.User.username) -> bool:
+        return not (await session.exec(select(sqlalchemy.exists().where(cls._MODEL.username == username)))).one()
+
+    @classmethod
+    async def is_email_available(cls, session: AsyncSession, email: custom_types.User.email) -> bool:
+        return not (await session.exec(select(sqlalchemy.exists().where(cls._MODEL.email == email)))).one()
 
     @classmethod
     async def _check_authorization_existing(cls, params):
@@ -119,32 +145,13 @@ class User(
         if not params['admin']:
             if params['model_inst'].id != params['authorized_user_id']:
                 if cls.is_inst_public(params['model_inst']):
-                    if params['operation'] == 'delete' or params['operation'] == 'patch':
+                    if params['operation'] == 'delete' or params['operation'] == 'update':
                         raise base.UnauthorizedError(
                             'Unauthorized to {method} this user'.format(method=params['operation']))
                 else:
                     raise base.NotFoundError(
                         UserTable, params['model_inst'].id)
 
-    @classmethod
-    async def _check_validation_post(cls, params):
-
-        if 'username' in params['create_model'].model_fields_set:
-            if params['create_model'].username is not None:
-                await cls.is_username_available(params['session'], params['create_model'].username)
-        if 'email' in params['create_model'].model_fields_set:
-            if params['create_model'].email is not None:
-                await cls.is_email_available(params['session'], params['create_model'].email)
-
-    @classmethod
-    async def _check_validation_patch(cls, params):
-        if 'username' in params['update_model'].model_fields_set:
-            if params['update_model'].username is not None:
-                await cls.is_username_available(params['session'], params['update_model'].username)
-        if 'email' in params['update_model'].model_fields_set:
-            if params['update_model'].email is not None:
-                await cls.is_email_available(params['session'], params['update_model'].email)
-
     @classmethod
     async def _check_authorization_new(cls, params: base.CheckAuthorizationNewParams[user_schema.UserAdminCreate]) -> None:
 
@@ -152,8 +159,12 @@ class User(
             raise base.UnauthorizedError('Unauthorized to create a new user.')
 
     @classmethod
-    def hash_password(cls, password: custom_types.User.password) -> custom_types.User.hashed_password:
-        return core_utils.hash_password(password)
+    async def hash_password(cls, password: custom_types.User.password) -> custom_types.User.hashed_password:
+        return await hashing.PASSWORD_HASHER.hash(password)
+
+    @classmethod
+    async def verify_password(cls, password: custom_types.User.password, hashed_password: custom_types.User.hashed_password) -> bool:
+        return await hashing.PASSWORD_HASHER.verify(password, hashed_password)
 
 
 '''
@@ -1,9 +1,12 @@
 from typing import Any
-from sqlmodel import select
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
 import datetime as datetime_module
+import functools
 
-from arbor_imago import config, core_utils, custom_types
+from arbor_imago import config, core_utils, custom_types, database
+from arbor_imago.auth import cache as auth_cache
 from arbor_imago.models.tables import UserAccessToken as UserAccessTokenTable
 from arbor_imago.schemas import user_access_token as user_access_token_schema, auth_credential as auth_credential_schema
 from arbor_imago.services import auth_credential as auth_credential_service, base, user as user_service
@@ -36,6 +39,7 @@ class UserAccessToken(
 
     auth_type = auth_credential_schema.Type.ACCESS_TOKEN
     _MODEL = UserAccessTokenTable
+    _GROUP_COMMIT = 'user_access_token' in config.GROUP_COMMIT['services']
 
     @classmethod
     def model_inst_from_create_model(cls, create_model):
@@ -62,6 +66,28 @@ class UserAccessToken(
                 raise base.NotFoundError(
                     UserAccessTokenTable, params['model_inst'].id)
 
+    @classmethod
+    async def _on_update(cls, session, model_inst):
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential, cls.auth_type.value, model_inst.id))
+
+    @classmethod
+    async def _on_delete(cls, session, model_inst):
+        cls._revoke(session, [model_inst])
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_auth_credential, cls.auth_type.value, model_inst.id))
+
+    @classmethod
+    async def delete_by_user_id(cls, session: AsyncSession, user_id: custom_types.User.id) -> None:
+
+        user_access_tokens = (await session.exec(select(cls._MODEL).where(cls._MODEL.user_id == user_id))).all()
+        cls._revoke(session, user_access_tokens)
+
+        await session.exec(delete(cls._MODEL).where(cls._MODEL.user_id == user_id))  # type: ignore
+        await database.commit(session)
+        database.after_commit(session, functools.partial(
+            auth_cache.CREDENTIAL_CACHE.invalidate_user, user_id))
+
     @classmethod
     async def get_scope_ids(cls, session, inst):
         return list(config.USER_ROLE_ID_SCOPE_IDS[(await user_service.User.fetch_by_id_with_exception(
@@ -69,3 +95,9 @@ class UserAccessToken(
             inst.user_id
         )).user_role_id
         ])
+
+    @classmethod
+    def _scope_ids_from_auth_context_rows(cls, user, rows):
+        if user is None:
+            return set()
+        return set(config.USER_ROLE_ID_SCOPE_IDS[user.user_role_id])
@@ -0,0 +1,141 @@
+import collections
+import contextlib
+import contextvars
+import logging
+import re
+import time
+import typing
+from collections.abc import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from arbor_imago import config
+
+"""
+Developer's Note:
+With SQL_INSTRUMENTATION.enabled, every statement a request runs is counted and timed. The totals are sent back in a
+`Server-Timing: db;dur=<ms>;desc="<n> statements"` header, which browser dev tools show next to the request's timing.
+
+A request is logged, with the statements it ran, when it runs more than max_statements, spends longer than
+max_duration in the database, or runs the same statement more than max_repeats times. Statements are compared by
+their SQL with the bound values left out, so the same SELECT issued once per row of a list (an N+1) shows up as one
+statement repeated, however the values differ. The IN (...) of a bulk fetch is the same statement for any number of ids.
+
+Statements run outside of `record()`, in background tasks and the cli, are not counted.
+"""
+
+logger = logging.getLogger(__name__)
+
+_PARAMETER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement: str) -> str:
+    return _WHITESPACE.sub(' ', _PARAMETER_LIST.sub('?', statement)).strip()
+
+
+class RequestStatements:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.n_statements = 0
+        self.duration = 0.0
+        self.fingerprints: collections.Counter[str] = collections.Counter()
+
+    def add(self, statement: str, duration: float) -> None:
+        self.n_statements += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, max_repeats: int) -> list[tuple[str, int]]:
+        """The statements run more than max_repeats times, most repeated first"""
+        return [(statement, n) for statement, n in self.fingerprints.most_common() if n > max_repeats]
+
+    def server_timing(self) -> str:
+        return 'db;dur={:.1f};desc="{} statement{}"'.format(
+            self.duration * 1000, self.n_statements, '' if self.n_statements == 1 else 's')
+
+
+_REQUEST_STATEMENTS: contextvars.ContextVar[RequestStatements | None] = contextvars.ContextVar(
+    'request_statements', default=None)
+
+
+class SqlInstrumentationStats(typing.TypedDict):
+    requests: int
+    statements: int
+    duration: float
+    logged_requests: int
+    repeated_statement_requests: int
+
+
+_STATS: SqlInstrumentationStats = {
+    'requests': 0,
+    'statements': 0,
+    'duration': 0.0,
+    'logged_requests': 0,
+    'repeated_statement_requests': 0,
+}
+
+
+def stats() -> SqlInstrumentationStats:
+    return _STATS.copy()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None and _REQUEST_STATEMENTS.get() is not None:
+        context._sql_instrumentation_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    request_statements = _REQUEST_STATEMENTS.get()
+    start = getattr(context, '_sql_instrumentation_start', None)
+    if request_statements is not None and start is not None:
+        request_statements.add(statement, time.perf_counter() - start)
+
+
+def instrument(engine: Engine) -> None:
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@contextlib.contextmanager
+def record(name: str) -> Iterator[RequestStatements]:
+    """Count the statements run within, on engines passed to instrument(). Logs them on exit if a threshold was exceeded"""
+
+    request_statements = RequestStatements(name)
+    token = _REQUEST_STATEMENTS.set(request_statements)
+    try:
+        yield request_statements
+    finally:
+        _REQUEST_STATEMENTS.reset(token)
+        _finish(request_statements)
+
+
+def _finish(request_statements: RequestStatements) -> None:
+
+    _STATS['requests'] += 1
+    _STATS['statements'] += request_statements.n_statements
+    _STATS['duration'] += request_statements.duration
+
+    repeated = request_statements.repeated(config.SQL_INSTRUMENTATION['max_repeats'])
+    if repeated:
+        _STATS['repeated_statement_requests'] += 1
+
+    if not (repeated or request_statements.n_statements > config.SQL_INSTRUMENTATION['max_statements']
+            or request_statements.duration > config.SQL_INSTRUMENTATION['max_duration'].total_seconds()):
+        return
+
+    _STATS['logged_requests'] += 1
+    logger.warning('{}: {} statements in {:.1f}ms{}'.format(
+        request_statements.name, request_statements.n_statements, request_statements.duration * 1000,
+        ''.join('\n  {}x {}'.format(n, statement) for statement, n in request_statements.fingerprints.most_common())))
+    for statement, n in repeated:
+        logger.warning('{}: statement run {} times, likely an N+1: {}'.format(
+            request_statements.name, n, statement))
+
+
+if config.SQL_INSTRUMENTATION['enabled']:
+    instrument(config.DB_ASYNC_ENGINE.sync_engine)
+    if config.DB_READ_ASYNC_ENGINE is not None:
+        instrument(config.DB_READ_ASYNC_ENGINE.sync_engine)
@@ -7,8 +7,8 @@ def jwt_encode(payload: dict[str, typing.Any]) -> custom_types.JwtEncodedStr:
     return jwt.encode(payload, config.BACKEND_SECRETS['JWT_SECRET_KEY'], algorithm=config.BACKEND_SECRETS['JWT_ALGORITHM'])
 
 
-def jwt_decode(token: custom_types.JwtEncodedStr) -> dict:
-    return jwt.decode(token, config.BACKEND_SECRETS['JWT_SECRET_KEY'], algorithms=[config.BACKEND_SECRETS['JWT_ALGORITHM']])
+def jwt_decode(token: custom_types.JwtEncodedStr, verify_exp: bool = True) -> dict:
+    return jwt.decode(token, config.BACKEND_SECRETS['JWT_SECRET_KEY'], algorithms=[config.BACKEND_SECRETS['JWT_ALGORITHM']], options={'verify_exp': verify_exp})
 
 
 def send_email(recipient: custom_types.Email, subject: str, body: str):
@@ -0,0 +1,69 @@
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import config
+from arbor_imago.models.tables import User as UserTable
+
+USER_ID = 'owner'
+
+
+class StatementCounter:
+    """The statements run on the engine since it was created, or since the last reset()"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.statements: list[str] = []
+        event.listen(engine.sync_engine, 'before_cursor_execute', self._count)
+
+    def _count(self, connection, cursor, statement, *args) -> None:
+        self.statements.append(statement)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def engine() -> AsyncIterator[AsyncEngine]:
+    """An in-memory database with every table created"""
+
+    engine = create_async_engine('sqlite+aiosqlite://')
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def session(engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+    """A session on the engine, with one user, USER_ID, committed"""
+
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        session.add(UserTable(id=USER_ID, email=USER_ID + '@example.com', user_role_id=1))
+        await session.commit()
+        yield session
+
+
+@pytest.fixture
+def sessionmaker(engine: AsyncEngine, session: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> async_sessionmaker[AsyncSession]:
+    """Points config.ASYNC_SESSIONMAKER, which database.session() and request_session open, at the engine"""
+
+    sessionmaker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(config, 'ASYNC_SESSIONMAKER', sessionmaker)
+    return sessionmaker
+
+
+@pytest.fixture
+def statements(engine: AsyncEngine) -> StatementCounter:
+    return StatementCounter(engine)
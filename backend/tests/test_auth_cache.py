@@ -0,0 +1,66 @@
+import datetime as datetime_module
+
+from arbor_imago.auth.cache import CredentialCache
+
+
+def _expiry(seconds: float) -> datetime_module.datetime:
+    return datetime_module.datetime.now().astimezone(datetime_module.UTC) + datetime_module.timedelta(seconds=seconds)
+
+
+def test_get_set():
+    cache: CredentialCache[str] = CredentialCache(
+        max_size=10, max_lifespan=datetime_module.timedelta(minutes=1))
+
+    assert cache.get('token') is None
+    cache.set('token', 'value', ('access_token', '1'), 'user', _expiry(60))
+    assert cache.get('token') == 'value'
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_expired_entries_are_dropped():
+    cache: CredentialCache[str] = CredentialCache(
+        max_size=10, max_lifespan=datetime_module.timedelta(minutes=1))
+
+    cache.set('token', 'value', ('access_token', '1'), 'user', _expiry(-1))
+    assert cache.get('token') is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache: CredentialCache[str] = CredentialCache(
+        max_size=2, max_lifespan=datetime_module.timedelta(minutes=1))
+
+    cache.set('a', 'a', ('access_token', 'a'), 'user', _expiry(60))
+    cache.set('b', 'b', ('access_token', 'b'), 'user', _expiry(60))
+    cache.get('a')
+    cache.set('c', 'c', ('access_token', 'c'), 'user', _expiry(60))
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a'
+    assert cache.get('c') == 'c'
+
+
+def test_invalidation():
+    cache: CredentialCache[str] = CredentialCache(
+        max_size=10, max_lifespan=datetime_module.timedelta(minutes=1))
+
+    cache.set('a', 'a', ('access_token', 'a'), 'user1', _expiry(60))
+    cache.set('b', 'b', ('api_key', 'b'), 'user1', _expiry(60))
+    cache.set('c', 'c', ('access_token', 'c'), 'user2', _expiry(60))
+
+    cache.invalidate_auth_credential('access_token', 'a')
+    assert cache.get('a') is None
+    assert cache.get('b') == 'b'
+
+    cache.invalidate_user('user1')
+    assert cache.get('b') is None
+    assert cache.get('c') == 'c'
+
+
+def test_disabled():
+    cache: CredentialCache[str] = CredentialCache(
+        max_size=0, max_lifespan=datetime_module.timedelta(minutes=1))
+
+    cache.set('a', 'a', ('access_token', 'a'), 'user', _expiry(60))
+    assert cache.get('a') is None
@@ -0,0 +1,58 @@
+import datetime as datetime_module
+import typing
+
+import pytest
+
+from arbor_imago import utils
+from arbor_imago.auth import cache as auth_cache, exceptions, revocation, utils as auth_utils
+from arbor_imago.models.tables import ApiKey as ApiKeyTable, ApiKeyScope as ApiKeyScopeTable, UserAccessToken as UserAccessTokenTable
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+
+NOW = datetime_module.datetime.now(datetime_module.UTC)
+EXPIRY = NOW + datetime_module.timedelta(days=1)
+
+
+@pytest.fixture(autouse=True)
+def _clear_auth_state():
+    auth_cache.CREDENTIAL_CACHE.clear()
+    revocation.REVOCATIONS.reset()
+
+
+@pytest.mark.anyio
+async def test_api_key_in_one_query(session, statements):
+
+    session.add(ApiKeyTable(id='scoped', name='scoped', user_id='owner', issued=NOW, expiry=EXPIRY))
+    session.add(ApiKeyTable(id='unscoped', name='unscoped', user_id='owner', issued=NOW, expiry=EXPIRY))
+    session.add(ApiKeyScopeTable(api_key_id='scoped', scope_id=1))
+    session.add(ApiKeyScopeTable(api_key_id='scoped', scope_id=2))
+    await session.commit()
+    session.expunge_all()
+
+    statements.reset()
+    auth_context = await ApiKeyService.fetch_auth_context(session, 'scoped')
+    assert len(statements) == 1
+    assert auth_context.auth_credential.id == 'scoped'
+    assert auth_context.user.id == 'owner'
+    assert auth_context.scope_ids == {1, 2}
+
+    assert (await ApiKeyService.fetch_auth_context(session, 'unscoped')).scope_ids == set()
+    assert await ApiKeyService.fetch_auth_context(session, 'missing') is None
+
+
+@pytest.mark.anyio
+async def test_missing_user(session, sessionmaker):
+
+    # left behind without foreign keys enforced
+    api_key = ApiKeyTable(id='key', name='key', user_id='deleted', issued=NOW, expiry=EXPIRY)
+    user_access_token = UserAccessTokenTable(id='token', user_id='deleted', issued=NOW, expiry=EXPIRY)
+    session.add_all([api_key, user_access_token])
+    await session.commit()
+
+    for service, auth_credential in ((ApiKeyService, api_key), (UserAccessTokenService, user_access_token)):
+        auth_context = await service.fetch_auth_context(session, auth_credential.id)
+        assert auth_context.user is None
+
+        get_auth = await auth_utils.get_auth_from_auth_credential_jwt(
+            token=utils.jwt_encode(typing.cast(dict, service.to_jwt_payload(auth_credential))))
+        assert get_auth.exception.detail == exceptions.user_not_found().detail
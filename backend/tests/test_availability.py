@@ -0,0 +1,86 @@
+import datetime as datetime_module
+
+import pytest
+import sqlalchemy
+
+from arbor_imago.models.tables import Gallery as GalleryTable, User as UserTable
+from arbor_imago.services import base
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.services.gallery import Gallery as GalleryService
+from arbor_imago.services.user import User as UserService
+from arbor_imago.schemas import api_key as api_key_schema, gallery as gallery_schema, user as user_schema
+
+
+@pytest.mark.anyio
+async def test_availability(session):
+
+    (await session.get(UserTable, 'owner')).username = 'owner'
+    session.add(UserTable(id='other', email='other@example.com', user_role_id=1))
+    session.add(GalleryTable(id='root', name='root', test='', user_id='owner', visibility_level=1))
+    session.add(GalleryTable(id='a', name='a', test='', user_id='owner', visibility_level=1, parent_id='root'))
+    session.add(GalleryTable(id='b', name='b', test='', user_id='owner', visibility_level=1, parent_id='root',
+                             date=datetime_module.date(2020, 1, 1)))
+    await session.commit()
+
+    def _gallery(name: str, date: datetime_module.date | None = None, parent_id: str | None = 'root'):
+        return gallery_schema.GalleryAdminAvailable(name=name, parent_id=parent_id, date=date, user_id='owner')
+
+    assert not await GalleryService.is_available(session, _gallery('a'))
+    assert await GalleryService.is_available(session, _gallery('a', datetime_module.date(2020, 1, 1)))
+    assert not await GalleryService.is_available(session, _gallery('b', datetime_module.date(2020, 1, 1)))
+    assert await GalleryService.is_available(session, _gallery('b'))
+    assert not await GalleryService.is_available(session, _gallery('root', parent_id=None))
+
+    assert not await UserService.is_username_available(session, 'owner')
+    assert await UserService.is_email_available(session, 'new@example.com')
+
+    # the unique index rejects the write, there's no check beforehand
+    with pytest.raises(base.NotAvailableError):
+        await GalleryService.update({
+            'session': session, 'admin': True, 'authorized_user_id': 'owner', 'id': 'b',
+            'update_model': gallery_schema.GalleryAdminUpdate(name='a', date=None),
+        })
+    await session.rollback()
+
+    with pytest.raises(base.NotAvailableError):
+        await UserService.update({
+            'session': session, 'admin': True, 'authorized_user_id': 'other', 'id': 'other',
+            'update_model': user_schema.UserAdminUpdate(email='owner@example.com'),
+        })
+    await session.rollback()
+
+    expiry = datetime_module.datetime.now(datetime_module.UTC) + datetime_module.timedelta(days=1)
+    for expect_available in (True, False):
+        assert await ApiKeyService.is_available(
+            session, api_key_schema.ApiKeyAdminAvailable(name='key', user_id='owner')) == expect_available
+        create = ApiKeyService.create({
+            'session': session, 'admin': False, 'authorized_user_id': 'owner',
+            'create_model': api_key_schema.ApiKeyAdminCreate(name='key', expiry=expiry, user_id='owner'),
+        })
+        if expect_available:
+            await create
+        else:
+            with pytest.raises(base.NotAvailableError):
+                await create
+
+
+class _DriverError(Exception):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+@pytest.mark.parametrize('attributes, not_available', [
+    ({'sqlite_errorname': 'SQLITE_CONSTRAINT_UNIQUE'}, True),
+    ({'sqlite_errorname': 'SQLITE_CONSTRAINT_FOREIGNKEY'}, False),
+    # psycopg and asyncpg, then psycopg2
+    ({'sqlstate': '23505'}, True),
+    ({'pgcode': '23505'}, True),
+    ({'sqlstate': '23503'}, False),
+    ({}, False),
+], ids=['sqlite unique', 'sqlite foreign key', 'sqlstate', 'pgcode', 'foreign key violation', 'unknown'])
+def test_unique_violations(attributes, not_available):
+
+    e = sqlalchemy.exc.IntegrityError('INSERT', {}, _DriverError(**attributes))
+    with pytest.raises(base.NotAvailableError if not_available else sqlalchemy.exc.IntegrityError):
+        with GalleryService._raise_not_available():
+            raise e
@@ -0,0 +1,157 @@
+import datetime as datetime_module
+import typing
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlmodel import select
+
+from arbor_imago import config, database, utils
+from arbor_imago.auth import cache as auth_cache, revocation
+from arbor_imago.models.tables import ApiKey as ApiKeyTable, ApiKeyScope as ApiKeyScopeTable, User as UserTable
+from arbor_imago.services import base
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.services.user import User as UserService
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+from arbor_imago.routers.api_key import ApiKeyAdminRouter
+from arbor_imago.schemas import api_key as api_key_schema, user_access_token as user_access_token_schema
+
+EXPIRY = datetime_module.datetime.now(datetime_module.UTC) + datetime_module.timedelta(days=1)
+
+
+@pytest.fixture(autouse=True)
+def _clear_auth_state():
+    auth_cache.CREDENTIAL_CACHE.clear()
+    revocation.REVOCATIONS.reset()
+
+
+async def _create_api_keys(session, *names: str) -> list[ApiKeyTable]:
+
+    api_keys = await ApiKeyService.create_many({
+        'session': session, 'admin': False, 'authorized_user_id': 'owner',
+        'create_models': [api_key_schema.ApiKeyAdminCreate(name=name, expiry=EXPIRY, user_id='owner') for name in names],
+    })
+    for api_key in api_keys:
+        session.add(ApiKeyScopeTable(api_key_id=api_key.id, scope_id=1))
+    await session.commit()
+    return api_keys
+
+
+def _cache(api_key: ApiKeyTable) -> None:
+    auth_cache.CREDENTIAL_CACHE.set(api_key.id, api_key.id, (ApiKeyService.auth_type.value, api_key.id), 'owner', EXPIRY)
+
+
+async def _n_rows(session, table) -> int:
+    return len((await session.exec(select(table))).all())
+
+
+@pytest.mark.anyio
+async def test_create_update_many(session, statements):
+
+    statements.reset()
+    a, b = await _create_api_keys(session, 'a', 'b')
+    assert sum(statement.startswith('INSERT INTO api_key ') for statement in statements.statements) == 1
+
+    # _on_update invalidates each cached resolution
+    _cache(a)
+    _cache(b)
+    updated = await ApiKeyService.update_many({
+        'session': session, 'admin': False, 'authorized_user_id': 'owner',
+        'update_models': {a.id: api_key_schema.ApiKeyAdminUpdate(name='c'), b.id: api_key_schema.ApiKeyAdminUpdate(name='d')},
+    })
+    assert [api_key.name for api_key in updated] == ['c', 'd']
+    assert auth_cache.CREDENTIAL_CACHE.get(a.id) is None
+    assert auth_cache.CREDENTIAL_CACHE.get(b.id) is None
+
+
+@pytest.mark.anyio
+async def test_delete_many_without_foreign_keys(session, statements):
+
+    a, b, c = await _create_api_keys(session, 'a', 'b', 'c')
+    _cache(a)
+    assert not await database.foreign_keys_enforced(session)
+
+    # the ORM cascade removes the scopes
+    await ApiKeyService.delete_many({
+        'session': session, 'admin': False, 'authorized_user_id': 'owner', 'ids': [a.id, b.id],
+    })
+    assert [api_key.id for api_key in (await session.exec(select(ApiKeyTable))).all()] == [c.id]
+    assert await _n_rows(session, ApiKeyScopeTable) == 1
+
+    # _on_delete revokes each key
+    assert auth_cache.CREDENTIAL_CACHE.get(a.id) is None
+    assert revocation.REVOCATIONS.check((ApiKeyService.auth_type.value, a.id)) is revocation.RevocationStatus.REVOKED
+
+
+@pytest.mark.anyio
+async def test_delete_many_with_foreign_keys(session, statements):
+
+    await session.exec(text('PRAGMA foreign_keys = on'))
+    await _create_api_keys(session, 'a')
+    session.add(UserTable(id='other', email='other@example.com', user_role_id=1))
+    await session.commit()
+    assert await database.foreign_keys_enforced(session)
+
+    # one DELETE for the users, the api key and its scope go by ON DELETE CASCADE
+    statements.reset()
+    await UserService.delete_many({
+        'session': session, 'admin': True, 'authorized_user_id': 'owner', 'ids': ['owner', 'other'],
+    })
+    assert sum(statement.startswith('DELETE FROM user ') for statement in statements.statements) == 1
+    assert await _n_rows(session, UserTable) == 0
+    assert await _n_rows(session, ApiKeyTable) == 0
+    assert await _n_rows(session, ApiKeyScopeTable) == 0
+
+
+@pytest.fixture
+async def client(session, sessionmaker):
+
+    session.add(UserTable(id='admin', email='admin@example.com', user_role_id=config.USER_ROLE_NAME_MAPPING['admin']))
+    await session.commit()
+    user_access_token = await UserAccessTokenService.create({
+        'session': session, 'admin': False, 'authorized_user_id': 'admin',
+        'create_model': user_access_token_schema.UserAccessTokenAdminCreate(user_id='admin', expiry=EXPIRY),
+    })
+
+    app = FastAPI(dependencies=[database.REQUEST_SESSION_DEPENDENCY])
+    app.include_router(ApiKeyAdminRouter().router)
+    # as registered by the app
+    app.add_exception_handler(base.NotAvailableError, lambda request, exc: JSONResponse(
+        status_code=409, content={'detail': exc.error_message}))
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url='http://test',
+        headers={'Authorization': 'Bearer ' + utils.jwt_encode(typing.cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token)))})
+
+
+@pytest.mark.anyio
+async def test_bulk_endpoints(session, client):
+
+    a, b = await _create_api_keys(session, 'a', 'b')
+
+    assert (await client.patch('/admin/api-keys/bulk/', json=[
+        {'id': a.id, 'update': {'name': 'c'}}, {'id': a.id, 'update': {'name': 'd'}}])).status_code == 400
+    assert (await client.post('/admin/api-keys/bulk/delete/', json=[a.id, a.id])).status_code == 400
+
+    # nothing is written when one of the ids is missing
+    assert (await client.patch('/admin/api-keys/bulk/', json=[
+        {'id': a.id, 'update': {'name': 'c'}}, {'id': 'missing', 'update': {'name': 'd'}}])).status_code == 404
+    assert (await client.post('/admin/api-keys/bulk/delete/', json=[a.id, 'missing'])).status_code == 404
+    session.expunge_all()
+    assert sorted(api_key.name for api_key in (await session.exec(select(ApiKeyTable))).all()) == ['a', 'b']
+
+    # the second key isn't available, the request rolls back the first
+    response = await client.post('/admin/api-keys/bulk/', json=[
+        {'name': 'e', 'expiry': EXPIRY.isoformat(), 'user_id': 'owner'},
+        {'name': 'a', 'expiry': EXPIRY.isoformat(), 'user_id': 'owner'}])
+    assert response.status_code == 409
+    assert await _n_rows(session, ApiKeyTable) == 2
+
+    response = await client.patch('/admin/api-keys/bulk/', json=[{'id': a.id, 'update': {'name': 'c'}}])
+    assert response.status_code == 200
+    assert response.json()[0]['name'] == 'c'
+
+    assert (await client.post('/admin/api-keys/bulk/delete/', json=[a.id, b.id])).status_code == 204
+    assert await _n_rows(session, ApiKeyTable) == 0
+    assert await _n_rows(session, ApiKeyScopeTable) == 0
@@ -0,0 +1,117 @@
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import select
+
+from arbor_imago import config, database
+from arbor_imago.models.tables import User as UserTable
+
+
+@pytest.fixture
+def calls() -> list[str]:
+    """The user ids passed to after_commit callbacks which have run"""
+    return []
+
+
+@pytest.fixture
+def client(sessionmaker, calls):
+
+    app = FastAPI(dependencies=[database.REQUEST_SESSION_DEPENDENCY])
+
+    @app.post('/users/{user_id}/')
+    async def create(user_id: str, fail: bool = False):
+
+        async with database.session() as session:
+            session.add(UserTable(id=user_id, email=user_id + '@example.com', user_role_id=1))
+            # only flushes, the request commits
+            await database.commit(session)
+            database.after_commit(session, lambda: calls.append(user_id))
+
+            # a second session() within the request is the same session
+            async with database.session() as other_session:
+                assert other_session is session
+
+        if fail:
+            raise HTTPException(400)
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test')
+
+
+async def _user_ids(session) -> list[str]:
+    return list((await session.exec(select(UserTable.id).order_by(UserTable.id))).all())
+
+
+@pytest.mark.anyio
+async def test_request_commits_once(session, client, calls):
+
+    assert (await client.post('/users/a/')).status_code == 200
+    assert await _user_ids(session) == ['a', 'owner']
+    assert calls == ['a']
+
+
+@pytest.mark.anyio
+async def test_raising_request_rolls_back(session, client, calls):
+
+    assert (await client.post('/users/a/', params={'fail': True})).status_code == 400
+    assert await _user_ids(session) == ['owner']
+    # the callbacks wait for a commit which never came
+    assert calls == []
+
+
+@pytest.mark.anyio
+async def test_session_outside_of_a_request(sessionmaker):
+
+    async with database.session() as session:
+        async with database.session() as other_session:
+            assert other_session is not session
+
+        # commit() commits and after_commit() runs the callback immediately
+        session.add(UserTable(id='a', email='a@example.com', user_role_id=1))
+        await database.commit(session)
+        calls: list[str] = []
+        database.after_commit(session, lambda: calls.append('a'))
+        assert calls == ['a']
+
+    async with sessionmaker() as session:
+        assert await _user_ids(session) == ['a', 'owner']
+
+
+@pytest.fixture
+async def file_engine(tmp_path, monkeypatch):
+    """A database file, its engine built and its connections set up the way the app's are"""
+
+    monkeypatch.setattr(config, '_DB_IS_SQLITE_MEMORY', False)
+    engine = create_async_engine('sqlite+aiosqlite:///{}'.format(tmp_path / 'test.db'), **config._db_engine_kwargs(2, 1))
+    event.listen(engine.sync_engine, 'connect', database._set_sqlite_pragmas)
+    monkeypatch.setattr(config, 'DB_IS_SQLITE', True)
+    monkeypatch.setattr(config, 'DB_ASYNC_ENGINE', engine)
+    monkeypatch.setattr(database, '_ENGINES', [('pool', engine, 1)])
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_sqlite_pragmas(file_engine):
+
+    settings = await database.engine_settings()
+    assert settings['journal_mode'] == 'wal'
+    assert settings['foreign_keys'] == 1
+    assert settings['busy_timeout'] == config.DB_ENGINE['sqlite']['busy_timeout'].total_seconds() * 1000
+    assert settings['pool_pool_size'] == 2
+    assert settings['pool_max_overflow'] == 1
+
+    # every connection gets them, not only the first
+    async with file_engine.connect() as a, file_engine.connect() as b:
+        for connection in (a, b):
+            assert (await connection.exec_driver_sql('PRAGMA foreign_keys')).scalar() == 1
+
+
+def test_memory_engine_kwargs(monkeypatch):
+
+    monkeypatch.setattr(config, '_DB_IS_SQLITE_MEMORY', True)
+    kwargs = config._db_engine_kwargs(2, 1)
+    assert 'pool_size' not in kwargs and 'max_overflow' not in kwargs and 'pool_timeout' not in kwargs
+    # a static pool would reject the sizing
+    create_async_engine('sqlite+aiosqlite://', **kwargs)
@@ -0,0 +1,62 @@
+import asyncio
+import pathlib
+import tempfile
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+
+from arbor_imago import db_routing
+from arbor_imago.models.tables import User as UserTable
+
+
+def test_single_writer_routing():
+
+    async def _main():
+        with tempfile.TemporaryDirectory() as directory:
+            url = 'sqlite+aiosqlite:///' + \
+                str(pathlib.Path(directory) / 'routing.db')
+            writer = create_async_engine(url, pool_size=1, max_overflow=0)
+            reader = create_async_engine(url, pool_size=4)
+            async with writer.begin() as connection:
+                await connection.run_sync(SQLModel.metadata.create_all)
+
+            statements: list[str] = []
+            for name, engine in (('writer', writer), ('reader', reader)):
+                event.listen(engine.sync_engine, 'before_cursor_execute',
+                             lambda *args, name=name: statements.append(name))
+
+            sessionmaker = db_routing.make_async_sessionmaker(writer, reader)
+            async with sessionmaker() as session:
+                await session.exec(select(UserTable))
+                session.add(UserTable(id='a', email='a@example.com', user_role_id=1))
+                await session.flush()
+                # the session stays on the writer, so it sees its own uncommitted row
+                assert (await session.exec(select(UserTable))).one().id == 'a'
+                await session.commit()
+                assert statements == ['reader', 'writer', 'writer']
+
+                # a new transaction starts on the readers again
+                await session.exec(select(UserTable))
+                assert statements[-1] == 'reader'
+                await session.rollback()
+
+                db_routing.use_writer(session)
+                await session.exec(select(UserTable))
+                assert statements[-1] == 'writer'
+
+            # concurrent writers queue for the single writer connection rather than failing on the database lock
+            async def _create(i: int):
+                async with sessionmaker() as session:
+                    await session.exec(select(UserTable))
+                    session.add(UserTable(id=str(i), email=str(i) + '@example.com', user_role_id=1))
+                    await session.commit()
+
+            await asyncio.gather(*(_create(i) for i in range(20)))
+            async with sessionmaker() as session:
+                assert len((await session.exec(select(UserTable))).all()) == 21
+
+            await writer.dispose()
+            await reader.dispose()
+
+    asyncio.run(_main())
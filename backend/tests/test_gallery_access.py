@@ -0,0 +1,68 @@
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import config
+from arbor_imago.models.tables import Gallery as GalleryTable, GalleryPermission as GalleryPermissionTable, User as UserTable
+from arbor_imago.services import base
+from arbor_imago.services.gallery import Gallery as GalleryService
+from arbor_imago.services.gallery_access import GalleryAccess as GalleryAccessService, Access, NO_ACCESS
+
+PUBLIC = config.VISIBILITY_LEVEL_NAME_MAPPING['public']
+PRIVATE = config.VISIBILITY_LEVEL_NAME_MAPPING['private']
+VIEWER = config.PERMISSION_LEVEL_NAME_MAPPING['viewer']
+EDITOR = config.PERMISSION_LEVEL_NAME_MAPPING['editor']
+
+
+async def _create(session: AsyncSession, id: str, parent_id: str | None, visibility_level: int) -> None:
+    gallery = GalleryTable(id=id, name=id, test='', user_id='owner',
+                           visibility_level=visibility_level, parent_id=parent_id)
+    session.add(gallery)
+    await GalleryService._on_create(session, gallery)
+
+
+@pytest.mark.anyio
+async def test_effective_access(session, statements):
+
+    session.add(UserTable(id='guest', email='guest@example.com', user_role_id=1))
+
+    # shared (viewer for guest) -> album -> photos (editor for guest), private -> hidden, public
+    await _create(session, 'shared', None, PRIVATE)
+    await _create(session, 'album', 'shared', PRIVATE)
+    await _create(session, 'photos', 'album', PRIVATE)
+    await _create(session, 'hidden', None, PRIVATE)
+    await _create(session, 'public', None, PUBLIC)
+    session.add(GalleryPermissionTable(gallery_id='shared', user_id='guest', permission_level=VIEWER))
+    session.add(GalleryPermissionTable(gallery_id='photos', user_id='guest', permission_level=EDITOR))
+    await session.commit()
+
+    statements.reset()
+    ids = ['shared', 'album', 'photos', 'hidden', 'public', 'missing']
+    assert await GalleryAccessService.resolve_many(session, 'guest', ids) == {
+        'shared': Access(VIEWER, 'permission'),
+        'album': Access(VIEWER, 'inherited'),
+        'photos': Access(EDITOR, 'permission'),
+        'hidden': NO_ACCESS,
+        'public': Access(VIEWER, 'public'),
+        'missing': NO_ACCESS,
+    }
+    assert len(statements) == 1
+
+    assert (await GalleryAccessService.resolve(session, 'owner', 'hidden')).source == 'owner'
+    assert await GalleryAccessService.resolve(session, None, 'public') == Access(VIEWER, 'public')
+    assert await GalleryAccessService.resolve(session, None, 'shared') == NO_ACCESS
+
+    galleries = select(GalleryTable.id).order_by(GalleryTable.id)
+    assert (await session.exec(galleries.where(GalleryAccessService.shared_with('guest')))).all() == ['album', 'photos', 'shared']
+    assert (await session.exec(galleries.where(GalleryAccessService.shared_with('guest', EDITOR)))).all() == ['photos']
+    assert (await session.exec(galleries.where(GalleryAccessService.visible_to('guest')))).all() == ['album', 'photos', 'public', 'shared']
+    assert (await session.exec(galleries.where(GalleryAccessService.visible_to(None)))).all() == ['public']
+    assert len((await session.exec(galleries.where(GalleryAccessService.visible_to('owner')))).all()) == 5
+
+    await GalleryService.authorize(session, 'guest', 'photos', 'update')
+    with pytest.raises(base.UnauthorizedError):
+        await GalleryService.authorize(session, 'guest', 'album', 'update')
+    with pytest.raises(base.UnauthorizedError):
+        await GalleryService.authorize(session, 'guest', 'photos', 'delete')
+    with pytest.raises(base.NotFoundError):
+        await GalleryService.authorize(session, 'guest', 'hidden', 'read')
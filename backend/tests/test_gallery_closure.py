@@ -0,0 +1,65 @@
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago.models.tables import Gallery as GalleryTable, GalleryClosure as GalleryClosureTable
+from arbor_imago.services.gallery import Gallery as GalleryService, InvalidMoveError
+from arbor_imago.services.gallery_closure import GalleryClosure as GalleryClosureService
+
+
+async def _create(session: AsyncSession, id: str, parent_id: str | None) -> GalleryTable:
+    gallery = GalleryTable(id=id, name=id, test='', user_id='owner',
+                           visibility_level=1, parent_id=parent_id)
+    session.add(gallery)
+    await GalleryService._on_create(session, gallery)
+    return gallery
+
+
+async def _move(session: AsyncSession, gallery: GalleryTable, parent_id: str | None) -> None:
+    gallery.parent_id = parent_id
+    await GalleryService._on_update(session, gallery)
+    await session.flush()
+
+
+async def _rows(session: AsyncSession) -> set[tuple[str, str, int]]:
+    return {(row.ancestor_id, row.descendant_id, row.depth) for row in (await session.exec(select(GalleryClosureTable))).all()}
+
+
+@pytest.mark.anyio
+async def test_closure_follows_create_move_delete(session):
+
+    # root -> a -> b -> c, root -> d
+    root = await _create(session, 'root', None)
+    a = await _create(session, 'a', 'root')
+    b = await _create(session, 'b', 'a')
+    c = await _create(session, 'c', 'b')
+    d = await _create(session, 'd', 'root')
+    await session.commit()
+
+    assert [gallery.id for gallery in await GalleryService.fetch_descendants(session, 'root')] == ['a', 'd', 'b', 'c']
+    assert [gallery.id for gallery in await GalleryService.fetch_descendants(session, 'root', max_depth=1)] == ['a', 'd']
+    assert await GalleryService.count_descendants(session, ['root', 'a', 'c']) == {'root': 4, 'a': 2, 'c': 0}
+
+    with pytest.raises(InvalidMoveError):
+        await _move(session, a, 'c')
+    with pytest.raises(InvalidMoveError):
+        await _move(session, a, 'a')
+    await session.rollback()
+
+    # move b's subtree under d
+    b = await session.get(GalleryTable, 'b')
+    await _move(session, b, 'd')
+    assert await GalleryService.count_descendants(session, ['a', 'd']) == {'a': 0, 'd': 2}
+    assert await GalleryClosureService.is_ancestor(session, 'root', 'c')
+    assert not await GalleryClosureService.is_ancestor(session, 'a', 'c')
+
+    # the incrementally maintained rows match a rebuild from parent_id
+    rows = await _rows(session)
+    await GalleryClosureService.rebuild(session)
+    assert await _rows(session) == rows
+
+    d = await session.get(GalleryTable, 'd')
+    await session.delete(d)
+    await GalleryService._on_delete(session, d)
+    await session.flush()
+    assert await _rows(session) == {('root', 'root', 0), ('root', 'a', 1), ('a', 'a', 0)}
@@ -0,0 +1,75 @@
+import datetime as datetime_module
+import pathlib
+
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago.models.tables import Gallery as GalleryTable
+from arbor_imago.services import base
+from arbor_imago.services.gallery import Gallery as GalleryService, GalleryPathCache
+
+
+def _gallery(id: str, parent_id: str | None, name: str, date: datetime_module.date | None = None) -> GalleryTable:
+    return GalleryTable(id=id, name=name, test='', user_id='owner', visibility_level=1, parent_id=parent_id, date=date)
+
+
+async def _add_chain(session: AsyncSession, depth: int) -> None:
+
+    session.add(_gallery('0', None, 'root'))
+    for i in range(1, depth):
+        session.add(_gallery(str(i), str(i - 1), 'g' + str(i),
+                    datetime_module.date(2024, 1, 1) if i == 1 else None))
+    await session.commit()
+    session.expunge_all()
+
+
+@pytest.mark.anyio
+async def test_ancestry_is_one_query(session, statements):
+
+    await _add_chain(session, 50)
+    statements.reset()
+
+    ancestry = await GalleryService.fetch_ancestry(session, '49')
+    assert [gallery.id for gallery in ancestry] == [str(i) for i in range(50)]
+    assert len(statements) == 1
+
+    assert [gallery.id for gallery in await GalleryService.get_parents(session, ancestry[2])] == ['1', '2']
+    assert await GalleryService.get_parents(session, ancestry[0]) == []
+
+    dir = await GalleryService.get_dir(session, ancestry[3], pathlib.Path('/galleries'))
+    assert dir == pathlib.Path('/galleries/owner/2024-01-01 g1/g2/g3')
+
+
+@pytest.mark.anyio
+async def test_dangling_parent_raises(session):
+
+    await _add_chain(session, 3)
+    session.add(_gallery('orphan', 'missing', 'orphan'))
+    await session.commit()
+
+    for id in ('orphan', 'unknown'):
+        with pytest.raises(base.NotFoundError):
+            await GalleryService.fetch_ancestry(session, id)
+
+
+def test_path_cache_invalidates_descendants():
+
+    root, child, grandchild, sibling = (
+        _gallery('0', None, 'root'), _gallery('1', '0', 'a'), _gallery('2', '1', 'b'), _gallery('3', '0', 'c'))
+
+    cache = GalleryPathCache(max_size=10)
+    cache.set([root, child, grandchild])
+    cache.set([root, child])
+    cache.set([root, sibling])
+    assert cache.get('2') == ('owner', 'a', 'b')
+
+    cache.invalidate('1')
+    assert cache.get('2') is None
+    assert cache.get('1') is None
+    assert cache.get('3') == ('owner', 'c')
+
+    small_cache = GalleryPathCache(max_size=1)
+    small_cache.set([root, child])
+    small_cache.set([root, sibling])
+    assert len(small_cache) == 1
+    assert small_cache.get('1') is None
@@ -0,0 +1,97 @@
+import asyncio
+import datetime as datetime_module
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from arbor_imago.auth.google import GoogleIdTokenVerifier, InvalidIdTokenError, SigningKeysUnavailableError
+
+CLIENT_ID = 'client-id'
+ISSUER = 'https://accounts.example.test'
+JWKS_URL = 'https://jwks.example.test/certs'
+
+
+class JwksServer:
+    """Stand-in for Google's certs endpoint"""
+
+    def __init__(self):
+        self.keys: dict[str, rsa.RSAPrivateKey] = {}
+        self.available = True
+        self.n_requests = 0
+        self.transport = httpx.MockTransport(self.handle)
+
+    def add_key(self, kid: str) -> None:
+        self.keys[kid] = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.n_requests += 1
+        if not self.available:
+            return httpx.Response(503)
+
+        jwks = []
+        for kid, key in self.keys.items():
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(
+                key.public_key()))
+            jwks.append({**jwk, 'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+        return httpx.Response(200, json={'keys': jwks}, headers={'Cache-Control': 'public, max-age=3600'})
+
+    def sign(self, kid: str, audience: str = CLIENT_ID, issuer: str = ISSUER) -> str:
+        now = int(time.time())
+        return jwt.encode({'sub': '1', 'email': 'a@example.test', 'aud': audience, 'iss': issuer, 'iat': now, 'exp': now + 60},
+                          self.keys[kid], algorithm='RS256', headers={'kid': kid})
+
+
+def _verifier(server: JwksServer) -> GoogleIdTokenVerifier:
+    return GoogleIdTokenVerifier(CLIENT_ID, JWKS_URL, [ISSUER], datetime_module.timedelta(seconds=0), transport=server.transport)
+
+
+def test_verifies_locally_after_first_fetch():
+    server = JwksServer()
+    server.add_key('1')
+    verifier = _verifier(server)
+
+    async def _main():
+        for _ in range(3):
+            assert (await verifier.verify(server.sign('1')))['email'] == 'a@example.test'
+        assert server.n_requests == 1
+        assert verifier.expiry_timestamp > time.time() + 3500
+
+        with pytest.raises(InvalidIdTokenError):
+            await verifier.verify(server.sign('1', audience='other'))
+        with pytest.raises(InvalidIdTokenError):
+            await verifier.verify(server.sign('1', issuer='https://evil.example.test'))
+        with pytest.raises(InvalidIdTokenError):
+            await verifier.verify('not a token')
+        assert server.n_requests == 1
+
+    asyncio.run(_main())
+
+
+def test_unknown_kid_triggers_refresh():
+    server = JwksServer()
+    server.add_key('1')
+    verifier = _verifier(server)
+
+    async def _main():
+        await verifier.verify(server.sign('1'))
+
+        # google rotated keys
+        server.add_key('2')
+        await verifier.verify(server.sign('2'))
+        assert server.n_requests == 2
+
+        # stale keys are still used while the endpoint is down
+        server.available = False
+        verifier._expiry_timestamp = 0
+        await verifier.verify(server.sign('1'))
+
+        server.add_key('3')
+        with pytest.raises(SigningKeysUnavailableError):
+            await verifier.verify(server.sign('3'))
+
+    asyncio.run(_main())
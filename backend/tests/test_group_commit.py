@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import pathlib
+import tempfile
+import typing
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from arbor_imago import config, group_commit, utils
+from arbor_imago.auth import cache as auth_cache, utils as auth_utils
+from arbor_imago.group_commit import GroupCommitter
+from arbor_imago.models.tables import User as UserTable, UserAccessToken as UserAccessTokenTable
+from arbor_imago.services import auth_credential as auth_credential_service
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+from arbor_imago.schemas import user_access_token as user_access_token_schema
+
+
+def test_group_commit():
+
+    async def _main():
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_async_engine(
+                'sqlite+aiosqlite:///' + str(pathlib.Path(directory) / 'group_commit.db'))
+            sessionmaker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            async with engine.begin() as connection:
+                await connection.run_sync(SQLModel.metadata.create_all)
+
+            n_commits = 0
+
+            @event.listens_for(engine.sync_engine, 'commit')
+            def _count_commit(*args):
+                nonlocal n_commits
+                n_commits += 1
+
+            @contextlib.asynccontextmanager
+            async def _unit_of_work():
+                async with sessionmaker() as session:
+                    yield session
+                    await session.commit()
+
+            def _create(id: str):
+                async def _write(session: AsyncSession) -> str:
+                    session.add(UserTable(id=id, email=id + '@example.com', user_role_id=1))
+                    await session.flush()
+                    return id
+                return _write
+
+            committer = GroupCommitter(window_seconds=0.05, max_batch_size=8, unit_of_work=_unit_of_work)
+            committer.start()
+
+            # ten writes arriving together are committed in two batches
+            assert await asyncio.gather(*(committer.submit(_create(str(i))) for i in range(10))) == [str(i) for i in range(10)]
+            assert n_commits == 2
+            assert committer.stats()['max_batch_size'] == 8
+
+            # a failing write only fails its own caller
+            results = await asyncio.gather(committer.submit(_create('a')), committer.submit(_create('0')),
+                                           committer.submit(_create('b')), return_exceptions=True)
+            assert results[0] == 'a' and results[2] == 'b'
+            assert isinstance(results[1], IntegrityError)
+            assert committer.stats()['failed'] == 1
+
+            await committer.stop()
+            assert not committer.running
+
+            async with sessionmaker() as session:
+                assert len((await session.exec(select(UserTable))).all()) == 12
+
+            await engine.dispose()
+
+    asyncio.run(_main())
+
+
+@pytest.fixture
+async def committer(sessionmaker, monkeypatch):
+
+    auth_cache.CREDENTIAL_CACHE.clear()
+    committer = GroupCommitter(window_seconds=0.01, max_batch_size=8)
+    monkeypatch.setattr(group_commit, 'COMMITTER', committer)
+    committer.start()
+    yield committer
+    await committer.stop()
+
+
+async def _refresh_token(session) -> str:
+
+    user_access_token = await UserAccessTokenService.create({
+        'session': session, 'admin': False, 'authorized_user_id': 'owner',
+        'create_model': user_access_token_schema.UserAccessTokenAdminCreate(
+            user_id='owner', expiry=auth_credential_service.lifespan_to_expiry(config.AUTH['credential_lifespans']['access_token'])),
+    })
+    return utils.jwt_encode(typing.cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token)))
+
+
+@pytest.mark.anyio
+async def test_refresh_with_group_commit(session, sessionmaker, committer, monkeypatch):
+
+    refresh_token = await _refresh_token(session)
+    assert committer.stats()['writes'] == 1
+
+    # the delete and the create commit apart
+    async with sessionmaker() as request_session:
+        await auth_utils.refresh_access_token(request_session, Response(), refresh_token)
+    assert committer.stats()['writes'] == 3
+    assert len((await session.exec(select(UserAccessTokenTable))).all()) == 1
+
+    async with sessionmaker() as request_session:
+        with pytest.raises(HTTPException) as e:
+            await auth_utils.refresh_access_token(request_session, Response(), refresh_token)
+    assert e.value.status_code == 401
+
+    # the presented token is deleted first, if minting the new one fails it can't be used again
+    refresh_token = await _refresh_token(session)
+
+    async def _fail(params):
+        raise RuntimeError
+    monkeypatch.setattr(UserAccessTokenService, 'create', _fail)
+
+    async with sessionmaker() as request_session:
+        with pytest.raises(RuntimeError):
+            await auth_utils.refresh_access_token(request_session, Response(), refresh_token)
+    async with sessionmaker() as request_session:
+        with pytest.raises(HTTPException):
+            await auth_utils.refresh_access_token(request_session, Response(), refresh_token)
+
+
+
+async def _spend(sessionmaker, user_access_token) -> bool:
+
+    async with sessionmaker() as request_session:
+        try:
+            await auth_utils.use_once(request_session, user_access_token)
+            await request_session.commit()
+        except HTTPException:
+            return False
+        return True
+
+
+@pytest.mark.anyio
+async def test_concurrent_spends(session, sessionmaker, committer):
+
+    await _refresh_token(session)
+    user_access_token = (await session.exec(select(UserAccessTokenTable))).one()
+
+    # both deletes land in the same batch, only the first matches the row
+    assert sorted(await asyncio.gather(*(_spend(sessionmaker, user_access_token) for _ in range(2)))) == [False, True]
+    assert committer.stats()['failed'] == 0
+
+
+@pytest.mark.anyio
+async def test_spend_without_group_commit(session, sessionmaker):
+
+    auth_cache.CREDENTIAL_CACHE.clear()
+    await _refresh_token(session)
+    user_access_token = (await session.exec(select(UserAccessTokenTable))).one()
+
+    assert await _spend(sessionmaker, user_access_token)
+    assert not await _spend(sessionmaker, user_access_token)
+    assert (await session.exec(select(UserAccessTokenTable))).all() == []
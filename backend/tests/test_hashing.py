@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from arbor_imago.auth.hashing import PasswordHasher, OverloadedError
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(executor='thread', max_in_flight=1,
+                            max_queued=0, bcrypt_rounds=4)
+
+    async def _main():
+        hashed = await hasher.hash('password')
+        assert await hasher.verify('password', hashed)
+        assert not await hasher.verify('wrong', hashed)
+
+    asyncio.run(_main())
+    hasher.shutdown()
+    assert hasher.stats()['completed'] == 3
+
+
+def test_rejects_beyond_queue():
+    hasher = PasswordHasher(executor='thread', max_in_flight=1,
+                            max_queued=1, bcrypt_rounds=4)
+
+    async def _main():
+        return await asyncio.gather(*(hasher.hash('password') for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(_main())
+    hasher.shutdown()
+
+    assert sum(isinstance(result, OverloadedError) for result in results) == 1
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.stats()['queue_depth'] == 0
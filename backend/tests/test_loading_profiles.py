@@ -0,0 +1,42 @@
+import datetime as datetime_module
+
+import pytest
+
+from arbor_imago import custom_types
+from arbor_imago.models.tables import ApiKey as ApiKeyTable, ApiKeyScope as ApiKeyScopeTable, Gallery as GalleryTable, GalleryPermission as GalleryPermissionTable
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.services.gallery_permission import GalleryPermission as GalleryPermissionService
+
+
+@pytest.mark.anyio
+async def test_loading_profiles(session, statements):
+
+    now = datetime_module.datetime.now().astimezone(datetime_module.UTC)
+    session.add(GalleryTable(id='gallery', name='gallery', test='', user_id='owner', visibility_level=1))
+    session.add(GalleryPermissionTable(gallery_id='gallery', user_id='owner', permission_level=1))
+    session.add(ApiKeyTable(id='key', name='key', user_id='owner', issued=now, expiry=now))
+    session.add(ApiKeyScopeTable(api_key_id='key', scope_id=1))
+    session.add(ApiKeyScopeTable(api_key_id='key', scope_id=2))
+    await session.commit()
+    session.expunge_all()
+
+    # authorization reads gallery_permission.gallery, which the 'read' profile joins in
+    statements.reset()
+    gallery_permission = await GalleryPermissionService.read({
+        'session': session, 'admin': False, 'authorized_user_id': 'owner',
+        'id': custom_types.GalleryPermissionId(gallery_id='gallery', user_id='owner'),
+    })
+    assert gallery_permission.gallery.user_id == 'owner'
+    assert len(statements) == 1
+
+    api_key = await ApiKeyService.fetch_by_id_with_exception(session, 'key', 'scopes')
+    statements.reset()
+    assert sorted(await ApiKeyService.get_scope_ids(session, api_key)) == [1, 2]
+    assert len(statements) == 0
+
+    session.expunge_all()
+    api_key = await ApiKeyService.fetch_by_id_with_exception(session, 'key')
+    assert sorted(await ApiKeyService.get_scope_ids(session, api_key)) == [1, 2]
+
+    with pytest.raises(ValueError):
+        await ApiKeyService.fetch_by_id(session, 'key', 'unknown')
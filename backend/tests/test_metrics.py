@@ -0,0 +1,34 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from arbor_imago import metrics
+
+
+def test_request_metrics():
+
+    request_metrics = metrics.RequestMetrics((0.1, 1.0))
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware, request_metrics=request_metrics)
+
+    @app.get('/galleries/{gallery_id}/')
+    async def by_id(gallery_id: str):
+        return gallery_id
+
+    with TestClient(app) as client:
+        for gallery_id in ('a', 'b', 'c'):
+            assert client.get('/galleries/{}/'.format(gallery_id)).status_code == 200
+        assert client.get('/missing/').status_code == 404
+
+    # labelled by the route template, not the url
+    assert request_metrics.counts == {
+        ('GET', '/galleries/{gallery_id}/', 200): 3,
+        ('GET', 'unmatched', 404): 1,
+    }
+    request_metrics.observe('GET', '/galleries/{gallery_id}/', 200, 0.5)
+
+    text = metrics.render(request_metrics)
+    assert 'arbor_imago_http_requests_total{method="GET",route="/galleries/{gallery_id}/",status="200"} 4' in text
+    assert 'arbor_imago_http_request_duration_seconds_bucket{method="GET",route="/galleries/{gallery_id}/",le="0.1"} 3' in text
+    assert 'arbor_imago_http_request_duration_seconds_bucket{method="GET",route="/galleries/{gallery_id}/",le="1.0"} 4' in text
+    assert 'arbor_imago_http_request_duration_seconds_bucket{method="GET",route="/galleries/{gallery_id}/",le="+Inf"} 4' in text
+    assert '# TYPE arbor_imago_event_loop_lag_seconds gauge' in text
@@ -0,0 +1,134 @@
+import asyncio
+import smtplib
+
+import pytest
+
+from arbor_imago.notifications import Email, SMS, NotificationDispatcher, SmtpTransport
+
+
+class _FlakyTransport:
+
+    def __init__(self, n_failures: int):
+        self.n_failures = n_failures
+        self.sent: list = []
+
+    async def send(self, notification):
+        if self.n_failures > 0:
+            self.n_failures -= 1
+            raise ConnectionError('provider unavailable')
+        self.sent.append(notification)
+
+    async def close(self):
+        pass
+
+
+def _dispatcher(transport, max_retries: int = 3, max_queued: int = 10) -> NotificationDispatcher:
+    return NotificationDispatcher(transports={'email': transport, 'sms': transport}, concurrency={'email': 1, 'sms': 1},
+                                  max_queued=max_queued, max_retries=max_retries, retry_backoff_seconds=0)
+
+
+def test_retries_with_backoff():
+    transport = _FlakyTransport(n_failures=2)
+    dispatcher = _dispatcher(transport)
+
+    async def _main():
+        dispatcher.start()
+        assert dispatcher.enqueue(SMS('+15555555555', 'hello'))
+        await dispatcher.stop()
+
+    asyncio.run(_main())
+    assert len(transport.sent) == 1
+    assert dispatcher.stats()['retried'] == 2
+    assert dispatcher.stats()['failed'] == 0
+
+
+def test_drops_when_full_or_stopped():
+    transport = _FlakyTransport(n_failures=0)
+    dispatcher = _dispatcher(transport, max_queued=1)
+
+    assert not dispatcher.enqueue(SMS('+15555555555', 'not running'))
+
+    async def _main():
+        dispatcher.start()
+        # workers have not run yet, so the second message finds the queue full
+        assert dispatcher.enqueue(SMS('+15555555555', 'first'))
+        assert not dispatcher.enqueue(SMS('+15555555555', 'second'))
+        await dispatcher.stop()
+
+    asyncio.run(_main())
+    assert len(transport.sent) == 1
+    assert dispatcher.stats()['dropped'] == 2
+
+
+class _FakeSMTP:
+    """Stands in for smtplib.SMTP, every instance is a connection opened"""
+
+    instances: list['_FakeSMTP'] = []
+
+    def __init__(self, host, port, timeout):
+        self.messages: list = []
+        self.calls: list[str] = []
+        self.disconnected = False
+        _FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        self.calls.append('starttls')
+
+    def login(self, username, password):
+        self.calls.append('login')
+
+    def send_message(self, message):
+        if self.disconnected:
+            raise smtplib.SMTPServerDisconnected()
+        self.messages.append(message)
+
+    def close(self):
+        self.calls.append('close')
+
+    def quit(self):
+        self.calls.append('quit')
+
+
+@pytest.fixture
+def smtp(monkeypatch) -> list[_FakeSMTP]:
+    monkeypatch.setattr(smtplib, 'SMTP', _FakeSMTP)
+    _FakeSMTP.instances = []
+    return _FakeSMTP.instances
+
+
+def test_smtp_transport_reuses_connections(smtp):
+    transport = SmtpTransport(host='smtp.example.com', sender='noreply@example.com',
+                              username='user', password='password', pool_size=1)
+    dispatcher = _dispatcher(transport)
+
+    async def _main():
+        dispatcher.start()
+        for i in range(5):
+            dispatcher.enqueue(
+                Email('user@example.com', 'Subject {}'.format(i), 'Body'))
+        await dispatcher.stop()
+
+    asyncio.run(_main())
+
+    assert transport.n_connections_opened == 1
+    assert dispatcher.stats()['sent'] == 5
+    [connection] = smtp
+    assert [message['Subject'] for message in connection.messages] == ['Subject {}'.format(i) for i in range(5)]
+    assert connection.calls == ['starttls', 'login', 'quit']
+
+
+def test_smtp_transport_reconnects(smtp):
+    transport = SmtpTransport(host='smtp.example.com', sender='noreply@example.com', starttls=False)
+
+    async def _main():
+        await transport.send(Email('user@example.com', 'First', 'Body'))
+        # the server closed the idle connection
+        smtp[0].disconnected = True
+        await transport.send(Email('user@example.com', 'Second', 'Body'))
+        await transport.close()
+
+    asyncio.run(_main())
+
+    assert transport.n_connections_opened == 2
+    assert [message['Subject'] for message in smtp[1].messages] == ['Second']
+    assert smtp[1].calls == ['quit']
@@ -0,0 +1,38 @@
+import hashlib
+import hmac
+
+import bcrypt
+import pytest
+
+from arbor_imago.services import otp
+from arbor_imago.services.otp import OTP as OTPService, HmacSha256CodeHasher
+
+
+@pytest.mark.anyio
+async def test_hmac_hash_and_verify():
+
+    hashed_code = await HmacSha256CodeHasher.hash('123456')
+    assert hashed_code.startswith(HmacSha256CodeHasher.PREFIX)
+    # salted, the same code hashes differently each time
+    assert hashed_code != await HmacSha256CodeHasher.hash('123456')
+
+    assert await OTPService.verify_code('123456', hashed_code)
+    assert not await OTPService.verify_code('654321', hashed_code)
+    assert not await OTPService.verify_code('123456', 'unknown$' + hashed_code)
+
+
+@pytest.mark.anyio
+async def test_bcrypt_rows_still_verify():
+
+    # hashed before the otp_hasher changed to hmac-sha256
+    hashed_code = bcrypt.hashpw(b'123456', bcrypt.gensalt(rounds=4)).decode('utf-8')
+    assert await OTPService.verify_code('123456', hashed_code)
+    assert not await OTPService.verify_code('654321', hashed_code)
+
+
+def test_hmac_key():
+
+    assert otp.hmac_key({'JWT_SECRET_KEY': 'jwt', 'OTP_HMAC_SECRET_KEY': 'otp'}) == 'otp'
+    assert otp.hmac_key({'JWT_SECRET_KEY': 'jwt'}) == hmac.new(b'jwt', b'otp', hashlib.sha256).hexdigest()
+    # not the jwt secret itself
+    assert otp.hmac_key({'JWT_SECRET_KEY': 'jwt'}) != 'jwt'
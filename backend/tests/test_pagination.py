@@ -0,0 +1,102 @@
+import datetime as datetime_module
+
+import pytest
+from sqlmodel import select
+
+from arbor_imago.models.tables import ApiKey as ApiKeyTable
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+from arbor_imago.schemas.order_by import OrderBy
+from arbor_imago.schemas.pagination import InvalidCursorError, Pagination, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    issued = datetime_module.datetime(
+        2025, 1, 1, 12, 30, 0, 123456, tzinfo=datetime_module.UTC)
+    cursor = encode_cursor(['-issued', 'id'], [issued, 'abc'])
+
+    assert decode_cursor(cursor, ['-issued', 'id']) == [
+        issued.isoformat().replace('+00:00', 'Z'), 'abc']
+
+
+def test_cursor_rejects_other_orders():
+    cursor = encode_cursor(['id'], ['abc'])
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, ['name', 'id'])
+    with pytest.raises(InvalidCursorError):
+        decode_cursor('not a cursor', ['id'])
+
+
+ISSUED = [datetime_module.datetime(2025, 1, day, tzinfo=datetime_module.UTC) for day in (1, 2, 3)]
+EXPIRY = [datetime_module.datetime(2026, 1, day, tzinfo=datetime_module.UTC) for day in (1, 2)]
+
+
+@pytest.fixture
+async def api_keys(session):
+
+    # ties on issued and expiry, only the id tells some rows apart
+    for i in range(11):
+        session.add(ApiKeyTable(id='k{:02}'.format(10 - i), name='n{:02}'.format(i), user_id='owner',
+                                issued=ISSUED[i % 3], expiry=EXPIRY[i % 2]))
+    await session.commit()
+
+
+async def _walk(session, order_bys: list[OrderBy], limit: int) -> list[str]:
+    """Every page's ids, following next_cursor until it runs out"""
+
+    ids: list[str] = []
+    cursor = None
+    while True:
+        pagination = Pagination(limit=limit, cursor=cursor)
+        page = await ApiKeyService.fetch_many(session, pagination, order_bys)
+        ids.extend(api_key.id for api_key in page)
+        cursor = ApiKeyService.next_cursor(page, pagination, order_bys)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize('order_bys', [
+    [],
+    [OrderBy(field='issued', ascending=True)],
+    [OrderBy(field='issued', ascending=False)],
+    [OrderBy(field='issued', ascending=False), OrderBy(field='expiry', ascending=False)],
+    # mixed directions take the expanded OR branch of build_seek
+    [OrderBy(field='issued', ascending=False), OrderBy(field='name', ascending=True)],
+    [OrderBy(field='expiry', ascending=True), OrderBy(field='issued', ascending=False)],
+], ids=['id', 'issued', '-issued', '-issued,-expiry', '-issued,name', 'expiry,-issued'])
+@pytest.mark.parametrize('limit', [1, 3, 11])
+async def test_cursor_walks_every_row_once(session, api_keys, order_bys, limit):
+
+    expected = [api_key.id for api_key in await ApiKeyService.fetch_many(session, Pagination(limit=100), order_bys)]
+    assert len(expected) == 11
+    assert await _walk(session, order_bys, limit) == expected
+
+
+@pytest.mark.anyio
+async def test_fetch_page_totals(session, api_keys, statements):
+
+    query = select(ApiKeyTable).where(ApiKeyTable.issued == ISSUED[0])
+    order_bys = [OrderBy(field='issued', ascending=False)]
+
+    # the total counts the filtered rows, not the page, in the page's statement
+    statements.reset()
+    page = await ApiKeyService.fetch_page(session, Pagination(limit=2), order_bys, query)
+    assert len(statements) == 1
+    assert [api_key.id for api_key in page.items] == ['k01', 'k04']
+    assert page.total == 4
+
+    # the cursor narrows the page but not the total
+    cursor = ApiKeyService.next_cursor(page.items, Pagination(limit=2), order_bys)
+    page = await ApiKeyService.fetch_page(session, Pagination(limit=3, cursor=cursor), order_bys, query)
+    assert [api_key.id for api_key in page.items] == ['k07', 'k10']
+    assert page.total == 4
+
+    # past the end there are no rows to carry the total, it takes a second COUNT
+    statements.reset()
+    page = await ApiKeyService.fetch_page(session, Pagination(limit=2, offset=4), order_bys, query)
+    assert len(statements) == 2
+    assert page == ([], 4)
+
+    page = await ApiKeyService.fetch_page(session, Pagination(limit=2), order_bys, query.where(ApiKeyTable.name == 'missing'))
+    assert page == ([], 0)
@@ -0,0 +1,59 @@
+import datetime as datetime_module
+
+from arbor_imago.auth.revocation import BloomFilter, RevocationFilter, RevocationStatus
+
+
+def _expiry(seconds: float) -> datetime_module.datetime:
+    return datetime_module.datetime.now().astimezone(datetime_module.UTC) + datetime_module.timedelta(seconds=seconds)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, false_positive_rate=0.01)
+    items = [str(i) for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    assert sum(str(i) in bloom for i in range(1000, 11000)) < 300
+
+
+def test_check():
+    revocation_filter = RevocationFilter(
+        bloom_capacity=100, bloom_false_positive_rate=0.01)
+
+    revocation_filter.add(('access_token', 'a'), _expiry(60))
+    revocation_filter.add(('access_token', 'b'), _expiry(60), exact=False)
+
+    assert revocation_filter.check(
+        ('access_token', 'a')) is RevocationStatus.REVOKED
+    assert revocation_filter.check(
+        ('access_token', 'b')) is RevocationStatus.UNKNOWN
+    assert revocation_filter.check(
+        ('api_key', 'a')) is RevocationStatus.NOT_REVOKED
+
+
+def test_prune_and_reset():
+    revocation_filter = RevocationFilter(
+        bloom_capacity=100, bloom_false_positive_rate=0.01)
+
+    revocation_filter.add(('access_token', 'a'), _expiry(-1))
+    revocation_filter.prune()
+    assert len(revocation_filter) == 0
+
+    revocation_filter.reset()
+    assert revocation_filter.check(
+        ('access_token', 'a')) is RevocationStatus.NOT_REVOKED
+
+
+def test_exact_revocations_leave_the_bloom_filter():
+    revocation_filter = RevocationFilter(
+        bloom_capacity=100, bloom_false_positive_rate=0.01)
+
+    # far more than the capacity, as over a long uptime of logouts and refreshes
+    for i in range(1000):
+        revocation_filter.add(('access_token', str(i)), _expiry(-1))
+    revocation_filter.prune()
+
+    assert revocation_filter._bloom.count == 0
+    assert revocation_filter.check(
+        ('access_token', 'other')) is RevocationStatus.NOT_REVOKED
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from arbor_imago import sql_instrumentation
+
+
+def test_fingerprint():
+    assert sql_instrumentation.fingerprint('SELECT *\n  FROM a WHERE id IN (?, ?,?)') == \
+        sql_instrumentation.fingerprint('SELECT * FROM a WHERE id IN (?)') == 'SELECT * FROM a WHERE id IN (?)'
+
+
+def test_record(caplog):
+
+    async def _main():
+        engine = create_async_engine('sqlite+aiosqlite://')
+        sql_instrumentation.instrument(engine.sync_engine)
+
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+
+            with sql_instrumentation.record('GET /galleries/') as request_statements:
+                # the same query once per row, an N+1
+                for i in range(8):
+                    await connection.execute(text('SELECT :i'), {'i': i})
+                await connection.execute(text('SELECT 2'))
+
+        await engine.dispose()
+        return request_statements
+
+    with caplog.at_level(logging.WARNING, logger=sql_instrumentation.__name__):
+        request_statements = asyncio.run(_main())
+
+    assert request_statements.n_statements == 9
+    assert request_statements.repeated(5) == [('SELECT ?', 8)]
+    assert request_statements.server_timing().startswith('db;dur=')
+    assert request_statements.server_timing().endswith(';desc="9 statements"')
+    assert 'likely an N+1: SELECT ?' in caplog.text
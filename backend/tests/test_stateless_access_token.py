@@ -0,0 +1,176 @@
+import datetime as datetime_module
+import typing
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, Response
+
+from arbor_imago import config, database, utils
+from arbor_imago.auth import cache as auth_cache, revocation, utils as auth_utils
+from arbor_imago.models.models import StatelessAccessToken as StatelessAccessTokenModel
+from arbor_imago.models.tables import User as UserTable
+from arbor_imago.services.user import User as UserService
+from arbor_imago.services.user_access_token import UserAccessToken as UserAccessTokenService
+from arbor_imago.routers.auth import AuthRouter
+from arbor_imago.schemas import user as user_schema, user_access_token as user_access_token_schema
+from arbor_imago.services import auth_credential as auth_credential_service
+
+REFRESH_TOKEN_COOKIE_KEY = config.AUTH['stateless_access_token']['refresh_token_cookie_key']
+
+
+@pytest.fixture
+def client(sessionmaker, monkeypatch):
+
+    monkeypatch.setitem(config.AUTH['stateless_access_token'], 'enabled', True)
+    auth_cache.CREDENTIAL_CACHE.clear()
+    auth_cache.USER_CACHE.clear()
+    revocation.REVOCATIONS.reset()
+
+    app = FastAPI(dependencies=[database.REQUEST_SESSION_DEPENDENCY])
+    app.include_router(AuthRouter().router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test')
+
+
+async def _issue(session, user_id: str = 'owner') -> tuple[str, str]:
+    """Log the user in, returns the stateless access token and the refresh token"""
+
+    user = await session.get(UserTable, user_id)
+    user_access_token = await UserAccessTokenService.create({
+        'session': session, 'admin': False, 'authorized_user_id': user_id,
+        'create_model': user_access_token_schema.UserAccessTokenAdminCreate(
+            user_id=user_id, expiry=auth_credential_service.lifespan_to_expiry(config.AUTH['credential_lifespans']['access_token'])),
+    })
+    access_token = auth_utils.set_auth_cookies(Response(), user, user_access_token)
+    return access_token, utils.jwt_encode(typing.cast(dict, UserAccessTokenService.to_jwt_payload(user_access_token)))
+
+
+# where a refresh token is accepted, like logging out
+REFRESH_PERMITTED_TYPES = {UserAccessTokenService.auth_type.value, 'stateless_access_token'}
+
+
+async def _detail(token: str | None, permitted_types: set | None = None) -> str | None:
+    get_auth = await auth_utils.get_auth_from_auth_credential_jwt(
+        token=token, permitted_types=permitted_types or auth_utils.default_permitted_types())
+    return None if get_auth.exception is None else get_auth.exception.detail
+
+
+@pytest.mark.anyio
+async def test_issue(session, client):
+
+    access_token, _ = await _issue(session)
+    get_auth = await auth_utils.get_auth_from_auth_credential_jwt(token=access_token)
+
+    assert get_auth.isAuthorized
+    assert isinstance(get_auth.auth_credential, StatelessAccessTokenModel)
+    assert get_auth.scope_ids == set(config.USER_ROLE_ID_SCOPE_IDS[config.USER_ROLE_NAME_MAPPING['user']])
+
+    # only the user is read, once, then it comes from the cache
+    assert auth_cache.USER_CACHE.get('owner') is not None
+
+
+@pytest.mark.anyio
+async def test_refresh_is_single_use(session, client):
+
+    _, refresh_token = await _issue(session)
+
+    response = await client.post('/auth/refresh/', json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    assert response.json()['auth']['user']['id'] == 'owner'
+    assert await _detail(response.cookies[config.ACCESS_TOKEN_COOKIE['key']]) is None
+    new_refresh_token = response.cookies[REFRESH_TOKEN_COOKIE_KEY]
+    assert new_refresh_token != refresh_token
+
+    # the presented refresh token was deleted, reusing it fails
+    response = await client.post('/auth/refresh/', json={'refresh_token': refresh_token})
+    assert response.status_code == 401
+    assert response.json()['detail'] == 'Authorization expired'
+
+    response = await client.post('/auth/refresh/', json={'refresh_token': new_refresh_token})
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_epoch_revokes(session, client):
+
+    access_token, _ = await _issue(session)
+    assert await _detail(access_token) is None
+
+    # scopes come from the claims, a new role revokes tokens issued under the old one
+    await UserService.update({
+        'session': session, 'admin': True, 'authorized_user_id': 'owner', 'id': 'owner',
+        'update_model': user_schema.UserAdminUpdate(user_role_id=config.USER_ROLE_NAME_MAPPING['admin']),
+    })
+    assert await _detail(access_token) == 'Authorization expired'
+
+    access_token, _ = await _issue(session)
+    assert await _detail(access_token) is None
+
+    # other updates keep the epoch
+    await UserService.update({
+        'session': session, 'admin': True, 'authorized_user_id': 'owner', 'id': 'owner',
+        'update_model': user_schema.UserAdminUpdate(username='owner'),
+    })
+    assert await _detail(access_token) is None
+
+    await UserService.increment_token_epoch(session, await session.get(UserTable, 'owner'))
+    assert await _detail(access_token) == 'Authorization expired'
+
+
+@pytest.mark.anyio
+async def test_logout_everywhere(session, client):
+
+    access_token, refresh_token = await _issue(session)
+    other_access_token, other_refresh_token = await _issue(session)
+
+    response = await client.post('/auth/logout/everywhere/', headers={'Authorization': 'Bearer ' + access_token})
+    assert response.status_code == 200
+
+    for token in (access_token, other_access_token, refresh_token, other_refresh_token):
+        assert await _detail(token, REFRESH_PERMITTED_TYPES) == 'Authorization expired'
+
+    response = await client.post('/auth/refresh/', json={'refresh_token': other_refresh_token})
+    assert response.status_code == 401
+
+
+def _expire(token: str) -> str:
+    now = datetime_module.datetime.now().astimezone(datetime_module.UTC)
+    return utils.jwt_encode({
+        **utils.jwt_decode(token),
+        'iat': (now - datetime_module.timedelta(minutes=10)).timestamp(),
+        'exp': (now - datetime_module.timedelta(minutes=5)).timestamp(),
+    })
+
+
+@pytest.mark.anyio
+async def test_expired_access_token_is_refreshable(session, client):
+
+    access_token, refresh_token = await _issue(session)
+
+    # an expired stateless access token tells the client to refresh, an expired refresh token logs it out
+    assert await _detail(_expire(access_token)) == 'Access token expired'
+    assert await _detail(_expire(refresh_token), REFRESH_PERMITTED_TYPES) == 'Authorization expired'
+
+
+
+@pytest.mark.anyio
+async def test_refresh_token_is_not_an_access_token(session, client):
+
+    access_token, refresh_token = await _issue(session)
+
+    app = FastAPI(dependencies=[database.REQUEST_SESSION_DEPENDENCY])
+
+    @app.get('/protected/')
+    async def protected(authorization: typing.Annotated[auth_utils.GetAuthReturn, Depends(auth_utils.make_get_auth_dependency())]):
+        return {'user_id': authorization._user_id}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as protected_client:
+        response = await protected_client.get('/protected/', headers={'Authorization': 'Bearer ' + access_token})
+        assert response.json() == {'user_id': 'owner'}
+
+        response = await protected_client.get('/protected/', headers={'Authorization': 'Bearer ' + refresh_token})
+        assert response.status_code == 401
+        assert response.json()['detail'] == 'Refresh token not permitted as an access token'
+
+    # logging out still takes it
+    response = await client.post('/auth/logout/everywhere/', headers={'Authorization': 'Bearer ' + refresh_token})
+    assert response.status_code == 200
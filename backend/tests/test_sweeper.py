@@ -0,0 +1,66 @@
+import datetime as datetime_module
+
+import pytest
+from sqlmodel import select
+
+from arbor_imago.auth import sweeper
+from arbor_imago.models.tables import ApiKey as ApiKeyTable, ApiKeyScope as ApiKeyScopeTable, AuthCredentialRevocation as AuthCredentialRevocationTable, UserAccessToken as UserAccessTokenTable
+from arbor_imago.services.api_key import ApiKey as ApiKeyService
+
+NOW = datetime_module.datetime.now(datetime_module.UTC)
+EXPIRED = NOW - datetime_module.timedelta(days=1)
+EXPIRY = NOW + datetime_module.timedelta(days=1)
+
+
+def _add_api_keys(session, n_expired: int, n_live: int) -> None:
+
+    for i in range(n_expired + n_live):
+        id = ('expired' if i < n_expired else 'live') + str(i)
+        session.add(ApiKeyTable(id=id, name=id, user_id='owner', issued=EXPIRED - datetime_module.timedelta(days=1),
+                                expiry=EXPIRED if i < n_expired else EXPIRY))
+        session.add(ApiKeyScopeTable(api_key_id=id, scope_id=1))
+
+
+async def _ids(session, table) -> list[str]:
+    return sorted((await session.exec(select(table.id))).all())
+
+
+@pytest.mark.anyio
+async def test_delete_expired_in_batches(session, statements):
+
+    _add_api_keys(session, 5, 2)
+    await session.commit()
+
+    statements.reset()
+    assert await ApiKeyService.delete_expired(session, NOW, 2) == 5
+    # batches of 2, 2 and 1, the short batch ends the sweep
+    assert sum(statement.startswith('DELETE FROM api_key ') for statement in statements.statements) == 3
+    assert sum(statement.startswith('SELECT api_key.id ') for statement in statements.statements) == 3
+
+    assert await _ids(session, ApiKeyTable) == ['live5', 'live6']
+    # bulk deletes skip the ORM cascade, the scopes go with their keys
+    assert sorted((await session.exec(select(ApiKeyScopeTable.api_key_id))).all()) == ['live5', 'live6']
+
+    # a full last batch takes one more query to find nothing is left
+    _add_api_keys(session, 4, 0)
+    await session.commit()
+    assert await ApiKeyService.delete_expired(session, NOW, 2) == 4
+    assert await ApiKeyService.delete_expired(session, NOW, 2) == 0
+
+
+@pytest.mark.anyio
+async def test_sweep_expired_auth_credentials(session, sessionmaker):
+
+    _add_api_keys(session, 1, 1)
+    session.add(UserAccessTokenTable(id='expired', user_id='owner', issued=EXPIRED, expiry=EXPIRED))
+    session.add(UserAccessTokenTable(id='live', user_id='owner', issued=EXPIRED, expiry=EXPIRY))
+    session.add(AuthCredentialRevocationTable(auth_credential_type='access_token', auth_credential_id='expired', expiry=EXPIRED))
+    session.add(AuthCredentialRevocationTable(auth_credential_type='access_token', auth_credential_id='live', expiry=EXPIRY))
+    await session.commit()
+
+    assert await sweeper.sweep_expired_auth_credentials(10) == {'access_token': 1, 'otp': 0, 'api_key': 1}
+
+    session.expunge_all()
+    assert await _ids(session, ApiKeyTable) == ['live1']
+    assert await _ids(session, UserAccessTokenTable) == ['live']
+    assert (await session.exec(select(AuthCredentialRevocationTable.auth_credential_id))).all() == ['live']
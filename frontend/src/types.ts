@@ -241,6 +241,7 @@ export type OrderByState = 'off' | 'asc' | 'desc';
 
 interface HeaderKeys {
   auth_logout: string;
+  next_cursor: string;
 }
 
 export interface SharedConfig {